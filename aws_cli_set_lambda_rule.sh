@@ -2,6 +2,10 @@
 
 aws lambda add-permission --function-name <function-name> --statement-id "AllowEventBridgeInvoke" --action "lambda:InvokeFunction" --principal events.amazonaws.com --source-arn arn:aws:events:<region>:<account-id>:rule/*
 
+aws events put-rule --name DailyTaskReminders --schedule-expression "cron(0 8 * * ? *)" --state ENABLED
+
+aws events put-targets --rule DailyTaskReminders --targets "Id"="sendTaskReminder","Arn"="arn:aws:lambda:<region>:<account-id>:function:sendTaskReminder"
+
 aws-encryption-cli --encrypt --input secret1.txt --wrapping-keys key=$keyArn --metadata-output ~/metadata --encryption-context purpose=test --commitment-policy require-encrypt-require-decrypt --output ~/output/.
 
 aws-encryption-cli --decrypt --input secret1.txt.encrypted --wrapping-keys key=$keyArn --commitment-policy require-encrypt-require-decrypt --encryption-context purpose=test --metadata-output ~/metadata --max-encrypted-data-keys 1 --buffer --output .
\ No newline at end of file
@@ -0,0 +1,129 @@
+"""
+Shared AWS clients, created lazily and once per container.
+
+Handlers used to build their boto3 clients and resources at import time, including
+ones they never used, and some built fresh clients on every call. Every handler now
+declares what it needs with `lazy_client`, `lazy_resource` or `lazy_table` at module
+level instead. Nothing is created until the first attribute access, and then each client
+is built once from a single shared session (so service models are loaded once) with
+connection-pool and keep-alive settings tuned for Lambda. The session carries the
+`instrumentation` hooks, so every AWS call is timed.
+
+Usage:
+
+    import aws_clients
+
+    sns = aws_clients.lazy_client('sns')
+    table = aws_clients.lazy_table('Tasks')
+"""
+
+import threading
+
+import boto3
+import botocore.session
+from botocore.config import Config
+
+import instrumentation
+
+CLIENT_CONFIG = Config(
+    # Enough connections for the widest thread pool in the handlers (parallel scans,
+    # batched publishes) so concurrent calls do not queue for a connection.
+    max_pool_connections=32,
+    # Reuse connections across warm invocations; the keep-alive stops idle
+    # connections from being dropped silently between invocations.
+    tcp_keepalive=True,
+    connect_timeout=2,
+    read_timeout=10,
+    retries={'mode': 'standard', 'max_attempts': 3}
+)
+
+# Per-service additions to `CLIENT_CONFIG`. S3 presigned URLs are signed with SigV4
+# and use the bucket's regional virtual-hosted endpoint, which every region accepts.
+SERVICE_CONFIGS = {
+    's3': Config(signature_version='s3v4', s3={'addressing_style': 'virtual'}),
+}
+
+_lock = threading.RLock()
+_session = None
+_clients = {}
+_resources = {}
+_tables = {}
+
+
+def get_session():
+    """Returns the boto3 session shared by every client, creating it on first use."""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                session = boto3.session.Session(botocore_session=botocore.session.get_session())
+                instrumentation.register_hooks(session)
+                _session = session
+    return _session
+
+
+def get_client(service_name):
+    """Returns the shared low-level client for a service."""
+    if service_name not in _clients:
+        with _lock:
+            if service_name not in _clients:
+                config = CLIENT_CONFIG.merge(SERVICE_CONFIGS[service_name]) if service_name in SERVICE_CONFIGS else CLIENT_CONFIG
+                _clients[service_name] = get_session().client(service_name, config=config)
+    return _clients[service_name]
+
+
+def get_resource(service_name):
+    """Returns the shared resource for a service (e.g. 'dynamodb')."""
+    if service_name not in _resources:
+        with _lock:
+            if service_name not in _resources:
+                _resources[service_name] = get_session().resource(service_name, config=CLIENT_CONFIG)
+    return _resources[service_name]
+
+
+def get_table(table_name):
+    """Returns the shared DynamoDB `Table` resource for a table."""
+    if table_name not in _tables:
+        with _lock:
+            if table_name not in _tables:
+                _tables[table_name] = get_resource('dynamodb').Table(table_name)
+    return _tables[table_name]
+
+
+class LazyProxy:
+    """Stands in for a client or resource and creates it on first attribute access."""
+
+    def __init__(self, factory, *args):
+        self._factory = factory
+        self._args = args
+
+    def __getattr__(self, name):
+        return getattr(self._factory(*self._args), name)
+
+    def __repr__(self):
+        return f"<lazy {self._factory.__name__}{self._args!r}>"
+
+
+def lazy_client(service_name):
+    """Module-level stand-in for `boto3.client(service_name)`."""
+    return LazyProxy(get_client, service_name)
+
+
+def lazy_resource(service_name):
+    """Module-level stand-in for `boto3.resource(service_name)`."""
+    return LazyProxy(get_resource, service_name)
+
+
+def lazy_table(table_name):
+    """Module-level stand-in for `boto3.resource('dynamodb').Table(table_name)`."""
+    return LazyProxy(get_table, table_name)
+
+
+def reset():
+    """Drops every cached client and the session, e.g. between benchmark runs."""
+    global _session
+    with _lock:
+        _session = None
+        _clients.clear()
+        _resources.clear()
+        _tables.clear()
@@ -0,0 +1,153 @@
+"""
+Cold-start cost of every handler: import time, first invocation and a warm invocation.
+
+Each handler is loaded in a fresh Python process, the way a new Lambda container
+loads it. AWS calls are answered with canned responses at botocore's `before-send`
+hook, so the timings include client creation, request signing and response parsing
+but no network time. The median of `--runs` processes is reported.
+
+Usage:
+    python benchmarks/bench_cold_start.py [--runs 5] [--handler get_all_tasks]
+"""
+import argparse
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SAMPLE_TASK = {
+    'id': {'S': 'T_1000'},
+    'title': {'S': 'Inspect site'},
+    'status': {'S': 'in-progress'},
+    'due_date': {'S': '2025-01-31'},
+    'assigned_to': {'L': [{'M': {'email': {'S': 'member@example.com'}}}]},
+    'version': {'N': '2'}
+}
+
+TASK_BODY = {
+    'id': 'T_1000',
+    'title': 'Inspect site',
+    'startDate': '2025-01-20',
+    'dueDate': '2025-01-31',
+    'start_date': '2025-01-20',
+    'due_date': '2025-01-31',
+    'status': 'in-progress',
+    'assigned_to': [{'email': 'member@example.com'}]
+}
+
+# name: (file, function, positional arguments)
+HANDLERS = {
+    'get_all_tasks': ('get_all_tasks.py', 'lambda_handler', [{}, None]),
+    'get_task_by_id': ('get_task_by_id.py', 'lambda_handler', [{'queryStringParameters': {'id': 'T_1000'}}, None]),
+    'create_tasks': ('create_tasks.py', 'lambda_handler', [{'body': json.dumps(TASK_BODY)}, None]),
+    'update_status': ('update_status.py', 'lambda_handler', [{'body': json.dumps({'id': 'T_1000', 'status': 'in-progress'})}, None]),
+    'update_task_details': ('update_task_details.py', 'lambda_handler', [{'body': json.dumps(TASK_BODY)}, None]),
+    'delete_task_by_id': ('delete_task_by_id.py', 'lambda_handler', [{'queryStringParameters': {'id': 'T_1000'}}, None]),
+    'send_task_reminders': ('send_task_reminders.py', 'lambda_handler', [{'due_date': '2025-01-31'}, None]),
+    'get-users-from-members-group': ('get-users-from-members-group.py', 'lambda_handler', [{}, None]),
+    'get-users-by-sub': ('get-users-by-sub.py', 'get_user_emails', [['sub-1']]),
+    'post-confirmation-trigger': ('post-confirmation-trigger.py', 'lambda_handler', [
+        {'userName': 'member', 'request': {'userAttributes': {'email': 'member@example.com', 'sub': 'sub-1'}}},
+        None
+    ]),
+}
+
+JSON_RESPONSES = {
+    'GetItem': {'Item': SAMPLE_TASK},
+    'UpdateItem': {'Attributes': SAMPLE_TASK},
+    'DeleteItem': {'Attributes': SAMPLE_TASK},
+    'ListUsersInGroup': {'Users': []},
+    'ListUsers': {'Users': []},
+}
+
+
+class CannedBody:
+    def __init__(self, body):
+        self.body = body
+
+    def stream(self, **kwargs):
+        yield self.body
+
+
+def canned_response(request, **kwargs):
+    """Answers any AWS request without touching the network."""
+    from botocore.awsrequest import AWSResponse
+
+    target = request.headers.get('X-Amz-Target')
+    if target:
+        operation = target.decode().rsplit('.', 1)[-1] if isinstance(target, bytes) else target.rsplit('.', 1)[-1]
+        body = json.dumps(JSON_RESPONSES.get(operation, {})).encode()
+    else:
+        # Query protocol (SNS): an empty, well-formed result for the requested action.
+        params = dict(pair.split('=', 1) for pair in (request.body or b'').decode().split('&') if '=' in pair)
+        action = params.get('Action', 'Unknown')
+        body = f'<{action}Response><{action}Result></{action}Result></{action}Response>'.encode()
+    return AWSResponse(request.url, 200, {}, CannedBody(body))
+
+
+def run_child(name):
+    """Measures one handler in this (fresh) process and prints the timings as JSON."""
+    sys.path.insert(0, REPO_ROOT)
+    file_name, function_name, args = HANDLERS[name]
+
+    started = time.perf_counter()
+    import aws_clients
+    spec = importlib.util.spec_from_file_location(name.replace('-', '_'), os.path.join(REPO_ROOT, file_name))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    import_ms = (time.perf_counter() - started) * 1000
+
+    aws_clients.get_session().events.register('before-send', canned_response)
+    function = getattr(module, function_name)
+
+    started = time.perf_counter()
+    function(*args)
+    first_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    function(*args)
+    warm_ms = (time.perf_counter() - started) * 1000
+
+    print(json.dumps({'import_ms': import_ms, 'first_ms': first_ms, 'warm_ms': warm_ms}))
+
+
+def measure(name):
+    env = {
+        **os.environ,
+        'AWS_ACCESS_KEY_ID': 'benchmark',
+        'AWS_SECRET_ACCESS_KEY': 'benchmark',
+        'AWS_DEFAULT_REGION': 'eu-west-1',
+        'AWS_EC2_METADATA_DISABLED': 'true',
+    }
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', name],
+        env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--handler', action='append', choices=sorted(HANDLERS))
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child)
+        return
+
+    print(f"{'handler':<30} {'import ms':>10} {'first call ms':>14} {'warm call ms':>13}")
+    for name in args.handler or HANDLERS:
+        runs = [measure(name) for _ in range(args.runs)]
+        medians = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+        print(f"{name:<30} {medians['import_ms']:>10.1f} {medians['first_ms']:>14.1f} {medians['warm_ms']:>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
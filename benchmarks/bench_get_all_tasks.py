@@ -0,0 +1,101 @@
+"""
+Latency of get_all_tasks against table size.
+
+Compares the serial paginated scan with the parallel-segment full export
+against an in-memory stand-in for the Tasks table. Each scan call sleeps for a
+fixed round trip plus a per-item cost, and pages are cut at a simulated 1 MB.
+
+Usage:
+    python benchmarks/bench_get_all_tasks.py [--sizes 1000,10000,50000] [--segments 4]
+"""
+import argparse
+import os
+import sys
+import time
+import zlib
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-west-1')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import get_all_tasks  # noqa: E402
+
+ITEM_BYTES = 1024
+PAGE_BYTES = 1024 * 1024
+ROUND_TRIP_SECONDS = 0.01
+PER_ITEM_SECONDS = 0.00001
+
+
+class FakeScanClient:
+    """Serves `scan` calls from a list of items, honouring pagination and segments."""
+
+    def __init__(self, items):
+        self.items = items
+        self.calls = 0
+
+    def scan(self, TableName, Limit=None, ExclusiveStartKey=None, Segment=None, TotalSegments=None):
+        self.calls += 1
+        items = self.items
+        if TotalSegments:
+            items = [item for item in items if zlib.crc32(item['id']['S'].encode()) % TotalSegments == Segment]
+
+        start = 0
+        if ExclusiveStartKey:
+            start = next(i for i, item in enumerate(items) if item['id'] == ExclusiveStartKey['id']) + 1
+
+        page_size = PAGE_BYTES // ITEM_BYTES
+        if Limit:
+            page_size = min(page_size, Limit)
+        page = items[start:start + page_size]
+
+        time.sleep(ROUND_TRIP_SECONDS + PER_ITEM_SECONDS * len(page))
+
+        response = {'Items': page}
+        if start + page_size < len(items):
+            response['LastEvaluatedKey'] = {'id': page[-1]['id']}
+        return response
+
+
+def make_items(count):
+    return [
+        {
+            'id': {'S': f"T_{i:07d}"},
+            'title': {'S': f"Task {i}"},
+            'status': {'S': 'not-started'},
+            'due_date': {'S': '2025-01-31'}
+        }
+        for i in range(count)
+    ]
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000,50000')
+    parser.add_argument('--segments', type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{'items':>8} {'serial ms':>10} {'calls':>6} {f'parallel({args.segments}) ms':>16} {'calls':>6} {'speedup':>8}")
+    for size in [int(s) for s in args.sizes.split(',')]:
+        client = FakeScanClient(make_items(size))
+        get_all_tasks.dynamodb_client = client
+
+        serial, serial_seconds = timed(get_all_tasks.get_all_tasks)
+        serial_calls, client.calls = client.calls, 0
+
+        parallel, parallel_seconds = timed(lambda: get_all_tasks.export_all_tasks(args.segments))
+        parallel_calls = client.calls
+
+        assert len(serial) == len(parallel) == size
+        print(
+            f"{size:>8} {serial_seconds * 1000:>10.1f} {serial_calls:>6} "
+            f"{parallel_seconds * 1000:>16.1f} {parallel_calls:>6} {serial_seconds / parallel_seconds:>7.2f}x"
+        )
+
+
+if __name__ == '__main__':
+    main()
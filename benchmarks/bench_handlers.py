@@ -0,0 +1,417 @@
+"""
+Per-handler latency and AWS call counts against in-memory AWS backends.
+
+Every handler runs in this process against `fake_aws.FakeAWS`. Requests go through
+botocore as in Lambda, and each AWS call is answered from memory after a configurable
+latency. The fake is seeded with a synthetic workload: `--tasks` tasks, `--users`
+members and `--assignees` assignees per task, spread over `--days` due dates. Each
+scenario then invokes its handler `--iterations` times. The runner reports p50/p99
+latency, the number of error responses and the AWS calls made per invocation.
+
+Scenarios that write data run after the read-only ones, so the reads see the seeded
+workload. The delete scenarios use tasks from the second half of the task list, which
+no other scenario touches. `--json` writes the results to a file, so two runs can be compared.
+
+Usage:
+    python benchmarks/bench_handlers.py [--tasks 3000] [--users 50] [--assignees 3]
+        [--iterations 50] [--scenario get_all_tasks] [--no-latency]
+        [--description-bytes 6000] [--compress]
+        [--latency dynamodb=5] [--latency sns.PublishBatch=20] [--throttle dynamodb=0.02]
+"""
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import math
+import os
+import random
+import re
+import sys
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_aws import FakeAWS  # noqa: E402
+
+# Rough in-region round trips, in milliseconds (mean, jitter).
+DEFAULT_LATENCY_MS = {
+    'dynamodb': (5, 1),
+    'sns': (20, 5),
+    'cognito-idp': (30, 8),
+    'events': (20, 5),
+    's3': (15, 5),
+}
+
+GROUP_NAME = "Team-Members"
+FIRST_DUE_DATE = date(2025, 2, 1)
+
+# Vocabulary of the long field reports `--description-bytes` gives the seeded tasks.
+REPORT_WORDS = (
+    "valve gauge pressure seal pump inlet outlet flange gasket corrosion leak reading bar "
+    "replaced inspected photographed tightened cleaned north south east west unit panel "
+    "the a and of at on with after before no minor severe cracked worn ok checked logged"
+).split()
+
+
+def load_handler(file_name):
+    """Imports a handler file (several have dashes in their names) as a module."""
+    name = os.path.splitext(file_name)[0].replace('-', '_')
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, os.path.join(REPO_ROOT, file_name))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+class Workload:
+    """The synthetic users and tasks seeded into the fake, and request builders for them."""
+
+    def __init__(self, fake, tasks, users, assignees, days, seed=0, description_bytes=0):
+        self.fake = fake
+        self.random = random.Random(seed)
+        self.description_bytes = description_bytes
+        self.users = [
+            {'username': f"member{i}", 'email': f"member{i}@example.com", 'sub': f"sub-{i:05d}", 'name': f"Member {i}"}
+            for i in range(users)
+        ]
+        self.due_dates = [(FIRST_DUE_DATE + timedelta(days=day)).isoformat() for day in range(days)]
+        self.tasks = [self.make_task(f"T_S{i:06d}", assignees) for i in range(tasks)]
+        self.new_users = 0
+        self.deleted = 0
+        self.issuer = None
+        self.retried_request = None
+
+        import user_directory
+        for user in self.users:
+            fake.cognito.add_user(user['username'], {'email': user['email'], 'sub': user['sub']}, groups=[GROUP_NAME])
+        fake.dynamodb.put_items(user_directory.DIRECTORY_TABLE, [
+            user_directory.directory_record(user['sub'], user['email'], user['username'], GROUP_NAME)
+            for user in self.users
+        ])
+
+        import task_indexes
+        fake.dynamodb.put_items('Tasks', self.tasks)
+        fake.dynamodb.put_items('TaskAssignments', [row for task in self.tasks for row in task_indexes.assignment_rows(task)])
+
+        import task_stats
+        counters = Counter()
+        for task in self.tasks:
+            counters.update(task_stats.contribution(task))
+        fake.dynamodb.put_items('TaskStats', [{'id': task_stats.OVERVIEW_ID, **counters}])
+
+    def make_task(self, task_id, assignees):
+        members = self.random.sample(self.users, min(assignees, len(self.users)))
+        due_date = self.random.choice(self.due_dates)
+        return {
+            'id': task_id,
+            'title': f"Inspect site {task_id}",
+            'description': self.field_report(self.description_bytes) or "Check the pressure valves and photograph the gauges.",
+            'files': [],
+            'status': self.random.choice(['not-started', 'in-progress']),
+            'start_date': (date.fromisoformat(due_date) - timedelta(days=7)).isoformat(),
+            'due_date': due_date,
+            'assigned_to': [{'email': m['email'], 'name': m['name'], 'sub': m['sub']} for m in members],
+            'assignee_count': len(members),
+            'next_completion': 1,
+            'version': 1
+        }
+
+    def field_report(self, size):
+        """About `size` bytes of field-report prose (random words, so it compresses like text)."""
+        words, length = [], 0
+        while length < size:
+            word = self.random.choice(REPORT_WORDS)
+            words.append(word)
+            length += len(word) + 1
+        return ' '.join(words)
+
+    def task(self, i):
+        return self.tasks[i % len(self.tasks)]
+
+    def create_body(self, i):
+        members = self.random.sample(self.users, min(3, len(self.users)))
+        return {
+            'title': f"New task {i}",
+            'description': "Created by the benchmark.",
+            'startDate': '2025-02-01',
+            'dueDate': self.random.choice(self.due_dates),
+            'assigned_to': [{'email': m['email'], 'name': m['name'], 'sub': m['sub']} for m in members]
+        }
+
+    def keyed_create(self, i, retried):
+        """A `create_tasks` request with an `Idempotency-Key`; a retry repeats the first request."""
+        if retried:
+            if self.retried_request is None:
+                self.retried_request = {**body(self.create_body(i)), 'headers': {'Idempotency-Key': 'bench-retried'}}
+            return self.retried_request
+        return {**body(self.create_body(i)), 'headers': {'Idempotency-Key': f"bench-{i}"}}
+
+    def details_body(self, i):
+        task = self.task(i)
+        return {
+            'id': task['id'],
+            'title': task['title'] + f" (edit {i})"
+        }
+
+    def authorizer_event(self, i, distinct):
+        """A TOKEN authorizer event; the same token every time unless `distinct`."""
+        if self.issuer is None:
+            from fake_jwt import TokenIssuer
+            self.issuer = TokenIssuer().install()
+            self.tokens = {}
+        key = i if distinct else 0
+        if key not in self.tokens:
+            user = self.users[key % len(self.users)]
+            self.tokens[key] = self.issuer.token({'sub': user['sub'], 'email': user['email'], 'cognito:username': user['username'],
+                                                  'cognito:groups': [GROUP_NAME], 'jti': f"bench-{key}"})
+        return {'type': 'TOKEN', 'authorizationToken': f"Bearer {self.tokens[key]}",
+                'methodArn': 'arn:aws:execute-api:eu-west-1:123456789012:api1234/prod/GET/get_all_tasks'}
+
+    def upload_body(self, i):
+        """Asks for the upload of a 40 MiB photo (five 8 MiB parts) to an existing task."""
+        return {'id': self.task(i)['id'], 'name': f"photo-{i}.jpg", 'size': 40 * 1024 * 1024, 'content_type': 'image/jpeg'}
+
+    def uploaded_parts(self, i):
+        """Starts an upload and sends its single 64 KiB part straight to the fake S3."""
+        import task_attachments
+        task_id = self.task(i)['id']
+        key = task_attachments.attachment_key(task_id, f"notes-{i}.txt")
+        _, body, _ = self.fake.s3.create_multipart_upload(task_attachments.BUCKET, key, {}, {'Content-Type': 'text/plain'}, b'')
+        upload_id = re.search(rb'<UploadId>(\w+)</UploadId>', body).group(1).decode()
+        _, _, headers = self.fake.s3.upload_part(task_attachments.BUCKET, key, {'uploadId': upload_id, 'partNumber': '1'}, {}, b'n' * 65536)
+        return {'id': task_id, 'key': key, 'upload_id': upload_id, 'parts': [{'part_number': 1, 'etag': headers['ETag']}]}
+
+    def attachment_query(self, i):
+        """Attaches a file to a task (outside the timed call) and asks for its download URL."""
+        import complete_attachment_upload
+        import task_attachments
+        task_id = self.task(i)['id']
+        key = task_attachments.attachment_key(task_id, f"photo-{i}.jpg")
+        self.fake.s3.put_object(task_attachments.BUCKET, key, {}, {'Content-Type': 'image/jpeg'}, b'j' * 65536)
+        stored = self.fake.s3.objects[(task_attachments.BUCKET, key)]
+        record = complete_attachment_upload.file_record(key, {
+            'ContentLength': len(stored['data']), 'ContentType': stored['content_type'], 'ETag': stored['etag']})
+        task = self.fake.dynamodb.get('Tasks', {'id': task_id})
+        self.fake.dynamodb.put_items('Tasks', [{**task, 'files': list(task.get('files') or []) + [record]}])
+        return {'id': task_id, 'key': key}
+
+    @staticmethod
+    def stream_record(event_id, sequence_number, old_item, new_item):
+        """A `Tasks` stream record (view type NEW_AND_OLD_IMAGES) for a write."""
+        from boto3.dynamodb.types import TypeSerializer
+        serializer = TypeSerializer()
+        images = {}
+        if old_item is not None:
+            images['OldImage'] = {name: serializer.serialize(value) for name, value in old_item.items()}
+        if new_item is not None:
+            images['NewImage'] = {name: serializer.serialize(value) for name, value in new_item.items()}
+        return {
+            'eventID': event_id,
+            'eventName': 'INSERT' if old_item is None else 'REMOVE' if new_item is None else 'MODIFY',
+            'dynamodb': {
+                'Keys': {'id': {'S': (new_item or old_item)['id']}},
+                **images,
+                'SequenceNumber': sequence_number,
+                'StreamViewType': 'NEW_AND_OLD_IMAGES'
+            }
+        }
+
+    def stream_event(self, i, count):
+        """A `Tasks` stream batch with the INSERT records of `count` new tasks."""
+        import create_tasks
+        records = []
+        for j in range(count):
+            item = create_tasks.build_task_item(f"T_E{i:04d}{j:03d}", self.create_body(i * count + j))
+            records.append(self.stream_record(f"event-{i}-{j}", f"{i:08d}{j:04d}", None, item))
+        return {'Records': records}
+
+    def status_change_event(self, i, count):
+        """A `Tasks` stream batch with MODIFY records that move `count` tasks to a new status."""
+        records = []
+        for j in range(count):
+            task = self.task(i * count + j)
+            changed = {**task, 'status': self.random.choice(['in-progress', 'completed']), 'version': task['version'] + 1}
+            records.append(self.stream_record(f"status-{i}-{j}", f"{i:08d}{j:04d}", task, changed))
+        return {'Records': records}
+
+    def take_for_delete(self, count):
+        """IDs of tasks no other scenario touches, taken from the end of the task list."""
+        if self.deleted + count > len(self.tasks) // 2:
+            raise SystemExit("Not enough tasks left to delete; raise --tasks or lower --iterations")
+        ids = [task['id'] for task in self.tasks[len(self.tasks) - self.deleted - count:len(self.tasks) - self.deleted]]
+        self.deleted += count
+        return ids
+
+    def confirmation_event(self, i):
+        self.new_users += 1
+        username = f"new-member{self.new_users}"
+        email = f"{username}@example.com"
+        sub = f"new-sub-{self.new_users:05d}"
+        # Cognito has confirmed the user by the time the trigger runs.
+        self.fake.cognito.add_user(username, {'email': email, 'sub': sub})
+        return {'userName': username, 'request': {'userAttributes': {'email': email, 'sub': sub}}}
+
+
+def query(**params):
+    return {'queryStringParameters': params}
+
+
+def body(payload):
+    return {'body': json.dumps(payload)}
+
+
+# name -> (handler file, function, builds the positional arguments for iteration i)
+SCENARIOS = {
+    'get_all_tasks': ('get_all_tasks.py', 'lambda_handler', lambda w, i: [query(limit='50'), None]),
+    'get_all_tasks&fields=all': ('get_all_tasks.py', 'lambda_handler', lambda w, i: [query(limit='50', fields='all'), None]),
+    'get_all_tasks?assignee': ('get_all_tasks.py', 'lambda_handler', lambda w, i: [
+        query(assignee=w.users[i % len(w.users)]['email']), None]),
+    'get_all_tasks?status&due': ('get_all_tasks.py', 'lambda_handler', lambda w, i: [
+        query(status='in-progress', due_from=w.due_dates[0], due_to=w.due_dates[len(w.due_dates) // 2]), None]),
+    'get_all_tasks?export=full': ('get_all_tasks.py', 'lambda_handler', lambda w, i: [query(export='full'), None]),
+    'get_task_by_id': ('get_task_by_id.py', 'lambda_handler', lambda w, i: [query(id=w.task(i * 7)['id']), None]),
+    'get_task_by_id (repeat)': ('get_task_by_id.py', 'lambda_handler', lambda w, i: [query(id=w.task(i % 5)['id']), None]),
+    'get_task_by_id?ids (50)': ('get_task_by_id.py', 'lambda_handler', lambda w, i: [
+        query(ids=','.join(w.task(i * 50 + j)['id'] for j in range(50))), None]),
+    'get-users-from-members-group': ('get-users-from-members-group.py', 'lambda_handler', lambda w, i: [{}, None]),
+    'get-users-by-sub (3 subs)': ('get-users-by-sub.py', 'get_user_emails', lambda w, i: [
+        [user['sub'] for user in w.random.sample(w.users, min(3, len(w.users)))]]),
+    'get-users-by-sub (25 subs)': ('get-users-by-sub.py', 'get_user_emails', lambda w, i: [
+        [user['sub'] for user in w.random.sample(w.users, min(25, len(w.users)))]]),
+    'jwt_authorizer (same token)': ('jwt_authorizer.py', 'lambda_handler', lambda w, i: [w.authorizer_event(i, False), None]),
+    'jwt_authorizer (new token)': ('jwt_authorizer.py', 'lambda_handler', lambda w, i: [w.authorizer_event(i, True), None]),
+    'send_task_reminders': ('send_task_reminders.py', 'lambda_handler', lambda w, i: [
+        {'due_date': w.due_dates[i % len(w.due_dates)]}, None]),
+    'create_tasks': ('create_tasks.py', 'lambda_handler', lambda w, i: [body(w.create_body(i)), None]),
+    'create_tasks (bulk 25)': ('create_tasks.py', 'lambda_handler', lambda w, i: [
+        body({'tasks': [w.create_body(i * 25 + j) for j in range(25)]}), None]),
+    'create_tasks (Idempotency-Key)': ('create_tasks.py', 'lambda_handler', lambda w, i: [w.keyed_create(i, False), None]),
+    'create_tasks (retried)': ('create_tasks.py', 'lambda_handler', lambda w, i: [w.keyed_create(i, True), None]),
+    'update_status': ('update_status.py', 'lambda_handler', lambda w, i: [
+        body({'id': w.task(i)['id'], 'status': 'in-progress'}), None]),
+    'update_status (complete)': ('update_status.py', 'lambda_handler', lambda w, i: [
+        body({'id': w.task(i)['id'], 'status': 'completed', 'user': w.task(i)['assigned_to'][0]['email']}), None]),
+    'update_task_details': ('update_task_details.py', 'lambda_handler', lambda w, i: [body(w.details_body(i)), None]),
+    'process_task_events': ('process_task_events.py', 'lambda_handler', lambda w, i: [w.stream_event(i, 1), None]),
+    'process_task_events (batch 25)': ('process_task_events.py', 'lambda_handler', lambda w, i: [
+        w.stream_event(1000 + i, 25), None]),
+    'process_task_events (edits 25)': ('process_task_events.py', 'lambda_handler', lambda w, i: [
+        w.status_change_event(i, 25), None]),
+    'get_task_stats': ('get_task_stats.py', 'lambda_handler', lambda w, i: [query(today='2025-02-10'), None]),
+    'update_task_stats (batch 25)': ('update_task_stats.py', 'lambda_handler', lambda w, i: [
+        w.status_change_event(i, 25), None]),
+    'get_attachment_url': ('get_attachment_url.py', 'lambda_handler', lambda w, i: [
+        {'queryStringParameters': w.attachment_query(i)}, None]),
+    'create_attachment_upload': ('create_attachment_upload.py', 'lambda_handler', lambda w, i: [body(w.upload_body(i)), None]),
+    'complete_attachment_upload': ('complete_attachment_upload.py', 'lambda_handler', lambda w, i: [
+        body(w.uploaded_parts(i)), None]),
+    'rebuild_task_stats': ('rebuild_task_stats.py', 'rebuild_task_stats', lambda w, i: []),
+    'compress_task_items (dry run)': ('compress_task_items.py', 'compress_task_items', lambda w, i: [8, None, True]),
+    'reconcile_user_directory': ('reconcile_user_directory.py', 'reconcile_user_directory', lambda w, i: []),
+    'post-confirmation-trigger': ('post-confirmation-trigger.py', 'lambda_handler', lambda w, i: [
+        w.confirmation_event(i), None]),
+    'delete_task_by_id': ('delete_task_by_id.py', 'lambda_handler', lambda w, i: [
+        query(id=w.take_for_delete(1)[0]), None]),
+    'delete_task_by_id (bulk 25)': ('delete_task_by_id.py', 'lambda_handler', lambda w, i: [
+        query(ids=','.join(w.take_for_delete(25))), None]),
+}
+
+
+def percentile(values, p):
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(p / 100 * len(ordered)) - 1))]
+
+
+def is_error(result):
+    if isinstance(result, dict) and result.get('batchItemFailures'):
+        return True
+    return isinstance(result, dict) and isinstance(result.get('statusCode'), int) and result['statusCode'] >= 400
+
+
+def run_scenario(fake, workload, name, iterations):
+    file_name, function_name, build_args = SCENARIOS[name]
+    function = getattr(load_handler(file_name), function_name)
+
+    latencies, errors, calls = [], 0, Counter()
+    for i in range(iterations):
+        args = build_args(workload, i)
+        before = fake.snapshot()
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = function(*args)
+        latencies.append((time.perf_counter() - started) * 1000)
+        calls.update(fake.snapshot() - before)
+        errors += is_error(result)
+
+    return {
+        'scenario': name,
+        'iterations': iterations,
+        'p50_ms': percentile(latencies, 50),
+        'p99_ms': percentile(latencies, 99),
+        'errors': errors,
+        'calls_per_invocation': {operation: count / iterations for operation, count in sorted(calls.items())},
+    }
+
+
+def parse_settings(entries, convert):
+    settings = {}
+    for entry in entries or []:
+        key, _, value = entry.partition('=')
+        settings[key] = convert(value)
+    return settings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', type=int, default=3000)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--assignees', type=int, default=3)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--description-bytes', type=int, default=0, help="give every seeded task a description this long")
+    parser.add_argument('--compress', action='store_true', help="compress the seeded tasks (compress_task_items) before the scenarios run")
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--scenario', action='append', choices=list(SCENARIOS))
+    parser.add_argument('--no-latency', action='store_true', help="answer AWS calls instantly (CPU cost only)")
+    parser.add_argument('--latency', action='append', metavar='SERVICE[.Operation]=MS')
+    parser.add_argument('--throttle', action='append', metavar='SERVICE[.Operation]=RATE')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', metavar='PATH', help="also write the results to this file")
+    args = parser.parse_args()
+
+    scenarios = args.scenario or list(SCENARIOS)
+    latency = {} if args.no_latency else dict(DEFAULT_LATENCY_MS)
+    latency.update(parse_settings(args.latency, float))
+    fake = FakeAWS(latency_ms=latency, throttle_rate=parse_settings(args.throttle, float), seed=args.seed).install()
+    workload = Workload(fake, args.tasks, args.users, args.assignees, args.days, seed=args.seed,
+                        description_bytes=args.description_bytes)
+    if args.compress:
+        with contextlib.redirect_stdout(io.StringIO()):
+            load_handler('compress_task_items.py').compress_task_items()
+
+    print(f"{args.tasks} tasks, {args.users} users, {args.assignees} assignees per task, "
+          f"{args.iterations} iterations per scenario")
+    print(f"{'scenario':<30} {'p50 ms':>8} {'p99 ms':>8} {'errors':>6}  AWS calls per invocation")
+    results = []
+    for name in scenarios:
+        result = run_scenario(fake, workload, name, args.iterations)
+        results.append(result)
+        calls = ', '.join(f"{operation} {count:g}" for operation, count in result['calls_per_invocation'].items())
+        print(f"{name:<30} {result['p50_ms']:>8.1f} {result['p99_ms']:>8.1f} {result['errors']:>6}  {calls}")
+
+    if fake.throttled:
+        print("throttled: " + ', '.join(f"{operation} {count}" for operation, count in sorted(fake.throttled.items())))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'workload': vars(args), 'results': results, 'throttled': dict(fake.throttled)}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
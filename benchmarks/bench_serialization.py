@@ -0,0 +1,86 @@
+"""
+Response serialization: boto3 resource deserialization + json.dumps vs. dynamodb_json.
+
+"resource path" is what the read handlers did before: every wire-format item goes
+through `TypeDeserializer` (building `Decimal`s and sets) and the result through
+`json.dumps(..., default=json_default)`. "direct path" is `dynamodb_json.items_to_json`
+on the wire-format items. Both start from the items botocore has already parsed,
+so the HTTP response parsing they share is not measured.
+
+Usage:
+    python benchmarks/bench_serialization.py [--sizes 1000,10000] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dynamodb_json  # noqa: E402
+
+
+def make_item(i):
+    return {
+        'id': {'S': f"T_{i:07d}"},
+        'title': {'S': f"Inspect pump station {i}"},
+        'description': {'S': "Check pressure valves, log readings and photograph the gauges. " * 3},
+        'files': {'L': []},
+        'status': {'S': 'in-progress'},
+        'start_date': {'S': '2025-01-20'},
+        'due_date': {'S': '2025-01-31'},
+        'assigned_to': {'L': [
+            {'M': {'email': {'S': f"member{j}@example.com"}, 'name': {'S': f"Member {j}"}, 'sub': {'S': f"sub-{j}"}}}
+            for j in range(3)
+        ]},
+        'completed_by': {'SS': ['member0@example.com']},
+        'assignee_count': {'N': '3'},
+        'next_completion': {'N': '2'},
+        'version': {'N': str(i % 17 + 1)}
+    }
+
+
+def resource_path(items):
+    return json.dumps(
+        [dynamodb_json.deserialize_item(item) for item in items],
+        sort_keys=True,
+        default=dynamodb_json.json_default
+    )
+
+
+def direct_path(items):
+    return dynamodb_json.items_to_json(items)
+
+
+def best_of(fn, items, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(items)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'items':>8} {'resource path ms':>17} {'direct path ms':>15} {'speedup':>8}")
+    for size in [int(s) for s in args.sizes.split(',')]:
+        items = [make_item(i) for i in range(size)]
+        assert json.loads(resource_path(items)) == json.loads(direct_path(items))
+
+        resource_seconds = best_of(resource_path, items, args.repeat)
+        direct_seconds = best_of(direct_path, items, args.repeat)
+        print(
+            f"{size:>8} {resource_seconds * 1000:>17.1f} {direct_seconds * 1000:>15.1f} "
+            f"{resource_seconds / direct_seconds:>7.2f}x"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,1831 @@
+"""
+In-memory stand-ins for the AWS services the handlers call.
+
+`FakeAWS.install()` hooks botocore's `before-send` event on the shared `aws_clients`
+session. Every request still goes through botocore as it would in Lambda (parameter
+validation, serialization, signing, retries, response parsing), but it is answered from
+memory instead of the network:
+
+    DynamoDB     GetItem, PutItem, UpdateItem, DeleteItem, BatchGetItem, BatchWriteItem,
+                 Query, Scan and TransactWriteItems on the Tasks, TaskAssignments,
+                 TaskNotifications, TaskStats, UserDirectory and IdempotencyKeys tables and their indexes,
+                 with the condition, update, key condition and projection expressions
+                 the handlers use
+    SNS          Publish, PublishBatch, Subscribe
+    Cognito      ListUsers, ListUsersInGroup, AdminGetUser, AdminAddUserToGroup
+    EventBridge  PutRule, PutTargets, ListRules, ListTargetsByRule, RemoveTargets, DeleteRule
+    Lambda       Invoke (recorded, not run)
+    S3           CreateMultipartUpload, UploadPart, CompleteMultipartUpload,
+                 AbortMultipartUpload, PutObject, HeadObject, GetObject (with `Range`),
+                 DeleteObject, DeleteObjects, and presigned URLs through `FakeS3.fetch`
+
+Each call can be given a latency (a sleep in the calling thread, so calls made from a
+thread pool overlap as they would over the network) and a throttling rate. Throttled
+calls fail with the service's throttling error and go through botocore's retries.
+`BatchGetItem`, `BatchWriteItem` and `PublishBatch` throttle per entry instead, returning
+unprocessed or failed entries the way the real services do. Every attempt is counted
+per operation in `FakeAWS.calls`.
+
+Usage:
+
+    fake = FakeAWS(latency_ms={'dynamodb': 5, 'sns.PublishBatch': (20, 5)},
+                   throttle_rate={'dynamodb': 0.01})
+    fake.install()
+    fake.dynamodb.put_items('Tasks', [{'id': 'T_1', 'title': 'Inspect site'}])
+    fake.cognito.add_user('member', {'email': 'member@example.com', 'sub': 'sub-1'})
+"""
+import base64
+import bisect
+import copy
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter
+from datetime import datetime, timezone
+from decimal import Decimal
+from urllib.parse import parse_qsl, unquote, urlsplit
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+from botocore.awsrequest import AWSResponse
+
+import aws_clients
+
+# botocore service ids, as they appear in event names, -> client service names.
+SERVICE_NAMES = {
+    'dynamodb': 'dynamodb',
+    'sns': 'sns',
+    'cognito-identity-provider': 'cognito-idp',
+    'eventbridge': 'events',
+    'lambda': 'lambda',
+    's3': 's3',
+}
+
+THROTTLING_ERRORS = {
+    'dynamodb': 'ProvisionedThroughputExceededException',
+    'sns': 'Throttling',
+    'cognito-idp': 'TooManyRequestsException',
+    'events': 'ThrottlingException',
+    'lambda': 'TooManyRequestsException',
+    's3': 'SlowDown',
+}
+
+# Operations that throttle entry by entry rather than failing as a whole.
+PARTIALLY_THROTTLED_OPERATIONS = {'BatchGetItem', 'BatchWriteItem', 'PublishBatch'}
+
+# The tables the handlers use: key attributes and index keys (partition key, sort key).
+TABLES = {
+    'Tasks': {
+        'key': ('id',),
+        'indexes': {
+            'status-due_date-index': ('status', 'due_date'),
+            'due_date-index': ('due_date',),
+        },
+    },
+    'TaskAssignments': {
+        'key': ('email', 'task_id'),
+        'indexes': {
+            'due_date-index': ('email', 'due_date'),
+            'status_due_date-index': ('email', 'status_due_date'),
+        },
+    },
+    'TaskNotifications': {
+        'key': ('id',),
+        'indexes': {},
+    },
+    'TaskStats': {
+        'key': ('id',),
+        'indexes': {},
+    },
+    'IdempotencyKeys': {
+        'key': ('id',),
+        'indexes': {},
+    },
+    'UserDirectory': {
+        'key': ('sub',),
+        'indexes': {
+            'group-index': ('group', 'email'),
+        },
+    },
+}
+
+PAGE_BYTES = 1024 * 1024
+MISSING = object()
+
+
+class FakeError(Exception):
+    """An error response: the service error code, a message and extra modeled fields."""
+
+    def __init__(self, code, message='', status_code=400, **fields):
+        super().__init__(f"{code}: {message}")
+        self.code = code
+        self.message = message
+        self.status_code = status_code
+        self.fields = fields
+
+
+class CannedBody:
+    """The raw body botocore reads a response from."""
+
+    def __init__(self, body):
+        self.body = body
+
+    def stream(self, **kwargs):
+        yield self.body
+
+    def read(self, amt=None):
+        body, self.body = (self.body, b'') if amt is None else (self.body[:amt], self.body[amt:])
+        return body
+
+
+# --- DynamoDB values -----------------------------------------------------------------
+
+def from_wire(value):
+    """Turns a wire-format attribute value (as sent in the JSON body) into a Python value."""
+    (type_code, data), = value.items()
+    if type_code == 'S':
+        return data
+    if type_code == 'N':
+        return Decimal(data)
+    if type_code == 'B':
+        return base64.b64decode(data)
+    if type_code == 'BOOL':
+        return data
+    if type_code == 'NULL':
+        return None
+    if type_code == 'M':
+        return {name: from_wire(element) for name, element in data.items()}
+    if type_code == 'L':
+        return [from_wire(element) for element in data]
+    if type_code == 'SS':
+        return set(data)
+    if type_code == 'NS':
+        return {Decimal(element) for element in data}
+    if type_code == 'BS':
+        return {base64.b64decode(element) for element in data}
+    raise FakeError('ValidationException', f"Unsupported type {type_code}")
+
+
+def format_number(value):
+    """Formats a number the way DynamoDB returns it: normalized, without an exponent."""
+    text = format(Decimal(value).normalize(), 'f')
+    return '0' if text in ('-0', '0') else text
+
+
+def type_code(value):
+    """The DynamoDB type of a Python value."""
+    if isinstance(value, bool):
+        return 'BOOL'
+    if value is None:
+        return 'NULL'
+    if isinstance(value, str):
+        return 'S'
+    if isinstance(value, (int, float, Decimal)):
+        return 'N'
+    if isinstance(value, (bytes, bytearray)):
+        return 'B'
+    if isinstance(value, dict):
+        return 'M'
+    if isinstance(value, (list, tuple)):
+        return 'L'
+    if isinstance(value, (set, frozenset)):
+        return type_code(next(iter(value))) + 'S'
+    raise FakeError('ValidationException', f"Unsupported value {value!r}")
+
+
+def to_wire(value):
+    """Turns a Python value into a wire-format attribute value."""
+    code = type_code(value)
+    if code == 'S':
+        return {'S': value}
+    if code == 'N':
+        return {'N': format_number(value)}
+    if code == 'B':
+        return {'B': base64.b64encode(value).decode('ascii')}
+    if code == 'BOOL':
+        return {'BOOL': value}
+    if code == 'NULL':
+        return {'NULL': True}
+    if code == 'M':
+        return {'M': {name: to_wire(element) for name, element in value.items()}}
+    if code == 'L':
+        return {'L': [to_wire(element) for element in value]}
+    if code == 'SS':
+        return {'SS': sorted(value)}
+    if code == 'NS':
+        return {'NS': [format_number(element) for element in sorted(value)]}
+    return {'BS': [base64.b64encode(element).decode('ascii') for element in sorted(value)]}
+
+
+def item_from_wire(item):
+    return {name: from_wire(value) for name, value in item.items()}
+
+
+def item_to_wire(item):
+    return {name: to_wire(value) for name, value in item.items()}
+
+
+def normalize(value):
+    """Turns ints and floats (as passed to `put_items`) into the `Decimal`s DynamoDB stores."""
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float)):
+        return Decimal(str(value))
+    if isinstance(value, dict):
+        return {name: normalize(element) for name, element in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize(element) for element in value]
+    if isinstance(value, (set, frozenset)):
+        return {normalize(element) for element in value}
+    return value
+
+
+# DynamoDB's item size limit.
+MAX_ITEM_BYTES = 400 * 1024
+
+
+def item_size(item, wire=None):
+    """Approximates the stored size of an item in bytes."""
+    return len(json.dumps(wire or item_to_wire(item), separators=(',', ':')))
+
+
+# --- Expressions ---------------------------------------------------------------------
+
+TOKEN_PATTERN = re.compile(
+    r"\s*(?:(?P<name>#[A-Za-z0-9_]+)|(?P<value>:[A-Za-z0-9_]+)|(?P<number>\d+)"
+    r"|(?P<op><>|<=|>=|=|<|>|\(|\)|\[|\]|,|\.|\+|-)|(?P<word>[A-Za-z_][A-Za-z0-9_]*))"
+)
+
+
+def tokenize(expression):
+    tokens = []
+    position = 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = TOKEN_PATTERN.match(expression, position)
+        if not match or match.end() == position:
+            raise FakeError('ValidationException', f"Invalid expression near {expression[position:]!r}")
+        tokens.append((match.lastgroup, match.group(match.lastgroup)))
+        position = match.end()
+    return tokens
+
+
+def get_path(item, path):
+    """The value at a document path, or MISSING."""
+    value = item
+    for element in path:
+        if isinstance(element, int):
+            if not isinstance(value, list) or element >= len(value):
+                return MISSING
+            value = value[element]
+        else:
+            if not isinstance(value, dict) or element not in value:
+                return MISSING
+            value = value[element]
+    return value
+
+
+def set_path(item, path, value):
+    parent = get_path(item, path[:-1])
+    if parent is MISSING:
+        raise FakeError('ValidationException', "The document path provided in the update expression is invalid for update")
+    last = path[-1]
+    if isinstance(last, int):
+        if last >= len(parent):
+            parent.append(value)
+        else:
+            parent[last] = value
+    else:
+        parent[last] = value
+
+
+def remove_path(item, path):
+    parent = get_path(item, path[:-1])
+    last = path[-1]
+    if isinstance(last, int):
+        if isinstance(parent, list) and last < len(parent):
+            del parent[last]
+    elif isinstance(parent, dict):
+        parent.pop(last, None)
+
+
+def values_equal(left, right):
+    if left is MISSING or right is MISSING:
+        return False
+    return type_code(left) == type_code(right) and left == right
+
+
+def compare(left, operator, right):
+    if operator == '=':
+        return values_equal(left, right)
+    if operator == '<>':
+        return not values_equal(left, right)
+    if left is MISSING or right is MISSING or type_code(left) != type_code(right) or type_code(left) not in ('S', 'N', 'B'):
+        return False
+    if operator == '<':
+        return left < right
+    if operator == '<=':
+        return left <= right
+    if operator == '>':
+        return left > right
+    return left >= right
+
+
+def value_size(value):
+    if isinstance(value, str):
+        return Decimal(len(value.encode()))
+    if isinstance(value, (bytes, bytearray, list, dict, set, frozenset)):
+        return Decimal(len(value))
+    raise FakeError('ValidationException', "Invalid operand type for size()")
+
+
+class ExpressionParser:
+    """
+    Recursive-descent parser for DynamoDB expressions.
+
+    Conditions compile to `item -> bool` functions, operands to `item -> value` functions
+    and update expressions to `item -> set of updated top-level attributes` functions that
+    change the item in place. Equalities seen in a condition are kept in `equalities`, which
+    is how a key condition yields its partition key.
+    """
+
+    def __init__(self, expression, names=None, values=None):
+        self.tokens = tokenize(expression)
+        self.position = 0
+        self.names = names or {}
+        self.values = values or {}
+        self.equalities = {}
+
+    def peek(self, offset=0):
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def advance(self):
+        token = self.peek()
+        if token[0] is None:
+            raise FakeError('ValidationException', "Unexpected end of expression")
+        self.position += 1
+        return token
+
+    def at_keyword(self, *words):
+        kind, text = self.peek()
+        return kind == 'word' and text.upper() in words
+
+    def accept_keyword(self, word):
+        if self.at_keyword(word):
+            self.position += 1
+            return True
+        return False
+
+    def expect(self, text):
+        kind, token = self.advance()
+        if token != text:
+            raise FakeError('ValidationException', f"Expected {text!r}, found {token!r}")
+
+    def finish(self):
+        if self.peek()[0] is not None:
+            raise FakeError('ValidationException', f"Unexpected token {self.peek()[1]!r}")
+
+    # Paths and operands
+
+    def name(self):
+        kind, text = self.advance()
+        if kind == 'name':
+            if text not in self.names:
+                raise FakeError('ValidationException', f"An expression attribute name used in the document path is not defined; attribute name: {text}")
+            return self.names[text]
+        if kind == 'word':
+            return text
+        raise FakeError('ValidationException', f"Expected an attribute name, found {text!r}")
+
+    def path(self):
+        path = [self.name()]
+        while True:
+            if self.peek() == ('op', '.'):
+                self.advance()
+                path.append(self.name())
+            elif self.peek() == ('op', '['):
+                self.advance()
+                kind, text = self.advance()
+                if kind != 'number':
+                    raise FakeError('ValidationException', "List index must be a number")
+                path.append(int(text))
+                self.expect(']')
+            else:
+                return path
+
+    def value(self):
+        kind, text = self.advance()
+        if text not in self.values:
+            raise FakeError('ValidationException', f"An expression attribute value used in expression is not defined; attribute value: {text}")
+        value = self.values[text]
+
+        def constant(item):
+            return value
+        constant.value = value
+        return constant
+
+    def operand(self):
+        kind, text = self.peek()
+        if kind == 'value':
+            return self.value()
+        if kind == 'word' and text == 'size' and self.peek(1) == ('op', '('):
+            self.advance()
+            self.expect('(')
+            path = self.path()
+            self.expect(')')
+            return lambda item: value_size(get_path(item, path)) if get_path(item, path) is not MISSING else MISSING
+        path = self.path()
+
+        def attribute(item):
+            return get_path(item, path)
+        attribute.path = path
+        return attribute
+
+    # Conditions
+
+    def condition(self):
+        left = self.conjunction()
+        while self.accept_keyword('OR'):
+            right = self.conjunction()
+            left = (lambda a, b: lambda item: a(item) or b(item))(left, right)
+        return left
+
+    def conjunction(self):
+        left = self.negation()
+        while self.accept_keyword('AND'):
+            right = self.negation()
+            left = (lambda a, b: lambda item: a(item) and b(item))(left, right)
+        return left
+
+    def negation(self):
+        if self.accept_keyword('NOT'):
+            inner = self.negation()
+            return lambda item: not inner(item)
+        return self.predicate()
+
+    def predicate(self):
+        if self.peek() == ('op', '('):
+            self.advance()
+            condition = self.condition()
+            self.expect(')')
+            return condition
+
+        kind, text = self.peek()
+        if kind == 'word' and self.peek(1) == ('op', '(') and text in (
+                'attribute_exists', 'attribute_not_exists', 'begins_with', 'contains', 'attribute_type'):
+            return self.function()
+
+        left = self.operand()
+        if self.accept_keyword('BETWEEN'):
+            low = self.operand()
+            if not self.accept_keyword('AND'):
+                raise FakeError('ValidationException', "BETWEEN needs AND")
+            high = self.operand()
+            return lambda item: compare(left(item), '>=', low(item)) and compare(left(item), '<=', high(item))
+        if self.accept_keyword('IN'):
+            self.expect('(')
+            options = [self.operand()]
+            while self.peek() == ('op', ','):
+                self.advance()
+                options.append(self.operand())
+            self.expect(')')
+            return lambda item: any(values_equal(left(item), option(item)) for option in options)
+
+        kind, operator = self.advance()
+        if operator not in ('=', '<>', '<', '<=', '>', '>='):
+            raise FakeError('ValidationException', f"Invalid operator {operator!r}")
+        right = self.operand()
+        if operator == '=' and len(getattr(left, 'path', ())) == 1 and hasattr(right, 'value'):
+            self.equalities[left.path[0]] = right.value
+        return lambda item: compare(left(item), operator, right(item))
+
+    def function(self):
+        kind, name = self.advance()
+        self.expect('(')
+        if name in ('attribute_exists', 'attribute_not_exists'):
+            path = self.path()
+            self.expect(')')
+            if name == 'attribute_exists':
+                return lambda item: get_path(item, path) is not MISSING
+            return lambda item: get_path(item, path) is MISSING
+
+        first = self.operand()
+        self.expect(',')
+        second = self.operand()
+        self.expect(')')
+        if name == 'begins_with':
+            def begins_with(item):
+                value, prefix = first(item), second(item)
+                return (isinstance(value, str) and isinstance(prefix, str) and value.startswith(prefix)) or (
+                    isinstance(value, bytes) and isinstance(prefix, bytes) and value.startswith(prefix))
+            return begins_with
+        if name == 'contains':
+            def contains(item):
+                value, operand = first(item), second(item)
+                if isinstance(value, str):
+                    return isinstance(operand, str) and operand in value
+                if isinstance(value, (set, frozenset)):
+                    return operand in value
+                if isinstance(value, list):
+                    return any(values_equal(element, operand) for element in value)
+                return False
+            return contains
+        return lambda item: first(item) is not MISSING and type_code(first(item)) == second(item)
+
+    # Updates
+
+    def update_value(self):
+        left = self.update_operand()
+        if self.peek() in (('op', '+'), ('op', '-')):
+            kind, operator = self.advance()
+            right = self.update_operand()
+
+            def arithmetic(item):
+                a, b = left(item), right(item)
+                if type_code(a) != 'N' or type_code(b) != 'N':
+                    raise FakeError('ValidationException', "An operand in the update expression has an incorrect data type")
+                return a + b if operator == '+' else a - b
+            return arithmetic
+        return left
+
+    def update_operand(self):
+        kind, text = self.peek()
+        if kind == 'word' and self.peek(1) == ('op', '(') and text in ('if_not_exists', 'list_append'):
+            self.advance()
+            self.expect('(')
+            # The path tested by if_not_exists may be missing; it is not an error.
+            first = self.operand() if text == 'if_not_exists' else self.update_operand()
+            self.expect(',')
+            second = self.update_operand()
+            self.expect(')')
+            if text == 'if_not_exists':
+                return lambda item: first(item) if first(item) is not MISSING else second(item)
+            return lambda item: list(first(item)) + list(second(item))
+        operand = self.operand()
+
+        def present(item):
+            value = operand(item)
+            if value is MISSING:
+                raise FakeError('ValidationException', "The provided expression refers to an attribute that does not exist in the item")
+            return value
+        return present
+
+    def update(self):
+        """Compiles an update expression. Right-hand sides see the item as it was before the update."""
+        sets, removes, adds, deletes = [], [], [], []
+        while self.peek()[0] is not None:
+            kind, clause = self.advance()
+            clause = clause.upper()
+            if clause not in ('SET', 'REMOVE', 'ADD', 'DELETE'):
+                raise FakeError('ValidationException', f"Invalid UpdateExpression clause {clause!r}")
+            while True:
+                path = self.path()
+                if clause == 'SET':
+                    self.expect('=')
+                    sets.append((path, self.update_value()))
+                elif clause == 'REMOVE':
+                    removes.append(path)
+                elif clause == 'ADD':
+                    adds.append((path, self.operand()))
+                else:
+                    deletes.append((path, self.operand()))
+                if self.peek() != ('op', ','):
+                    break
+                self.advance()
+
+        def apply(item):
+            before = copy.deepcopy(item)
+            changes = [(path, value(before)) for path, value in sets]
+            additions = [(path, value(before)) for path, value in adds]
+            removals = [(path, value(before)) for path, value in deletes]
+
+            for path, value in changes:
+                set_path(item, path, value)
+            for path in sorted(removes, key=lambda p: [-e if isinstance(e, int) else 0 for e in p]):
+                remove_path(item, path)
+            for path, value in additions:
+                current = get_path(item, path)
+                if current is MISSING:
+                    set_path(item, path, copy.copy(value))
+                elif type_code(current) == 'N' and type_code(value) == 'N':
+                    set_path(item, path, current + value)
+                elif isinstance(current, set) and isinstance(value, set) and type_code(current) == type_code(value):
+                    set_path(item, path, current | value)
+                else:
+                    raise FakeError('ValidationException', "An operand in the update expression has an incorrect data type")
+            for path, value in removals:
+                current = get_path(item, path)
+                if isinstance(current, set):
+                    remaining = current - value
+                    if remaining:
+                        set_path(item, path, remaining)
+                    else:
+                        remove_path(item, path)
+
+            return {path[0] for path, _ in sets} | {path[0] for path in removes} | \
+                {path[0] for path, _ in adds} | {path[0] for path, _ in deletes}
+        return apply
+
+
+def compile_condition(expression, names, values):
+    parser = ExpressionParser(expression, names, values)
+    condition = parser.condition()
+    parser.finish()
+    return condition, parser.equalities
+
+
+def compile_update(expression, names, values):
+    parser = ExpressionParser(expression, names, values)
+    update = parser.update()
+    parser.finish()
+    return update
+
+
+def compile_projection(expression, names):
+    """Projections keep whole top-level attributes, which is all the handlers project."""
+    parser = ExpressionParser(expression, names)
+    attributes = [parser.path()[0]]
+    while parser.peek() == ('op', ','):
+        parser.advance()
+        attributes.append(parser.path()[0])
+    parser.finish()
+    return lambda item: {name: item[name] for name in attributes if name in item}
+
+
+# --- DynamoDB ------------------------------------------------------------------------
+
+class FakeTable:
+    """
+    One table's items, keyed by their key attribute values, with lazily built orderings.
+
+    Each item's wire format is kept next to it, so reads only encode projected items.
+    """
+
+    def __init__(self, name, key, indexes=None):
+        self.name = name
+        self.key = tuple(key)
+        self.indexes = dict(indexes or {})
+        self.items = {}
+        self.wire = {}
+        self.sizes = {}
+        self._version = 0
+        self._orders = {}
+
+    def key_of(self, item, key_attributes=None):
+        key_attributes = key_attributes or self.key
+        try:
+            return tuple(item[name] for name in key_attributes)
+        except KeyError:
+            raise FakeError('ValidationException', "The provided key element does not match the schema")
+
+    def key_item(self, key):
+        return dict(zip(self.key, key))
+
+    def validate_key(self, key_item):
+        if set(key_item) != set(self.key):
+            raise FakeError('ValidationException', "The provided key element does not match the schema")
+        return self.key_of(key_item)
+
+    def put(self, item):
+        key = self.key_of(item)
+        self.items[key] = item
+        self.wire[key] = item_to_wire(item)
+        self.sizes[key] = item_size(item, self.wire[key])
+        self._version += 1
+
+    def delete(self, key):
+        item = self.items.pop(key, None)
+        self.wire.pop(key, None)
+        self.sizes.pop(key, None)
+        self._version += 1
+        return item
+
+    def scan_order(self, segment=None, total_segments=None):
+        """Item keys in scan order (by key hash), optionally restricted to one segment."""
+        cache_key = ('scan', segment, total_segments)
+        cached = self._orders.get(cache_key)
+        if cached and cached[0] == self._version:
+            return cached[1]
+        order = sorted((zlib.crc32(repr(key).encode()), key) for key in self.items)
+        if total_segments:
+            order = [entry for entry in order if entry[0] % total_segments == segment]
+        self._orders[cache_key] = (self._version, order)
+        return order
+
+    def index_partitions(self, index_name):
+        """partition key value -> [(sort key value, table key)] in sort key order."""
+        cached = self._orders.get(index_name)
+        if cached and cached[0] == self._version:
+            return cached[1]
+        if index_name is None:
+            index_key = self.key
+        elif index_name in self.indexes:
+            index_key = self.indexes[index_name]
+        else:
+            raise FakeError('ValidationException', f"The table does not have the specified index: {index_name}")
+        partitions = {}
+        for key, item in self.items.items():
+            if any(name not in item for name in index_key):
+                continue
+            sort_value = item[index_key[1]] if len(index_key) > 1 else None
+            partitions.setdefault(item[index_key[0]], []).append((sort_value, key))
+        for entries in partitions.values():
+            entries.sort()
+        self._orders[index_name] = (self._version, partitions)
+        return partitions
+
+
+class FakeDynamoDB:
+    """DynamoDB backed by `FakeTable`s. Items are stored as Python values."""
+
+    protocol = 'json'
+
+    def __init__(self, fake, tables=None):
+        self.fake = fake
+        self.lock = threading.RLock()
+        self.tables = {
+            name: FakeTable(name, schema['key'], schema.get('indexes'))
+            for name, schema in (tables or TABLES).items()
+        }
+        self.operations = {
+            'GetItem': self.get_item,
+            'PutItem': self.put_item,
+            'UpdateItem': self.update_item,
+            'DeleteItem': self.delete_item,
+            'BatchGetItem': self.batch_get_item,
+            'BatchWriteItem': self.batch_write_item,
+            'Query': self.query,
+            'Scan': self.scan,
+            'TransactWriteItems': self.transact_write_items,
+        }
+        # ClientRequestToken -> TransactItems, for idempotent transactions.
+        self.transactions = {}
+
+    # Seeding and inspection
+
+    def put_items(self, table_name, items):
+        """Stores items (Python values; ints are fine) without going through botocore."""
+        with self.lock:
+            table = self.table(table_name)
+            for item in items:
+                table.put(normalize(item))
+
+    def get(self, table_name, key):
+        with self.lock:
+            table = self.table(table_name)
+            return copy.deepcopy(table.items.get(table.key_of(normalize(key))))
+
+    def count(self, table_name):
+        return len(self.table(table_name).items)
+
+    def table(self, name):
+        if name not in self.tables:
+            raise FakeError('ResourceNotFoundException', f"Requested resource not found: Table: {name} not found")
+        return self.tables[name]
+
+    # Requests
+
+    def handle(self, operation, request):
+        if operation not in self.operations:
+            raise FakeError('UnknownOperationException', f"{operation} is not supported by the fake")
+        with self.lock:
+            return self.operations[operation](request)
+
+    def expression_values(self, request):
+        return {name: from_wire(value) for name, value in request.get('ExpressionAttributeValues', {}).items()}
+
+    def check_condition(self, request, item):
+        if 'ConditionExpression' not in request:
+            return
+        condition, _ = compile_condition(
+            request['ConditionExpression'],
+            request.get('ExpressionAttributeNames'),
+            self.expression_values(request)
+        )
+        if not condition(item or {}):
+            fields = {}
+            if item is not None and request.get('ReturnValuesOnConditionCheckFailure') == 'ALL_OLD':
+                fields['Item'] = item_to_wire(item)
+            raise FakeError('ConditionalCheckFailedException', 'The conditional request failed', **fields)
+
+    @staticmethod
+    def read_units(size, consistent=False):
+        units = max(1, math.ceil(size / 4096))
+        return units if consistent else units / 2
+
+    @staticmethod
+    def write_units(size):
+        return max(1, math.ceil(size / 1024))
+
+    @staticmethod
+    def with_capacity(request, response, table_name, units):
+        if request.get('ReturnConsumedCapacity') in ('TOTAL', 'INDEXES'):
+            response['ConsumedCapacity'] = {'TableName': table_name, 'CapacityUnits': units}
+        return response
+
+    def get_item(self, request):
+        table = self.table(request['TableName'])
+        key = table.validate_key(item_from_wire(request['Key']))
+        item = table.items.get(key)
+        response = {}
+        size = 0
+        if item is not None:
+            size = table.sizes[key]
+            if 'ProjectionExpression' in request:
+                project = compile_projection(request['ProjectionExpression'], request.get('ExpressionAttributeNames'))
+                response['Item'] = item_to_wire(project(item))
+            else:
+                response['Item'] = table.wire[key]
+        units = self.read_units(size, request.get('ConsistentRead', False))
+        return self.with_capacity(request, response, table.name, units)
+
+    def put_item(self, request):
+        table = self.table(request['TableName'])
+        item = item_from_wire(request['Item'])
+        if item_size(item) > MAX_ITEM_BYTES:
+            raise FakeError('ValidationException', 'Item size has exceeded the maximum allowed size')
+        key = table.key_of(item)
+        old = table.items.get(key)
+        self.check_condition(request, old)
+        table.put(item)
+        response = {}
+        if request.get('ReturnValues') == 'ALL_OLD' and old is not None:
+            response['Attributes'] = item_to_wire(old)
+        units = self.write_units(max(table.sizes[key], item_size(old) if old else 0))
+        return self.with_capacity(request, response, table.name, units)
+
+    def update_item(self, request):
+        table = self.table(request['TableName'])
+        key_item = item_from_wire(request['Key'])
+        key = table.validate_key(key_item)
+        old = table.items.get(key)
+        self.check_condition(request, old)
+
+        item = copy.deepcopy(old) if old is not None else dict(key_item)
+        updated = set()
+        if 'UpdateExpression' in request:
+            update = compile_update(
+                request['UpdateExpression'],
+                request.get('ExpressionAttributeNames'),
+                self.expression_values(request)
+            )
+            updated = update(item)
+        if updated & set(table.key):
+            raise FakeError('ValidationException', "Cannot update attribute which is part of the key")
+        table.put(item)
+
+        response = {}
+        return_values = request.get('ReturnValues', 'NONE')
+        if return_values == 'ALL_NEW':
+            response['Attributes'] = item_to_wire(item)
+        elif return_values == 'ALL_OLD' and old is not None:
+            response['Attributes'] = item_to_wire(old)
+        elif return_values == 'UPDATED_NEW':
+            response['Attributes'] = item_to_wire({name: item[name] for name in updated if name in item})
+        elif return_values == 'UPDATED_OLD' and old is not None:
+            response['Attributes'] = item_to_wire({name: old[name] for name in updated if name in old})
+        if response.get('Attributes') == {}:
+            del response['Attributes']
+        units = self.write_units(max(table.sizes[key], item_size(old) if old else 0))
+        return self.with_capacity(request, response, table.name, units)
+
+    def transact_write_items(self, request):
+        actions = request['TransactItems']
+        if not 1 <= len(actions) <= 100:
+            raise FakeError('ValidationException', "TransactItems must have between 1 and 100 items")
+        token = request.get('ClientRequestToken')
+        if token in self.transactions:
+            if self.transactions[token] != actions:
+                raise FakeError('IdempotentParameterMismatchException', "The request uses the same client token as a previous, but non-identical request")
+            return {}
+
+        # Every condition is checked before anything is written, so a failed transaction
+        # leaves no trace.
+        reasons = []
+        for action in actions:
+            (kind, operation), = action.items()
+            table = self.table(operation['TableName'])
+            if kind == 'Put':
+                key = table.key_of(item_from_wire(operation['Item']))
+            else:
+                key = table.validate_key(item_from_wire(operation['Key']))
+            try:
+                self.check_condition(operation, table.items.get(key))
+                reasons.append({'Code': 'None'})
+            except FakeError as e:
+                reasons.append({'Code': 'ConditionalCheckFailed', 'Message': e.message})
+        if any(reason['Code'] != 'None' for reason in reasons):
+            raise FakeError('TransactionCanceledException', 'Transaction cancelled', CancellationReasons=reasons)
+
+        for action in actions:
+            (kind, operation), = action.items()
+            operation = {name: value for name, value in operation.items() if name != 'ConditionExpression'}
+            if kind == 'Put':
+                self.put_item(operation)
+            elif kind == 'Update':
+                self.update_item(operation)
+            elif kind == 'Delete':
+                self.delete_item(operation)
+        if token:
+            self.transactions[token] = copy.deepcopy(actions)
+        return {}
+
+    def delete_item(self, request):
+        table = self.table(request['TableName'])
+        key = table.validate_key(item_from_wire(request['Key']))
+        old = table.items.get(key)
+        self.check_condition(request, old)
+        response = {}
+        size = 0
+        if old is not None:
+            size = table.sizes[key]
+            table.delete(key)
+            if request.get('ReturnValues') == 'ALL_OLD':
+                response['Attributes'] = item_to_wire(old)
+        return self.with_capacity(request, response, table.name, self.write_units(size))
+
+    def batch_get_item(self, request):
+        request_items = request['RequestItems']
+        if sum(len(entry['Keys']) for entry in request_items.values()) > 100:
+            raise FakeError('ValidationException', "Too many items requested for the BatchGetItem call")
+
+        responses, unprocessed, capacity = {}, {}, []
+        throttled = processed = 0
+        for table_name, entry in request_items.items():
+            table = self.table(table_name)
+            project = None
+            if 'ProjectionExpression' in entry:
+                project = compile_projection(entry['ProjectionExpression'], entry.get('ExpressionAttributeNames'))
+            items, units = [], 0
+            for wire_key in entry['Keys']:
+                if self.fake.throttle_entry('dynamodb', 'BatchGetItem'):
+                    unprocessed.setdefault(table_name, {**entry, 'Keys': []})['Keys'].append(wire_key)
+                    throttled += 1
+                    continue
+                processed += 1
+                key = table.validate_key(item_from_wire(wire_key))
+                item = table.items.get(key)
+                if item is None:
+                    continue
+                units += self.read_units(table.sizes[key], entry.get('ConsistentRead', False))
+                items.append(item_to_wire(project(item)) if project else table.wire[key])
+            responses[table_name] = items
+            capacity.append({'TableName': table_name, 'CapacityUnits': units})
+
+        if throttled and not processed:
+            raise FakeError('ProvisionedThroughputExceededException', 'The level of configured provisioned throughput for the table was exceeded')
+        response = {'Responses': responses, 'UnprocessedKeys': unprocessed}
+        if request.get('ReturnConsumedCapacity') in ('TOTAL', 'INDEXES'):
+            response['ConsumedCapacity'] = capacity
+        return response
+
+    def batch_write_item(self, request):
+        request_items = request['RequestItems']
+        if sum(len(entries) for entries in request_items.values()) > 25:
+            raise FakeError('ValidationException', "Too many items requested for the BatchWriteItem call")
+
+        unprocessed, capacity = {}, []
+        throttled = processed = 0
+        for table_name, entries in request_items.items():
+            table = self.table(table_name)
+            keys = set()
+            units = 0
+            for entry in entries:
+                if 'PutRequest' in entry:
+                    key = table.key_of(item_from_wire(entry['PutRequest']['Item']))
+                else:
+                    key = table.validate_key(item_from_wire(entry['DeleteRequest']['Key']))
+                if key in keys:
+                    raise FakeError('ValidationException', "Provided list of item keys contains duplicates")
+                keys.add(key)
+
+            for entry in entries:
+                if self.fake.throttle_entry('dynamodb', 'BatchWriteItem'):
+                    unprocessed.setdefault(table_name, []).append(entry)
+                    throttled += 1
+                    continue
+                processed += 1
+                if 'PutRequest' in entry:
+                    item = item_from_wire(entry['PutRequest']['Item'])
+                    table.put(item)
+                    units += self.write_units(table.sizes[table.key_of(item)])
+                else:
+                    key = table.key_of(item_from_wire(entry['DeleteRequest']['Key']))
+                    old = table.delete(key)
+                    units += self.write_units(item_size(old) if old else 0)
+            capacity.append({'TableName': table_name, 'CapacityUnits': units})
+
+        if throttled and not processed:
+            raise FakeError('ProvisionedThroughputExceededException', 'The level of configured provisioned throughput for the table was exceeded')
+        response = {'UnprocessedItems': unprocessed}
+        if request.get('ReturnConsumedCapacity') in ('TOTAL', 'INDEXES'):
+            response['ConsumedCapacity'] = capacity
+        return response
+
+    def read_page(self, request, table, keys, key_attributes):
+        """
+        Evaluates the items of `keys` in order, up to `Limit` items or 1 MB, then applies
+        the filter and projection.
+        """
+        position = 0
+        limit = request.get('Limit')
+        values = self.expression_values(request)
+        names = request.get('ExpressionAttributeNames')
+        filter_condition = compile_condition(request['FilterExpression'], names, values)[0] if 'FilterExpression' in request else None
+        project = compile_projection(request['ProjectionExpression'], names) if 'ProjectionExpression' in request else None
+
+        items, size, scanned, last = [], 0, 0, None
+        while position < len(keys) and (limit is None or scanned < limit) and size < PAGE_BYTES:
+            key = keys[position]
+            position += 1
+            item = table.items[key]
+            scanned += 1
+            size += table.sizes[key]
+            last = item
+            if filter_condition and not filter_condition(item):
+                continue
+            items.append(item_to_wire(project(item)) if project else table.wire[key])
+
+        response = {'Count': len(items), 'ScannedCount': scanned}
+        if request.get('Select') != 'COUNT':
+            response['Items'] = items
+        if position < len(keys) and last is not None:
+            response['LastEvaluatedKey'] = item_to_wire({name: last[name] for name in key_attributes})
+        units = self.read_units(size, request.get('ConsistentRead', False))
+        return self.with_capacity(request, response, table.name, units)
+
+    def scan(self, request):
+        table = self.table(request['TableName'])
+        if 'IndexName' in request:
+            raise FakeError('ValidationException', "Scanning an index is not supported by the fake")
+        segment, total_segments = request.get('Segment'), request.get('TotalSegments')
+        entries = table.scan_order(segment, total_segments)
+
+        if 'ExclusiveStartKey' in request:
+            key = table.validate_key(item_from_wire(request['ExclusiveStartKey']))
+            entries = entries[bisect.bisect_right(entries, (zlib.crc32(repr(key).encode()), key)):]
+        return self.read_page(request, table, [key for _, key in entries], table.key)
+
+    def query(self, request):
+        table = self.table(request['TableName'])
+        index_name = request.get('IndexName')
+        index_key = table.indexes[index_name] if index_name in table.indexes else table.key
+        partitions = table.index_partitions(index_name)
+
+        condition, equalities = compile_condition(
+            request['KeyConditionExpression'],
+            request.get('ExpressionAttributeNames'),
+            self.expression_values(request)
+        )
+        if index_key[0] not in equalities:
+            raise FakeError('ValidationException', "Query condition missed key schema element")
+        entries = [
+            entry for entry in partitions.get(equalities[index_key[0]], [])
+            if condition(table.items[entry[1]])
+        ]
+        forward = request.get('ScanIndexForward', True)
+
+        if 'ExclusiveStartKey' in request:
+            start = item_from_wire(request['ExclusiveStartKey'])
+            marker = (start.get(index_key[1]) if len(index_key) > 1 else None, table.key_of(start))
+            if forward:
+                entries = entries[bisect.bisect_right(entries, marker):]
+            else:
+                entries = entries[:bisect.bisect_left(entries, marker)]
+        if not forward:
+            entries.reverse()
+
+        key_attributes = tuple(dict.fromkeys(table.key + index_key))
+        return self.read_page(request, table, [key for _, key in entries], key_attributes)
+
+
+# --- SNS -----------------------------------------------------------------------------
+
+def parse_query_body(body):
+    """Turns a query-protocol form body into nested dicts (`a.member.1.b` -> a/member/1/b)."""
+    if isinstance(body, bytes):
+        body = body.decode()
+    root = {}
+    for key, value in parse_qsl(body or '', keep_blank_values=True):
+        node = root
+        parts = key.split('.')
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = value
+    return root
+
+
+def members(node, list_key='member'):
+    entries = (node or {}).get(list_key, {})
+    return [entries[index] for index in sorted(entries, key=int)]
+
+
+class FakeSNS:
+    """SNS topics that record what is published and who subscribed."""
+
+    protocol = 'query'
+
+    def __init__(self, fake):
+        self.fake = fake
+        self.lock = threading.RLock()
+        self.messages = []
+        self.subscriptions = []
+        self.operations = {
+            'Publish': self.publish,
+            'PublishBatch': self.publish_batch,
+            'Subscribe': self.subscribe,
+        }
+
+    def handle(self, operation, request):
+        if operation not in self.operations:
+            raise FakeError('InvalidAction', f"{operation} is not supported by the fake")
+        with self.lock:
+            return self.operations[operation](request)
+
+    @staticmethod
+    def message_attributes(entry):
+        return {
+            attribute['Name']: attribute.get('Value', {}).get('StringValue')
+            for attribute in members(entry.get('MessageAttributes'), 'entry')
+        }
+
+    def record(self, topic_arn, entry):
+        message_id = str(uuid.uuid4())
+        self.messages.append({
+            'TopicArn': topic_arn,
+            'Subject': entry.get('Subject'),
+            'Message': entry.get('Message'),
+            'MessageAttributes': self.message_attributes(entry),
+        })
+        return message_id
+
+    @staticmethod
+    def subject_error(subject):
+        """SNS's rule for subjects: at most 100 printable ASCII characters, no line breaks."""
+        if subject is None:
+            return None
+        if len(subject) > 100 or not all(32 <= ord(char) < 127 for char in subject):
+            return 'Invalid parameter: Subject'
+        return None
+
+    def publish(self, request):
+        error = self.subject_error(request.get('Subject'))
+        if error:
+            raise FakeError('InvalidParameter', error)
+        message_id = self.record(request.get('TopicArn'), request)
+        return f"<MessageId>{message_id}</MessageId>"
+
+    def publish_batch(self, request):
+        entries = members(request.get('PublishBatchRequestEntries'))
+        if len(entries) > 10:
+            raise FakeError('TooManyEntriesInBatchRequest', 'The batch request contains more entries than permissible')
+        if len({entry['Id'] for entry in entries}) != len(entries):
+            raise FakeError('BatchEntryIdsNotDistinct', 'Two or more batch entries in the request have the same Id')
+
+        successful, failed = [], []
+        for entry in entries:
+            if self.fake.throttle_entry('sns', 'PublishBatch'):
+                failed.append(
+                    f"<member><Id>{escape(entry['Id'])}</Id><Code>Throttling</Code>"
+                    f"<Message>Rate exceeded</Message><SenderFault>false</SenderFault></member>"
+                )
+                continue
+            error = self.subject_error(entry.get('Subject'))
+            if error:
+                failed.append(
+                    f"<member><Id>{escape(entry['Id'])}</Id><Code>InvalidParameter</Code>"
+                    f"<Message>{escape(error)}</Message><SenderFault>true</SenderFault></member>"
+                )
+                continue
+            message_id = self.record(request.get('TopicArn'), entry)
+            successful.append(f"<member><Id>{escape(entry['Id'])}</Id><MessageId>{message_id}</MessageId></member>")
+        return f"<Successful>{''.join(successful)}</Successful><Failed>{''.join(failed)}</Failed>"
+
+    def subscribe(self, request):
+        attributes = {entry['key']: entry['value'] for entry in members(request.get('Attributes'), 'entry')}
+        # Like SNS, subscribing the same endpoint again returns the existing subscription,
+        # unless its attributes differ.
+        for subscription in self.subscriptions:
+            if (subscription['TopicArn'], subscription['Protocol'], subscription['Endpoint']) == (
+                    request.get('TopicArn'), request.get('Protocol'), request.get('Endpoint')):
+                if subscription['Attributes'] != attributes:
+                    raise FakeError('InvalidParameter', 'Invalid parameter: Attributes Reason: Subscription already exists with different attributes')
+                return f"<SubscriptionArn>{escape(subscription['SubscriptionArn'])}</SubscriptionArn>"
+        arn = f"{request.get('TopicArn')}:{uuid.uuid4()}"
+        self.subscriptions.append({
+            'SubscriptionArn': arn,
+            'TopicArn': request.get('TopicArn'),
+            'Protocol': request.get('Protocol'),
+            'Endpoint': request.get('Endpoint'),
+            'Attributes': attributes,
+        })
+        return f"<SubscriptionArn>{escape(arn)}</SubscriptionArn>"
+
+
+# --- Cognito -------------------------------------------------------------------------
+
+class FakeCognito:
+    """A single user pool with users and groups."""
+
+    protocol = 'json'
+    MAX_PAGE_SIZE = 60
+
+    def __init__(self, fake):
+        self.fake = fake
+        self.lock = threading.RLock()
+        self.users = {}
+        self.operations = {
+            'ListUsers': self.list_users,
+            'ListUsersInGroup': self.list_users_in_group,
+            'AdminGetUser': self.admin_get_user,
+            'AdminAddUserToGroup': self.admin_add_user_to_group,
+        }
+
+    def add_user(self, username, attributes, groups=()):
+        """Adds a confirmed user; `attributes` is a name -> value dict (email, sub, ...)."""
+        with self.lock:
+            self.users[username] = {
+                'Username': username,
+                'Attributes': [{'Name': name, 'Value': value} for name, value in attributes.items()],
+                'Enabled': True,
+                'UserStatus': 'CONFIRMED',
+                'groups': set(groups),
+            }
+
+    def handle(self, operation, request):
+        if operation not in self.operations:
+            raise FakeError('UnknownOperationException', f"{operation} is not supported by the fake")
+        with self.lock:
+            return self.operations[operation](request)
+
+    @staticmethod
+    def attribute(user, name):
+        for attribute in user['Attributes']:
+            if attribute['Name'] == name:
+                return attribute['Value']
+        return None
+
+    def find_user(self, username):
+        user = self.users.get(username)
+        if user is None:
+            # Email is a username alias in the pool.
+            user = next((u for u in self.users.values() if self.attribute(u, 'email') == username), None)
+        if user is None:
+            raise FakeError('UserNotFoundException', 'User does not exist.')
+        return user
+
+    @staticmethod
+    def public(user, attributes_to_get=None):
+        attributes = user['Attributes']
+        if attributes_to_get is not None:
+            attributes = [attribute for attribute in attributes if attribute['Name'] in attributes_to_get]
+        return {
+            'Username': user['Username'],
+            'Attributes': attributes,
+            'Enabled': user['Enabled'],
+            'UserStatus': user['UserStatus'],
+        }
+
+    def page(self, users, request, token_key):
+        limit = min(request.get('Limit') or self.MAX_PAGE_SIZE, self.MAX_PAGE_SIZE)
+        start = int(request.get(token_key) or 0)
+        page = users[start:start + limit]
+        response = {'Users': [self.public(user, request.get('AttributesToGet')) for user in page]}
+        if start + limit < len(users):
+            response[token_key] = str(start + limit)
+        return response
+
+    def list_users(self, request):
+        users = list(self.users.values())
+        if request.get('Filter'):
+            match = re.fullmatch(r'\s*(\w+)\s*(\^?=)\s*"((?:[^"\\]|\\.)*)"\s*', request['Filter'])
+            if not match:
+                raise FakeError('InvalidParameterException', 'Invalid search filter')
+            name, operator, value = match.group(1), match.group(2), re.sub(r'\\(.)', r'\1', match.group(3))
+            name = {'username': None}.get(name, name)
+
+            def matches(user):
+                actual = user['Username'] if name is None else self.attribute(user, name)
+                if actual is None:
+                    return False
+                return actual == value if operator == '=' else actual.startswith(value)
+            users = [user for user in users if matches(user)]
+        return self.page(users, request, 'PaginationToken')
+
+    def list_users_in_group(self, request):
+        users = [user for user in self.users.values() if request['GroupName'] in user['groups']]
+        return self.page(users, request, 'NextToken')
+
+    def admin_get_user(self, request):
+        user = self.find_user(request['Username'])
+        return {
+            'Username': user['Username'],
+            'UserAttributes': user['Attributes'],
+            'Enabled': user['Enabled'],
+            'UserStatus': user['UserStatus'],
+        }
+
+    def admin_add_user_to_group(self, request):
+        self.find_user(request['Username'])['groups'].add(request['GroupName'])
+        return {}
+
+
+# --- EventBridge ---------------------------------------------------------------------
+
+class FakeEventBridge:
+    """Rules and their targets on the default event bus."""
+
+    protocol = 'json'
+
+    def __init__(self, fake):
+        self.fake = fake
+        self.lock = threading.RLock()
+        self.rules = {}
+        self.operations = {
+            'PutRule': self.put_rule,
+            'PutTargets': self.put_targets,
+            'ListRules': self.list_rules,
+            'ListTargetsByRule': self.list_targets_by_rule,
+            'RemoveTargets': self.remove_targets,
+            'DeleteRule': self.delete_rule,
+        }
+
+    def handle(self, operation, request):
+        if operation not in self.operations:
+            raise FakeError('UnknownOperationException', f"{operation} is not supported by the fake")
+        with self.lock:
+            return self.operations[operation](request)
+
+    def rule(self, name):
+        if name not in self.rules:
+            raise FakeError('ResourceNotFoundException', f"Rule {name} does not exist.")
+        return self.rules[name]
+
+    def put_rule(self, request):
+        arn = f"arn:aws:events:eu-west-1:000000000000:rule/{request['Name']}"
+        rule = self.rules.setdefault(request['Name'], {'targets': {}})
+        rule.update({
+            'Name': request['Name'],
+            'Arn': arn,
+            'State': request.get('State', 'ENABLED'),
+            'ScheduleExpression': request.get('ScheduleExpression'),
+        })
+        return {'RuleArn': arn}
+
+    def put_targets(self, request):
+        rule = self.rule(request['Rule'])
+        for target in request['Targets']:
+            rule['targets'][target['Id']] = target
+        return {'FailedEntryCount': 0, 'FailedEntries': []}
+
+    def list_rules(self, request):
+        names = sorted(name for name in self.rules if name.startswith(request.get('NamePrefix', '')))
+        limit = request.get('Limit') or 100
+        start = int(request.get('NextToken') or 0)
+        response = {'Rules': [
+            {key: value for key, value in self.rules[name].items() if key != 'targets' and value is not None}
+            for name in names[start:start + limit]
+        ]}
+        if start + limit < len(names):
+            response['NextToken'] = str(start + limit)
+        return response
+
+    def list_targets_by_rule(self, request):
+        return {'Targets': list(self.rule(request['Rule'])['targets'].values())}
+
+    def remove_targets(self, request):
+        targets = self.rule(request['Rule'])['targets']
+        for target_id in request['Ids']:
+            targets.pop(target_id, None)
+        return {'FailedEntryCount': 0, 'FailedEntries': []}
+
+    def delete_rule(self, request):
+        rule = self.rules.get(request['Name'])
+        if rule and rule['targets']:
+            raise FakeError('ValidationException', 'Rule can\'t be deleted since it has targets.')
+        self.rules.pop(request['Name'], None)
+        return {}
+
+
+# --- Lambda --------------------------------------------------------------------------
+
+class FakeLambda:
+    """Records `Invoke` calls; the invoked functions are not run."""
+
+    protocol = 'rest'
+
+    def __init__(self, fake):
+        self.fake = fake
+        self.lock = threading.RLock()
+        self.invocations = []
+
+    def handle(self, operation, request):
+        if operation != 'Invoke':
+            raise FakeError('UnknownOperationException', f"{operation} is not supported by the fake")
+        function_name = request.url.split('/functions/', 1)[1].split('/', 1)[0]
+        invocation_type = request.headers.get('X-Amz-Invocation-Type', b'RequestResponse')
+        if isinstance(invocation_type, bytes):
+            invocation_type = invocation_type.decode()
+        with self.lock:
+            self.invocations.append({
+                'FunctionName': function_name,
+                'InvocationType': invocation_type,
+                'Payload': json.loads(request.body or b'null')
+            })
+        return (202 if invocation_type == 'Event' else 200), b''
+
+
+# --- S3 ------------------------------------------------------------------------------
+
+def xml_response(root, fields):
+    """A minimal S3 XML document: `<root>` with one element per `(name, value)`."""
+    inner = ''.join(f"<{name}>{escape(str(value))}</{name}>" for name, value in fields)
+    # Error documents carry no namespace.
+    namespace = '' if root == 'Error' else ' xmlns="http://s3.amazonaws.com/doc/2006-03-01/"'
+    return f'<?xml version="1.0" encoding="UTF-8"?><{root}{namespace}>{inner}</{root}>'.encode()
+
+
+def xml_elements(body, name):
+    """The elements called `name` in an XML request body, namespaces ignored."""
+    root = ElementTree.fromstring(body)
+    return [element for element in root.iter() if element.tag.rsplit('}', 1)[-1] == name]
+
+
+def xml_text(element, name):
+    child = next((child for child in element if child.tag.rsplit('}', 1)[-1] == name), None)
+    return child.text if child is not None else None
+
+
+class FakeS3:
+    """
+    Buckets of objects and multipart uploads, reached through the API or presigned URLs.
+
+    Handler calls arrive through botocore like the other services. Requests a browser
+    would send to a presigned URL (the part uploads and downloads) go through `fetch`
+    instead, which checks the URL's expiry and is counted in `direct_requests`, not in
+    `FakeAWS.calls`: that traffic never touches Lambda.
+    """
+
+    protocol = 'rest-xml'
+    MIN_PART_BYTES = 5 * 1024 * 1024
+
+    def __init__(self, fake):
+        self.fake = fake
+        self.lock = threading.RLock()
+        self.objects = {}
+        self.uploads = {}
+        self.direct_requests = Counter()
+        self.operations = {
+            'CreateMultipartUpload': self.create_multipart_upload,
+            'UploadPart': self.upload_part,
+            'CompleteMultipartUpload': self.complete_multipart_upload,
+            'AbortMultipartUpload': self.abort_multipart_upload,
+            'PutObject': self.put_object,
+            'HeadObject': self.head_object,
+            'GetObject': self.get_object,
+            'DeleteObject': self.delete_object,
+            'DeleteObjects': self.delete_objects,
+        }
+
+    @staticmethod
+    def parse_url(url):
+        """`(bucket, key, params)` of a virtual-hosted or path-style S3 URL."""
+        parts = urlsplit(url)
+        host = parts.hostname or ''
+        path = unquote(parts.path.lstrip('/'))
+        if '.s3.' in host or '.s3-' in host:
+            bucket, key = host.split('.s3', 1)[0], path
+        else:
+            bucket, _, key = path.partition('/')
+        return bucket, key, dict(parse_qsl(parts.query, keep_blank_values=True))
+
+    @staticmethod
+    def header(headers, name, default=None):
+        for key, value in (headers or {}).items():
+            if key.lower() == name.lower():
+                return value.decode() if isinstance(value, bytes) else value
+        return default
+
+    def handle(self, operation, request):
+        if operation not in self.operations:
+            raise FakeError('NotImplemented', f"{operation} is not supported by the fake", 501)
+        bucket, key, params = self.parse_url(request.url)
+        body = request.body
+        if hasattr(body, 'read'):
+            body = body.read()
+        if isinstance(body, str):
+            body = body.encode()
+        with self.lock:
+            return self.operations[operation](bucket, key, params, dict(request.headers), body or b'')
+
+    def fetch(self, method, url, body=b'', headers=None):
+        """
+        Sends a request to a presigned URL, as a browser would.
+
+        Returns:
+            tuple: `(status_code, headers, body)`.
+        """
+        bucket, key, params = self.parse_url(url)
+        if method == 'PUT' and 'uploadId' in params:
+            operation = 'UploadPart'
+        elif method == 'PUT':
+            operation = 'PutObject'
+        elif method in ('GET', 'HEAD'):
+            operation = 'GetObject' if method == 'GET' else 'HeadObject'
+        else:
+            return 405, {}, b''
+        with self.lock:
+            self.direct_requests[operation] += 1
+        try:
+            if 'X-Amz-Signature' not in params:
+                raise FakeError('AccessDenied', 'Query-string authentication requires a signature', 403)
+            signed_at = datetime.strptime(params['X-Amz-Date'], '%Y%m%dT%H%M%SZ').replace(tzinfo=timezone.utc)
+            if signed_at.timestamp() + int(params['X-Amz-Expires']) < time.time():
+                raise FakeError('AccessDenied', 'Request has expired', 403)
+            with self.lock:
+                status, response_body, response_headers = self.operations[operation](bucket, key, params, headers or {}, body)
+        except FakeError as e:
+            return e.status_code, {}, xml_response('Error', [('Code', e.code), ('Message', e.message)])
+        return status, response_headers, response_body
+
+    def upload(self, params):
+        upload = self.uploads.get(params.get('uploadId'))
+        if upload is None:
+            raise FakeError('NoSuchUpload', 'The specified upload does not exist.', 404)
+        return upload
+
+    def store(self, bucket, key, data, content_type, metadata, etag):
+        self.objects[(bucket, key)] = {
+            'data': data,
+            'etag': etag,
+            'content_type': content_type,
+            'metadata': metadata,
+            'last_modified': datetime.now(timezone.utc),
+        }
+
+    def create_multipart_upload(self, bucket, key, params, headers, body):
+        upload_id = uuid.uuid4().hex
+        self.uploads[upload_id] = {
+            'bucket': bucket,
+            'key': key,
+            'content_type': self.header(headers, 'Content-Type', 'binary/octet-stream'),
+            'metadata': {name[11:].lower(): value for name, value in headers.items() if name.lower().startswith('x-amz-meta-')},
+            'parts': {},
+        }
+        return 200, xml_response('InitiateMultipartUploadResult', [('Bucket', bucket), ('Key', key), ('UploadId', upload_id)]), {}
+
+    def upload_part(self, bucket, key, params, headers, body):
+        upload = self.upload(params)
+        number = int(params['partNumber'])
+        if not 1 <= number <= 10000:
+            raise FakeError('InvalidArgument', 'Part number must be an integer between 1 and 10000', 400)
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        upload['parts'][number] = (body, etag)
+        return 200, b'', {'ETag': etag}
+
+    def complete_multipart_upload(self, bucket, key, params, headers, body):
+        upload = self.upload(params)
+        requested = [(int(xml_text(part, 'PartNumber')), xml_text(part, 'ETag')) for part in xml_elements(body, 'Part')]
+        if not requested:
+            raise FakeError('MalformedXML', 'The XML you provided was not well-formed', 400)
+        numbers = [number for number, _ in requested]
+        if numbers != sorted(set(numbers)):
+            raise FakeError('InvalidPartOrder', 'The list of parts was not in ascending order.', 400)
+        for index, (number, etag) in enumerate(requested):
+            stored = upload['parts'].get(number)
+            if stored is None or stored[1].strip('"') != (etag or '').strip('"'):
+                raise FakeError('InvalidPart', 'One or more of the specified parts could not be found.', 400)
+            if index < len(requested) - 1 and len(stored[0]) < self.MIN_PART_BYTES:
+                raise FakeError('EntityTooSmall', 'Your proposed upload is smaller than the minimum allowed size', 400)
+        chunks = [upload['parts'][number][0] for number in numbers]
+        digests = b''.join(hashlib.md5(chunk).digest() for chunk in chunks)
+        etag = f'"{hashlib.md5(digests).hexdigest()}-{len(chunks)}"'
+        self.store(bucket, key, b''.join(chunks), upload['content_type'], upload['metadata'], etag)
+        del self.uploads[params['uploadId']]
+        return 200, xml_response('CompleteMultipartUploadResult', [('Bucket', bucket), ('Key', key), ('ETag', etag)]), {}
+
+    def abort_multipart_upload(self, bucket, key, params, headers, body):
+        self.upload(params)
+        del self.uploads[params['uploadId']]
+        return 204, b'', {}
+
+    def put_object(self, bucket, key, params, headers, body):
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        metadata = {name[11:].lower(): value for name, value in headers.items() if name.lower().startswith('x-amz-meta-')}
+        self.store(bucket, key, body, self.header(headers, 'Content-Type', 'binary/octet-stream'), metadata, etag)
+        return 200, b'', {'ETag': etag}
+
+    def object_headers(self, stored):
+        return {
+            'ETag': stored['etag'],
+            'Content-Type': stored['content_type'],
+            'Content-Length': str(len(stored['data'])),
+            'Last-Modified': stored['last_modified'].strftime('%a, %d %b %Y %H:%M:%S GMT'),
+            'Accept-Ranges': 'bytes',
+            **{f"x-amz-meta-{name}": value for name, value in stored['metadata'].items()},
+        }
+
+    def head_object(self, bucket, key, params, headers, body):
+        stored = self.objects.get((bucket, key))
+        if stored is None:
+            raise FakeError('404', 'Not Found', 404)
+        return 200, b'', self.object_headers(stored)
+
+    def get_object(self, bucket, key, params, headers, body):
+        stored = self.objects.get((bucket, key))
+        if stored is None:
+            raise FakeError('NoSuchKey', 'The specified key does not exist.', 404)
+        data = stored['data']
+        response_headers = self.object_headers(stored)
+        if params.get('response-content-disposition'):
+            response_headers['Content-Disposition'] = params['response-content-disposition']
+
+        match = re.fullmatch(r'bytes=(\d*)-(\d*)', self.header(headers, 'Range', '') or '')
+        if not match or not (match.group(1) or match.group(2)):
+            return 200, data, response_headers
+        if match.group(1):
+            start = int(match.group(1))
+            end = min(int(match.group(2)), len(data) - 1) if match.group(2) else len(data) - 1
+        else:
+            start, end = max(0, len(data) - int(match.group(2))), len(data) - 1
+        if start >= len(data) or start > end:
+            raise FakeError('InvalidRange', 'The requested range is not satisfiable', 416)
+        response_headers['Content-Length'] = str(end - start + 1)
+        response_headers['Content-Range'] = f"bytes {start}-{end}/{len(data)}"
+        return 206, data[start:end + 1], response_headers
+
+    def delete_object(self, bucket, key, params, headers, body):
+        self.objects.pop((bucket, key), None)
+        return 204, b'', {}
+
+    def delete_objects(self, bucket, key, params, headers, body):
+        for element in xml_elements(body, 'Object'):
+            self.objects.pop((bucket, xml_text(element, 'Key')), None)
+        return 200, xml_response('DeleteResult', []), {}
+
+
+# --- Transport -----------------------------------------------------------------------
+
+class FakeAWS:
+    """
+    Answers every request made through `aws_clients` from in-memory backends.
+
+    Args:
+        latency_ms (dict): Per-call latency by service ('dynamodb') or operation
+            ('sns.PublishBatch'), in milliseconds, either a number or `(mean, jitter)`.
+            Operation entries win over service entries.
+        throttle_rate (dict): Probability, keyed the same way, that a call (or, for batch
+            operations, an entry) is throttled.
+        seed (int): Seed for the jitter and throttling draws, so runs are repeatable.
+    """
+
+    def __init__(self, latency_ms=None, throttle_rate=None, seed=0):
+        self.latency_ms = dict(latency_ms or {})
+        self.throttle_rate = dict(throttle_rate or {})
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = Counter()
+        self.throttled = Counter()
+        self.dynamodb = FakeDynamoDB(self)
+        self.sns = FakeSNS(self)
+        self.cognito = FakeCognito(self)
+        self.events = FakeEventBridge(self)
+        self.lambda_ = FakeLambda(self)
+        self.s3 = FakeS3(self)
+        self.backends = {
+            'dynamodb': self.dynamodb,
+            'sns': self.sns,
+            'cognito-idp': self.cognito,
+            'events': self.events,
+            'lambda': self.lambda_,
+            's3': self.s3,
+        }
+
+    def install(self):
+        """
+        Drops the cached `aws_clients` clients and routes every new one to this fake.
+
+        Clients copy the session's event hooks when they are created, so this must run
+        before the handlers make their first AWS call.
+        """
+        os.environ.setdefault('AWS_ACCESS_KEY_ID', 'fake')
+        os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'fake')
+        os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-west-1')
+        os.environ['AWS_EC2_METADATA_DISABLED'] = 'true'
+        aws_clients.reset()
+        aws_clients.get_session().events.register('before-send', self.handle_request, unique_id='fake-aws')
+        return self
+
+    def uninstall(self):
+        aws_clients.reset()
+
+    def reset_counters(self):
+        with self.lock:
+            self.calls.clear()
+            self.throttled.clear()
+
+    def snapshot(self):
+        """A copy of the per-operation call counts ('dynamodb.Query': 3, ...)."""
+        with self.lock:
+            return Counter(self.calls)
+
+    def setting(self, settings, service, operation):
+        key = f"{service}.{operation}"
+        if key in settings:
+            return settings[key]
+        return settings.get(service)
+
+    def delay(self, service, operation):
+        latency = self.setting(self.latency_ms, service, operation)
+        if not latency:
+            return
+        if isinstance(latency, (tuple, list)):
+            mean, jitter = latency
+            with self.lock:
+                latency = max(0.0, self.random.gauss(mean, jitter))
+        time.sleep(latency / 1000)
+
+    def draw_throttle(self, service, operation):
+        rate = self.setting(self.throttle_rate, service, operation)
+        if not rate:
+            return False
+        with self.lock:
+            return self.random.random() < rate
+
+    def throttle_entry(self, service, operation):
+        """Called by the backends for each entry of a batch operation."""
+        throttled = self.draw_throttle(service, operation)
+        if throttled:
+            with self.lock:
+                self.throttled[f"{service}.{operation}"] += 1
+        return throttled
+
+    def handle_request(self, request, event_name=None, **kwargs):
+        _, service_id, operation = event_name.split('.', 2)
+        service = SERVICE_NAMES.get(service_id, service_id)
+        backend = self.backends.get(service)
+        if backend is None:
+            raise RuntimeError(f"FakeAWS has no backend for {service_id} (called {operation})")
+
+        with self.lock:
+            self.calls[f"{service}.{operation}"] += 1
+        self.delay(service, operation)
+
+        try:
+            if operation not in PARTIALLY_THROTTLED_OPERATIONS and self.draw_throttle(service, operation):
+                with self.lock:
+                    self.throttled[f"{service}.{operation}"] += 1
+                raise FakeError(THROTTLING_ERRORS[service], 'Rate exceeded')
+            if backend.protocol == 'rest':
+                status_code, body = backend.handle(operation, request)
+                headers = {'x-amzn-RequestId': str(uuid.uuid4())}
+                return AWSResponse(request.url, status_code, headers, CannedBody(body))
+            if backend.protocol == 'rest-xml':
+                status_code, body, headers = backend.handle(operation, request)
+                headers = {'x-amz-request-id': uuid.uuid4().hex, **headers}
+                return AWSResponse(request.url, status_code, headers, CannedBody(body))
+            if backend.protocol == 'json':
+                result = backend.handle(operation, json.loads(request.body or b'{}'))
+            else:
+                params = parse_query_body(request.body)
+                result = backend.handle(params.get('Action', operation), params)
+        except FakeError as e:
+            return self.error_response(request, backend.protocol, e)
+        return self.response(request, backend.protocol, operation, result)
+
+    @staticmethod
+    def response(request, protocol, operation, result):
+        headers = {'x-amzn-RequestId': str(uuid.uuid4())}
+        if protocol == 'json':
+            body = json.dumps(result).encode()
+        else:
+            body = (
+                f'<{operation}Response xmlns="http://sns.amazonaws.com/doc/2010-03-31/">'
+                f'<{operation}Result>{result}</{operation}Result>'
+                f'<ResponseMetadata><RequestId>{headers["x-amzn-RequestId"]}</RequestId></ResponseMetadata>'
+                f'</{operation}Response>'
+            ).encode()
+        return AWSResponse(request.url, 200, headers, CannedBody(body))
+
+    @staticmethod
+    def error_response(request, protocol, error):
+        headers = {'x-amzn-RequestId': str(uuid.uuid4())}
+        if protocol in ('json', 'rest'):
+            body = json.dumps({'__type': error.code, 'message': error.message, **error.fields}).encode()
+        elif protocol == 'rest-xml':
+            body = b'' if request.method == 'HEAD' else xml_response('Error', [('Code', error.code), ('Message', error.message)])
+        else:
+            body = (
+                f'<ErrorResponse xmlns="http://sns.amazonaws.com/doc/2010-03-31/">'
+                f'<Error><Type>Sender</Type><Code>{escape(error.code)}</Code><Message>{escape(error.message)}</Message></Error>'
+                f'<RequestId>{headers["x-amzn-RequestId"]}</RequestId></ErrorResponse>'
+            ).encode()
+        return AWSResponse(request.url, error.status_code, headers, CannedBody(body))
@@ -0,0 +1,110 @@
+"""
+An offline stand-in for the Cognito user pool's token signing.
+
+`TokenIssuer` makes an RSA key pair (pure Python, seeded, so runs are repeatable),
+writes its public half as a JWKS file and signs Cognito-shaped RS256 tokens with it.
+`install()` points `jwt_verifier` at the file, so `jwt_authorizer` verifies the tokens
+exactly as it would verify Cognito's, without a network.
+
+Usage:
+
+    issuer = TokenIssuer().install()
+    token = issuer.token({'sub': 'sub-1', 'email': 'member@example.com'})
+"""
+import base64
+import hashlib
+import json
+import os
+import random
+import tempfile
+import time
+
+import jwt_verifier
+
+SMALL_PRIMES = [p for p in range(3, 2000, 2) if all(p % d for d in range(3, int(p ** 0.5) + 1, 2))]
+
+
+def is_probable_prime(n, rng, rounds=24):
+    if any(n % p == 0 for p in SMALL_PRIMES):
+        return n in SMALL_PRIMES
+    d, r = n - 1, 0
+    while d % 2 == 0:
+        d, r = d // 2, r + 1
+    for _ in range(rounds):
+        x = pow(rng.randrange(2, n - 1), d, n)
+        if x in (1, n - 1):
+            continue
+        for _ in range(r - 1):
+            x = pow(x, 2, n)
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def random_prime(bits, rng):
+    while True:
+        candidate = rng.getrandbits(bits) | (1 << (bits - 1)) | 1
+        if is_probable_prime(candidate, rng):
+            return candidate
+
+
+def b64url(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def int_bytes(value):
+    return value.to_bytes((value.bit_length() + 7) // 8, 'big')
+
+
+class TokenIssuer:
+    """Signs tokens for `jwt_verifier.ISSUER` with a generated 2048-bit RSA key."""
+
+    def __init__(self, kid='bench-key', bits=2048, seed=0):
+        rng = random.Random(seed)
+        e = 65537
+        while True:
+            p, q = random_prime(bits // 2, rng), random_prime(bits // 2, rng)
+            phi = (p - 1) * (q - 1)
+            if p != q and phi % e:
+                break
+        self.kid = kid
+        self.n, self.e, self.d = p * q, e, pow(e, -1, phi)
+        self.size = (self.n.bit_length() + 7) // 8
+        self.path = None
+
+    def jwks(self):
+        return {'keys': [{'kty': 'RSA', 'alg': 'RS256', 'use': 'sig', 'kid': self.kid,
+                          'n': b64url(int_bytes(self.n)), 'e': b64url(int_bytes(self.e))}]}
+
+    def install(self):
+        """Writes the JWKS file and makes `jwt_verifier` load its keys from it."""
+        handle, self.path = tempfile.mkstemp(suffix='.json', prefix='jwks-')
+        with os.fdopen(handle, 'w') as f:
+            json.dump(self.jwks(), f)
+        jwt_verifier.jwks = jwt_verifier.Jwks(path=self.path)
+        jwt_verifier.verified_tokens = jwt_verifier.VerifiedTokens()
+        return self
+
+    def sign(self, signing_input):
+        digest_info = jwt_verifier.SHA256_DIGEST_INFO + hashlib.sha256(signing_input).digest()
+        encoded = b'\x00\x01' + b'\xff' * (self.size - len(digest_info) - 3) + b'\x00' + digest_info
+        return pow(int.from_bytes(encoded, 'big'), self.d, self.n).to_bytes(self.size, 'big')
+
+    def token(self, claims, expires_in=3600, kid=None, token_use='id'):
+        """A signed ID token (by default) with Cognito's standard claims plus `claims`."""
+        now = int(time.time())
+        payload = {
+            'iss': jwt_verifier.ISSUER,
+            'token_use': token_use,
+            'aud': 'bench-client',
+            'auth_time': now,
+            'iat': now,
+            'exp': now + expires_in,
+            'jti': f"{random.getrandbits(64):016x}",
+            **claims
+        }
+        header = {'kid': kid or self.kid, 'alg': 'RS256'}
+        signing_input = f"{b64url(json.dumps(header).encode())}.{b64url(json.dumps(payload).encode())}".encode()
+        return f"{signing_input.decode()}.{b64url(self.sign(signing_input))}"
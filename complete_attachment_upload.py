@@ -0,0 +1,252 @@
+import json
+from datetime import datetime, timezone
+from botocore.exceptions import ClientError
+
+import aws_clients
+import dynamodb_json
+import instrumentation
+import item_codec
+import task_attachments
+import task_cache
+
+table = aws_clients.lazy_table('Tasks')
+s3_client = aws_clients.lazy_client('s3')
+
+# Errors S3 returns for a bad part list; the client can fix and resend the request.
+PART_ERRORS = ('InvalidPart', 'InvalidPartOrder', 'EntityTooSmall')
+
+# Versioned rewrites of a compressed `files` list tried before giving up.
+MAX_REWRITE_ATTEMPTS = 3
+
+
+def parse_completion(body):
+    """
+    Reads and checks a completion request.
+
+    Returns:
+        tuple: `(task_id, key, upload_id, parts)`, the parts as `{'PartNumber', 'ETag'}`
+        in part number order.
+
+    Raises:
+        ValueError: If a field is missing, the key does not belong to the task or a part
+        has no number or `ETag`.
+    """
+    task_id = body.get('id')
+    key = body.get('key')
+    upload_id = body.get('upload_id')
+    if not task_id or not key or not upload_id:
+        raise ValueError("Missing 'id', 'key' or 'upload_id' in the request body")
+    if not key.startswith(task_attachments.task_prefix(task_id)):
+        raise ValueError(f"'{key}' is not an attachment of task {task_id}")
+
+    parts = []
+    for part in body.get('parts') or []:
+        number = part.get('part_number') if isinstance(part, dict) else None
+        if isinstance(number, bool) or not isinstance(number, int) or not part.get('etag'):
+            raise ValueError("Every part needs a 'part_number' and the 'etag' S3 returned for it")
+        parts.append({'PartNumber': number, 'ETag': part['etag']})
+    if not parts:
+        raise ValueError("Missing 'parts' in the request body")
+    return task_id, key, upload_id, sorted(parts, key=lambda part: part['PartNumber'])
+
+
+def file_record(key, head):
+    """The metadata stored in the task's `files` list, from the object's `HeadObject`."""
+    return {
+        'key': key,
+        'name': key.rsplit('/', 1)[-1],
+        'size': head['ContentLength'],
+        'content_type': head.get('ContentType') or 'application/octet-stream',
+        'checksum': head['ETag'].strip('"'),
+        'uploaded_at': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    }
+
+
+def attach_file(task_id, record):
+    """
+    Appends a file's metadata to a task's `files` and bumps `version`.
+
+    A `files` list is appended to with one conditional `list_append` `UpdateItem`. Once
+    `item_codec` has compressed it, it is no longer a list and cannot be appended to in
+    place; the failed condition check returns the task, and the list is decompressed,
+    extended and written back, conditional on `version`.
+
+    Returns:
+        The task's new `version`, or None if the task does not exist.
+    """
+    try:
+        response = table.update_item(
+            Key={'id': task_id},
+            UpdateExpression="SET #files = list_append(if_not_exists(#files, :empty), :file) ADD #version :one",
+            ConditionExpression="attribute_exists(#id) AND (attribute_not_exists(#files) OR attribute_type(#files, :list))",
+            ExpressionAttributeNames={'#id': 'id', '#files': 'files', '#version': 'version'},
+            ExpressionAttributeValues={':empty': [], ':file': [record], ':one': 1, ':list': 'L'},
+            ReturnValues='UPDATED_NEW',
+            ReturnValuesOnConditionCheckFailure='ALL_OLD'
+        )
+        return response['Attributes'].get('version')
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        current = e.response.get('Item')
+
+    for _ in range(MAX_REWRITE_ATTEMPTS):
+        if current is None:
+            return None
+        task = dynamodb_json.deserialize_item(current)
+        files = item_codec.decode_value(task.get('files')) or []
+        values = {':files': item_codec.encode_value(files + [record]), ':one': 1, ':zero': 0}
+        # Tasks created before versioning have no `version`; the rewrite starts it.
+        if 'version' in task:
+            condition = "attribute_exists(#id) AND #version = :version"
+            values[':version'] = task['version']
+        else:
+            condition = "attribute_exists(#id) AND attribute_not_exists(#version)"
+        try:
+            response = table.update_item(
+                Key={'id': task_id},
+                UpdateExpression="SET #files = :files, #version = if_not_exists(#version, :zero) + :one",
+                ConditionExpression=condition,
+                ExpressionAttributeNames={'#id': 'id', '#files': 'files', '#version': 'version'},
+                ExpressionAttributeValues=values,
+                ReturnValues='UPDATED_NEW',
+                ReturnValuesOnConditionCheckFailure='ALL_OLD'
+            )
+            return response['Attributes'].get('version')
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            current = e.response.get('Item')
+    raise Exception(f"Task {task_id} kept changing while its files were updated, please retry")
+
+
+def complete_attachment_upload(task_id, key, upload_id, parts):
+    """
+    Completes a multipart upload and attaches the file to its task.
+
+    Args:
+        task_id (str): The task the file is attached to.
+        key (str): The object key `create_attachment_upload` returned.
+        upload_id (str): The upload ID `create_attachment_upload` returned.
+        parts (list): `{'PartNumber', 'ETag'}` for every uploaded part, in order.
+
+    Returns:
+        dict: A response object containing:
+            - 'statusCode' (int): 200 on success, 400 if S3 rejects the part list,
+              404 if the task or the upload does not exist, 500 on errors.
+            - 'body' (str): A JSON object with the task's `id`, its new `version` and
+              the `file` metadata that was added to `files`.
+
+    Notes:
+        - The metadata is appended with one conditional `UpdateItem`
+          (`list_append`, `attribute_exists(id)`) that also bumps `version`, or rewritten
+          if `files` is stored compressed (see `attach_file`). If the task was deleted
+          during the upload, the object is deleted and a 404 is returned.
+        - `checksum` is the object's S3 `ETag`: for a multipart upload, the MD5 of the
+          parts' MD5 digests followed by `-<number of parts>`.
+        - Completing an upload again (a retried request) finds the upload gone; if the
+          file is already attached, its metadata is returned unchanged.
+    """
+    response_headers = {
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Allow-Methods": "OPTIONS,POST",
+        "Access-Control-Allow-Headers": "Content-Type,Authorization",
+    }
+
+    try:
+        try:
+            s3_client.complete_multipart_upload(
+                Bucket=task_attachments.BUCKET,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={'Parts': parts}
+            )
+        except ClientError as e:
+            code = e.response['Error']['Code']
+            if code in PART_ERRORS:
+                return {
+                    'statusCode': 400,
+                    "headers": response_headers,
+                    'body': json.dumps(f"Upload could not be completed: {e.response['Error'].get('Message', code)}")
+                }
+            if code != 'NoSuchUpload':
+                raise
+            # Already completed (or aborted): nothing to do if the file is attached.
+            task = table.get_item(
+                Key={'id': task_id},
+                ProjectionExpression='#id, #files, #version',
+                ExpressionAttributeNames={'#id': 'id', '#files': 'files', '#version': 'version'}
+            ).get('Item') or {}
+            attached = task_attachments.find_file(task, key)
+            if attached is not None:
+                return {
+                    'statusCode': 200,
+                    "headers": response_headers,
+                    'body': json.dumps({'id': task_id, 'version': task.get('version'), 'file': attached}, default=dynamodb_json.json_default)
+                }
+
+        try:
+            head = s3_client.head_object(Bucket=task_attachments.BUCKET, Key=key)
+        except ClientError as e:
+            if e.response['Error']['Code'] not in ('404', 'NoSuchKey', 'NotFound'):
+                raise
+            return {
+                'statusCode': 404,
+                "headers": response_headers,
+                'body': json.dumps(f"Upload {upload_id} not found")
+            }
+
+        record = file_record(key, head)
+        version = attach_file(task_id, record)
+        if version is None:
+            s3_client.delete_object(Bucket=task_attachments.BUCKET, Key=key)
+            return {
+                'statusCode': 404,
+                "headers": response_headers,
+                'body': json.dumps(f"Task with id {task_id} not found")
+            }
+
+        task_cache.invalidate([task_id])
+        print(f"Attached {key} ({record['size']} bytes) to task {task_id}")
+
+        result = {'id': task_id, 'version': version, 'file': record}
+        return {
+            'statusCode': 200,
+            "headers": response_headers,
+            'body': json.dumps(result, default=dynamodb_json.json_default)
+        }
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            "headers": response_headers,
+            'body': json.dumps(f"Error completing upload: {str(e)}")
+        }
+
+
+@instrumentation.instrument_handler
+def lambda_handler(event, context):
+    response_headers = {
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Allow-Methods": "OPTIONS,POST",
+        "Access-Control-Allow-Headers": "Content-Type,Authorization",
+    }
+
+    try:
+        body = json.loads(event.get('body') or '{}')
+        try:
+            task_id, key, upload_id, parts = parse_completion(body)
+        except ValueError as e:
+            return {
+                'statusCode': 400,
+                "headers": response_headers,
+                'body': json.dumps(str(e))
+            }
+
+        return complete_attachment_upload(task_id, key, upload_id, parts)
+
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            "headers": response_headers,
+            'body': json.dumps(f"Error processing request: {str(e)}")
+        }
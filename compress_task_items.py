@@ -0,0 +1,195 @@
+"""
+Rewrites the tasks in the `Tasks` table with their large attributes compressed.
+
+New and edited tasks are compressed as they are written (see `item_codec`); this
+migrates the ones written before, and the `files` lists that grew past the threshold
+one attachment at a time. It scans the table in parallel segments and rewrites only
+the attributes that change, conditional on the task's `version`, so a task edited
+while the scan runs is left alone (run the tool again to pick it up):
+
+    python compress_task_items.py [--segments 8] [--min-bytes 1024] [--dry-run] [--decompress]
+
+It can also be deployed as a Lambda function and invoked by hand with
+`{"segments": 8, "dry_run": false}`.
+
+The report lists the bytes stored before and after, and the capacity units a full
+read (strongly consistent `GetItem`s) and a full rewrite of every task would consume
+before and after, so the saving can be weighed against the one-off cost of the run
+(a scan plus one write per rewritten task). `--decompress` turns every compressed
+attribute back into plain values, e.g. before rolling back to a version without
+`item_codec`.
+
+The rewrite does not bump `version`: the task's content does not change, so cached
+copies stay valid.
+"""
+
+import argparse
+import json
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+import aws_clients
+import get_all_tasks
+import instrumentation
+import item_codec
+
+dynamodb_client = aws_clients.lazy_client('dynamodb')
+
+deserializer = TypeDeserializer()
+serializer = TypeSerializer()
+
+DEFAULT_SEGMENTS = 8
+
+
+def rewritten_attributes(item, min_bytes, decompress=False):
+    """
+    The compressible attributes of a wire-format item that change, with their new
+    wire-format values.
+    """
+    changes = {}
+    for name in item_codec.COMPRESSED_ATTRIBUTES:
+        value = item.get(name)
+        if value is None:
+            continue
+        stored = value.get('B')
+        if decompress:
+            if stored is not None and item_codec.is_compressed(stored):
+                changes[name] = serializer.serialize(item_codec.decode_value(stored))
+        elif stored is None:
+            blob = item_codec.compress(deserializer.deserialize(value), min_bytes)
+            if blob is not None:
+                changes[name] = {'B': blob}
+    return changes
+
+
+def rewrite(item, changes):
+    """
+    Writes the changed attributes of one task.
+
+    Returns:
+        float: The write units consumed, or None if the task changed (or was deleted)
+        since it was scanned.
+    """
+    names = {'#version': 'version'}
+    values = {}
+    set_actions = []
+    for index, (name, value) in enumerate(changes.items()):
+        names[f"#attr{index}"] = name
+        values[f":value{index}"] = value
+        set_actions.append(f"#attr{index} = :value{index}")
+    if 'version' in item:
+        condition = "#version = :version"
+        values[':version'] = item['version']
+    else:
+        condition = "attribute_exists(#id) AND attribute_not_exists(#version)"
+        names['#id'] = 'id'
+
+    try:
+        response = dynamodb_client.update_item(
+            TableName=get_all_tasks.TABLE_NAME,
+            Key={'id': item['id']},
+            UpdateExpression="SET " + ", ".join(set_actions),
+            ConditionExpression=condition,
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+            ReturnConsumedCapacity='TOTAL'
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        return None
+    return response.get('ConsumedCapacity', {}).get('CapacityUnits', 0)
+
+
+def compress_segment(segment, total_segments, min_bytes, dry_run, decompress):
+    """Rewrites the tasks of one scan segment and sums the sizes before and after."""
+    totals = Counter()
+    for item in get_all_tasks.scan_all(segment, total_segments):
+        changes = rewritten_attributes(item, min_bytes, decompress)
+        size_before = item_codec.wire_size(item)
+        size_after = item_codec.wire_size({**item, **changes}) if changes else size_before
+        totals['tasks'] += 1
+
+        if changes and not dry_run:
+            consumed = rewrite(item, changes)
+            if consumed is None:
+                totals['skipped'] += 1
+                size_after = size_before
+            else:
+                totals['rewritten'] += 1
+                totals['migration_write_units'] += consumed
+        elif changes:
+            totals['rewritten'] += 1
+
+        totals['bytes_before'] += size_before
+        totals['bytes_after'] += size_after
+        totals['read_units_before'] += item_codec.read_units(size_before)
+        totals['read_units_after'] += item_codec.read_units(size_after)
+        totals['write_units_before'] += item_codec.write_units(size_before)
+        totals['write_units_after'] += item_codec.write_units(size_after)
+    return totals
+
+
+def compress_task_items(total_segments=DEFAULT_SEGMENTS, min_bytes=None, dry_run=False, decompress=False):
+    """
+    Compresses (or decompresses) the large attributes of every task.
+
+    Args:
+        total_segments (int): The number of parallel scan segments.
+        min_bytes (int): The compression threshold; defaults to `item_codec.MIN_BYTES`.
+        dry_run (bool): Report what would change without writing.
+        decompress (bool): Store compressed attributes as plain values again.
+
+    Returns:
+        dict: The report: `tasks` scanned, `rewritten` and `skipped` (changed during the
+        run) tasks, `bytes_before`/`bytes_after`, the `read_units_*` and `write_units_*`
+        a full read and rewrite of the table takes, `*_units_saved`, and the
+        `migration_write_units` this run consumed.
+    """
+    min_bytes = item_codec.MIN_BYTES if min_bytes is None else min_bytes
+    totals = Counter()
+    with ThreadPoolExecutor(max_workers=total_segments) as executor:
+        for segment_totals in executor.map(
+                lambda segment: compress_segment(segment, total_segments, min_bytes, dry_run, decompress),
+                range(total_segments)):
+            totals.update(segment_totals)
+
+    report = {
+        key: totals.get(key, 0) for key in (
+            'tasks', 'rewritten', 'skipped', 'bytes_before', 'bytes_after',
+            'read_units_before', 'read_units_after', 'write_units_before', 'write_units_after',
+            'migration_write_units'
+        )
+    }
+    report['read_units_saved'] = report['read_units_before'] - report['read_units_after']
+    report['write_units_saved'] = report['write_units_before'] - report['write_units_after']
+    report['dry_run'] = dry_run
+
+    print(f"{'Decompressed' if decompress else 'Compressed'} {report['rewritten']} of {report['tasks']} tasks"
+          f"{' (dry run)' if dry_run else ''}: {report['bytes_before']} -> {report['bytes_after']} bytes, "
+          f"{report['read_units_saved']} read and {report['write_units_saved']} write units saved per full pass")
+    return report
+
+
+@instrumentation.instrument_handler
+def lambda_handler(event, context):
+    event = event or {}
+    return compress_task_items(
+        int(event.get('segments', DEFAULT_SEGMENTS)),
+        int(event['min_bytes']) if event.get('min_bytes') is not None else None,
+        bool(event.get('dry_run', False)),
+        bool(event.get('decompress', False))
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--segments', type=int, default=DEFAULT_SEGMENTS, help="parallel scan segments")
+    parser.add_argument('--min-bytes', type=int, help=f"compression threshold (default {item_codec.MIN_BYTES})")
+    parser.add_argument('--dry-run', action='store_true', help="report the savings without writing")
+    parser.add_argument('--decompress', action='store_true', help="store compressed attributes uncompressed again")
+    args = parser.parse_args()
+    print(json.dumps(compress_task_items(args.segments, args.min_bytes, args.dry_run, args.decompress), indent=2, sort_keys=True))
@@ -0,0 +1,129 @@
+import json
+
+import aws_clients
+import instrumentation
+import task_attachments
+
+table = aws_clients.lazy_table('Tasks')
+s3_client = aws_clients.lazy_client('s3')
+
+
+def parse_upload_request(body):
+    """
+    Reads and checks an upload request.
+
+    Returns:
+        tuple: `(task_id, name, size, content_type)`.
+
+    Raises:
+        ValueError: If a field is missing or the size is not a positive whole number of
+        at most `ATTACHMENT_MAX_BYTES`.
+    """
+    task_id = body.get('id')
+    name = body.get('name')
+    size = body.get('size')
+    if not task_id or not name:
+        raise ValueError("Missing 'id' or 'name' in the request body")
+    if isinstance(size, bool) or not isinstance(size, int) or size <= 0:
+        raise ValueError("'size' must be the file size in bytes")
+    if size > task_attachments.MAX_BYTES:
+        raise ValueError(f"Files larger than {task_attachments.MAX_BYTES} bytes cannot be attached")
+    return task_id, name, size, body.get('content_type') or 'application/octet-stream'
+
+
+def create_attachment_upload(task_id, name, size, content_type):
+    """
+    Starts a multipart upload of a file attached to a task.
+
+    Args:
+        task_id (str): The task the file is attached to.
+        name (str): The file name; it is reduced to a safe object key segment.
+        size (int): The file size in bytes, which decides the number of parts.
+        content_type (str): The file's media type, stored with the object.
+
+    Returns:
+        dict: A response object whose body has the object `key`, the `upload_id`, the
+        `part_size` and a presigned URL for every part (`parts`, each with
+        `part_number` and `url`), valid for `expires_in` seconds.
+
+    Notes:
+        - The client `PUT`s byte range `[(n - 1) * part_size, n * part_size)` of the file
+          to the URL of part `n`, in parallel, keeps the `ETag` header of every response
+          and sends them to `complete_attachment_upload`.
+        - A `GetItem` projecting only `id` checks that the task exists.
+    """
+    response_headers = {
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Allow-Methods": "OPTIONS,POST",
+        "Access-Control-Allow-Headers": "Content-Type,Authorization",
+    }
+
+    try:
+        task = table.get_item(
+            Key={'id': task_id},
+            ProjectionExpression='#id',
+            ExpressionAttributeNames={'#id': 'id'}
+        ).get('Item')
+        if task is None:
+            return {
+                'statusCode': 404,
+                "headers": response_headers,
+                'body': json.dumps(f"Task with id {task_id} not found")
+            }
+
+        key = task_attachments.attachment_key(task_id, name)
+        upload = s3_client.create_multipart_upload(
+            Bucket=task_attachments.BUCKET,
+            Key=key,
+            ContentType=content_type,
+            Metadata={'task-id': task_id}
+        )
+        part_size, parts = task_attachments.presign_parts(key, upload['UploadId'], size)
+        print(f"Started upload of {size} bytes in {len(parts)} parts to {key}")
+
+        return {
+            'statusCode': 200,
+            "headers": response_headers,
+            'body': json.dumps({
+                'key': key,
+                'upload_id': upload['UploadId'],
+                'part_size': part_size,
+                'parts': parts,
+                'expires_in': task_attachments.UPLOAD_URL_SECONDS
+            })
+        }
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            "headers": response_headers,
+            'body': json.dumps(f"Error starting upload: {str(e)}")
+        }
+
+
+@instrumentation.instrument_handler
+def lambda_handler(event, context):
+    response_headers = {
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Allow-Methods": "OPTIONS,POST",
+        "Access-Control-Allow-Headers": "Content-Type,Authorization",
+    }
+
+    try:
+        body = json.loads(event.get('body') or '{}')
+        try:
+            task_id, name, size, content_type = parse_upload_request(body)
+        except ValueError as e:
+            return {
+                'statusCode': 400,
+                "headers": response_headers,
+                'body': json.dumps(str(e))
+            }
+
+        return create_attachment_upload(task_id, name, size, content_type)
+
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            "headers": response_headers,
+            'body': json.dumps(f"Error processing request: {str(e)}")
+        }
@@ -1,59 +1,31 @@
 import json
-import boto3
-from datetime import datetime, timedelta
-
-dynamodb = boto3.resource('dynamodb')
-tasks_table = dynamodb.Table('Tasks')
-
-cognito_client = boto3.client('cognito-idp')
-GROUP_NAME = "************"
-USER_POOL_ID = "************"
-
-eventbridge = boto3.client('events')
-sns = boto3.client('sns')
-SNS_TOPIC_ARN = 'arn:aws:sns:************:************:notify-on-create-task'
-
-ADMIN_EMAIL = "************"
-
-def schedule_deadline_reminder(task_id, title, due_date, assigned_emails):
-    """Schedule a reminder for task deadline."""
-    
-    lambda_client = boto3.client('lambda')
-    eventbridge = boto3.client('events')
-    
-    reminder_time = datetime.strptime(due_date, '%Y-%m-%d') - timedelta(days=1)
-    
-    reminder_time_hour = reminder_time.replace(hour=8, minute=0, second=0, microsecond=0)
-    reminder_time_iso = reminder_time_hour.strftime('%Y-%m-%dT%H:%M:%S') + "Z"
-    
-    rule_name = f"TaskReminder_{task_id}"
- 
-    cron_expression = f"cron(0 8 {reminder_time_hour.day} {reminder_time_hour.month} ? {reminder_time_hour.year})"
-    
-    eventbridge.put_rule(
-        Name=rule_name,
-        ScheduleExpression=cron_expression,
-        State='ENABLED'
-    )
-
-    eventbridge.put_targets(
-        Rule=rule_name,
-        Targets=[
-            {
-                'Id': f"ReminderTarget_{task_id}",
-                'Arn': 'arn:aws:lambda:************:************:function:sendTaskReminder',
-                'Input': json.dumps({
-                    'task_id': task_id,
-                    'title': title,
-                    'due_date': due_date,
-                    'assigned_emails': assigned_emails
-                })
-            }
-        ]
-    )
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from botocore.exceptions import ClientError
+
+from boto3.dynamodb.types import TypeSerializer
+
+import aws_clients
+import dynamodb_batch
+import idempotency
+import instrumentation
+import item_codec
+
+tasks_table = aws_clients.lazy_table('Tasks')
+dynamodb_client = aws_clients.lazy_client('dynamodb')
 
-    print(f"Reminder scheduled for {reminder_time_iso}")
+serializer = TypeSerializer()
 
+MAX_BULK_CREATE_TASKS = 500
+
+# Concurrent puts of a bulk create.
+PUT_WORKERS = 8
+# Tries per write before a task is reported as failed; each retry redraws a taken ID.
+MAX_WRITE_ATTEMPTS = 5
+# Rounds of `BatchGetItem` checks, and random draws per missing ID in each round, before
+# `create_unique_task_ids` gives up on a nearly full ID space.
+MAX_ID_ATTEMPTS = 5
+ID_DRAWS_PER_TASK = 10
 
 def create_task_id():
     """Generates a new task ID in the format T_XXXX."""
@@ -62,42 +34,15 @@ def create_task_id():
     return task_id
 
 
-def send_task_notification(emails, admin_email, title, start_date, due_date):
-    """Sends notifications via SNS to specific users based on filter policy."""
-    print(emails, admin_email, title, start_date, due_date)
-
-    message = (
-        f"You have been assigned a new task:\n\n"
-        f"Title: {title}\n"
-        f"Start Date: {start_date}\n"
-        f"Due Date: {due_date}\n\n"
-        f"Please check the system for more details."
-    )
-    subject = f"New Task Assigned: {title}"
-
-    for email in emails:
-        sns.publish(
-            TopicArn=SNS_TOPIC_ARN,
-            Subject=subject,
-            Message=message,
-            MessageAttributes={
-                'email': {
-                    'DataType': 'String',
-                    'StringValue': email
-                },
-                'group': {
-                    'DataType': 'String',
-                    'StringValue': GROUP_NAME
-                }
-            }
-        )
+def build_task_item(task_id, body):
+    """
+    Builds the item stored for a new task from a create request body, with a long
+    `description` compressed (see `item_codec`).
 
-
-def lambda_handler(event, context):
-    body = json.loads(event.get('body', '{}'))
-
-    task_id = create_task_id()
-    task_item = {
+    `created_at` (to the microsecond) tells a task apart from an earlier one that had
+    the same ID, which `version` alone cannot: every task starts at version 1.
+    """
+    return item_codec.encode_item({
         'id': task_id,
         'title': body['title'],
         'description': body.get('description', ''),
@@ -106,41 +51,214 @@ def lambda_handler(event, context):
         'start_date': body['startDate'],
         'due_date': body['dueDate'],
         'assigned_to': body['assigned_to'],
-        'completed_by': []
+        # `completed_by` is a string set, added on the first completion (sets can't be
+        # empty). See update_status.complete_task for the two counters.
+        'assignee_count': len(body['assigned_to']),
+        'next_completion': 1,
+        'version': 1,
+        'created_at': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+    })
+
+
+def validate_task_body(body):
+    """Returns an error message if a create request body is unusable, otherwise None."""
+    if not isinstance(body, dict):
+        return "Task must be an object"
+    missing = [field for field in ('title', 'startDate', 'dueDate') if not body.get(field)]
+    if missing:
+        return f"Missing {', '.join(missing)}"
+    if not isinstance(body.get('assigned_to'), list):
+        return "'assigned_to' must be a list"
+    return None
+
+
+def create_unique_task_ids(count, exclude=()):
+    """
+    Generates up to `count` task IDs that are unused in the table and distinct from each
+    other and from `exclude`.
+
+    Candidate IDs are checked with a projected `BatchGetItem` (one call per 100 IDs) and
+    taken ones are redrawn, so the conditional puts in `put_new_tasks` rarely fail.
+
+    Returns:
+        list: The IDs. Fewer than `count` if the table is so full that
+        `MAX_ID_ATTEMPTS` rounds of drawing did not find enough free ones.
+    """
+    task_ids = set()
+    for _ in range(MAX_ID_ATTEMPTS):
+        if len(task_ids) >= count:
+            break
+        candidates = set()
+        for _ in range(ID_DRAWS_PER_TASK * (count - len(task_ids))):
+            if len(candidates) >= count - len(task_ids):
+                break
+            candidate = create_task_id()
+            if candidate not in task_ids and candidate not in exclude:
+                candidates.add(candidate)
+        taken, unread = dynamodb_batch.batch_get(
+            tasks_table.name,
+            [{'id': task_id} for task_id in candidates],
+            projection_expression='#id',
+            expression_attribute_names={'#id': 'id'}
+        )
+        task_ids |= candidates - {item['id'] for item in taken} - {key['id'] for key in unread}
+    return list(task_ids)
+
+
+def put_new_task(item):
+    """
+    Writes one new task item with a `PutItem` conditional on `attribute_not_exists(id)`.
+
+    Between the ID check and the write, a concurrent create may take the item's ID. The
+    put then fails its condition and the item gets a new ID (it is updated in place)
+    for the next of at most `MAX_WRITE_ATTEMPTS` tries.
+
+    Returns:
+        str: None if the task was written, otherwise why it was not.
+    """
+    for _ in range(MAX_WRITE_ATTEMPTS):
+        try:
+            dynamodb_client.put_item(
+                TableName=tasks_table.name,
+                Item={name: serializer.serialize(value) for name, value in item.items()},
+                ConditionExpression='attribute_not_exists(#id)',
+                ExpressionAttributeNames={'#id': 'id'}
+            )
+            return None
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                return f"{e.response['Error']['Code']}: {e.response['Error'].get('Message')}"
+        task_id = create_task_id()
+        print(f"Task ID {item['id']} was taken concurrently, trying {task_id}")
+        item['id'] = task_id
+    return f"No free task ID after {MAX_WRITE_ATTEMPTS} attempts"
+
+
+def put_new_tasks(items):
+    """
+    Writes new task items with concurrent conditional `PutItem`s (see `put_new_task`).
+
+    Every item succeeds or fails on its own, so a failure never undoes or hides the
+    tasks that were written, and no request limit caps the total size of the items.
+
+    Returns:
+        list: One entry per item, in order: None if it was written, otherwise the error.
+    """
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=min(PUT_WORKERS, len(items))) as executor:
+        return list(executor.map(put_new_task, items))
+
+
+def create_tasks(bodies):
+    """
+    Creates many tasks with concurrent conditional `PutItem`s.
+
+    Args:
+        bodies (list): Create request bodies, as accepted by the single-task endpoint.
+
+    Returns:
+        dict: A result object containing:
+            - 'results' (list): One entry per body, in order, with 'index', 'status'
+              ('created', 'invalid' or 'failed') and either 'id' or 'error'.
+
+    Notes:
+        - Every put is conditional on `attribute_not_exists(id)` (see `put_new_tasks`),
+          so a task is never overwritten by a new one with the same ID.
+        - Tasks that could not be written, or for which no free ID was found, are
+          reported as 'failed'; the others are created either way.
+        - `TaskAssignments` rows and notifications are written by `process_task_events`
+          from the table's stream; every assignee gets a single notification covering
+          all of their new tasks.
+    """
+    results = [{'index': index} for index in range(len(bodies))]
+    valid = []
+    for index, body in enumerate(bodies):
+        error = validate_task_body(body)
+        if error:
+            results[index].update(status='invalid', error=error)
+        else:
+            valid.append(index)
+
+    task_ids = create_unique_task_ids(len(valid))
+    items = {index: build_task_item(task_id, bodies[index]) for index, task_id in zip(valid, task_ids)}
+    for index in valid[len(task_ids):]:
+        results[index].update(status='failed', error="No free task ID, please retry")
+
+    errors = put_new_tasks(list(items.values()))
+
+    for (index, item), error in zip(items.items(), errors):
+        if error:
+            print(f"Could not create task {index}: {error}")
+            results[index].update(status='failed', error=error)
+        else:
+            results[index].update(status='created', id=item['id'])
+
+    return {
+        'results': results
     }
 
+
+@instrumentation.instrument_handler
+@idempotency.idempotent('create_tasks')
+def lambda_handler(event, context):
+    body = json.loads(event.get('body', '{}'))
+
     response_headers = {
         "Access-Control-Allow-Origin": "*",
         "Access-Control-Allow-Methods": "OPTIONS,GET,POST",
-        "Access-Control-Allow-Headers": "Content-Type,Authorization",
+        "Access-Control-Allow-Headers": "Content-Type,Authorization,Idempotency-Key",
     }
 
-    try:
-        tasks_table.put_item(Item=task_item)
-        
-        assigned_users = body['assigned_to']
-        assigned_users_emails = [user['email'] for user in assigned_users]
-
-        if assigned_users_emails:
-            send_task_notification(
-                emails=assigned_users_emails,
-                admin_email=ADMIN_EMAIL,
-                title=body['title'],
-                start_date=body['startDate'],
-                due_date=body['dueDate']
-            )
+    if isinstance(body, list) or (isinstance(body, dict) and 'tasks' in body):
+        bodies = body if isinstance(body, list) else body['tasks']
+        if not isinstance(bodies, list) or not bodies or len(bodies) > MAX_BULK_CREATE_TASKS:
+            return {
+                'statusCode': 400,
+                "headers": response_headers,
+                'body': json.dumps(f"Expected between 1 and {MAX_BULK_CREATE_TASKS} tasks")
+            }
+        try:
+            return {
+                'statusCode': 200,
+                "headers": response_headers,
+                'body': json.dumps(create_tasks(bodies))
+            }
+        except Exception as e:
+            print(f"Error: {str(e)}")
+            return {
+                'statusCode': 500,
+                "headers": response_headers,
+                'body': json.dumps(f"Error adding tasks: {str(e)}")
+            }
+
+    error = validate_task_body(body)
+    if error:
+        return {
+            'statusCode': 400,
+            "headers": response_headers,
+            'body': json.dumps(error)
+        }
 
-        schedule_deadline_reminder(task_id, body['title'], body['dueDate'], assigned_users_emails)
+    try:
+        # Assignment rows and notifications follow from the table's stream
+        # (process_task_events), so saving the task is all the request waits for.
+        # The put never replaces a task; a taken ID is redrawn.
+        item = build_task_item(create_task_id(), body)
+        error = put_new_task(item)
+        if error:
+            raise Exception(error)
+        task_id = item['id']
 
         return {
             'statusCode': 200,
             "headers": response_headers,
-            'body': json.dumps(f"Task {task_id} added successfully and notifications sent!")
+            'body': json.dumps(f"Task {task_id} added successfully, assignees will be notified shortly")
         }
     except Exception as e:
         print(f"Error: {str(e)}")
         return {
             'statusCode': 500,
             "headers": response_headers,
-            'body': json.dumps(f"Error adding task or sending notifications: {str(e)}")
+            'body': json.dumps(f"Error adding task: {str(e)}")
         }
@@ -1,16 +1,26 @@
-import boto3
 import json
+from botocore.exceptions import ClientError
+
+import aws_clients
+import dynamodb_batch
+import idempotency
+import instrumentation
+import reminder_rules
+import task_attachments
+import task_cache
+
+table = aws_clients.lazy_table('Tasks')
+
+MAX_BULK_DELETE_IDS = 1000
 
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table('Tasks')
 
 def delete_task_by_id(task_id):
     """
     Deletes a task from the DynamoDB table by its unique ID.
 
-    This function retrieves a task by its `id` from the DynamoDB table. If the task exists, 
-    it deletes the task and returns a success message. If the task does not exist, 
-    it returns a 404 status with an appropriate message.
+    This function deletes the task with a single conditional `DeleteItem`
+    (`attribute_exists(id)`), so no read is needed to tell a missing task apart:
+    a failed condition means the task does not exist and a 404 is returned.
 
     Args:
         task_id (str): The unique identifier of the task to be deleted.
@@ -21,7 +31,13 @@ def delete_task_by_id(task_id):
             - 'body' (str): A JSON string with a success message or error details.
 
     Notes:
-        - The function checks if the task exists before attempting deletion.
+        - The deleted item is returned by `DeleteItem` (`ReturnValues=ALL_OLD`) and used to
+          clean up after the task.
+        - The task's rows in the 'TaskAssignments' table are deleted from the `Tasks`
+          stream by `process_task_events`.
+        - The task's legacy `TaskReminder_*` EventBridge rule, if any, is deleted.
+        - The objects of the task's attachments are deleted from S3.
+        - The task is dropped from this container's `task_cache`.
         - Catches exceptions and returns a 500 status code with an error message in case of unexpected errors.
         - This function interacts with a DynamoDB table named 'Tasks'.
 
@@ -30,16 +46,25 @@ def delete_task_by_id(task_id):
     """
 
     try:
-        response = table.get_item(Key={'id': task_id})
-        
-        if 'Item' not in response:
+        try:
+            response = table.delete_item(
+                Key={'id': task_id},
+                ConditionExpression='attribute_exists(#id)',
+                ExpressionAttributeNames={'#id': 'id'},
+                ReturnValues='ALL_OLD'
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
             return {
                 'statusCode': 404,
                 'body': json.dumps(f"Task with id {task_id} not found")
             }
 
-        table.delete_item(Key={'id': task_id})
-        
+        task_cache.invalidate([task_id])
+        reminder_rules.cleanup_reminder_rules([task_id])
+        task_attachments.delete_attachments([response['Attributes']])
+
         return {
             'statusCode': 200,
             'body': json.dumps(f"Task with id {task_id} has been successfully deleted")
@@ -50,20 +75,120 @@ def delete_task_by_id(task_id):
             'body': json.dumps(f"Error deleting task: {str(e)}")
         }
 
+
+def delete_tasks(task_ids):
+    """
+    Deletes many tasks at once.
+
+    The tasks are read with `BatchGetItem` (only `id` and `files`) to find out which
+    exist and what they had attached, then
+    deleted with `BatchWriteItem` in chunks of 25. Unprocessed items are retried with
+    backoff.
+
+    Args:
+        task_ids (list): The IDs of the tasks to delete.
+
+    Returns:
+        dict: A response object whose body lists the 'deleted', 'not_found' and
+        'failed' task IDs.
+    """
+    try:
+        task_ids = list(dict.fromkeys(task_ids))
+        tasks, unread = dynamodb_batch.batch_get(
+            table.name,
+            [{'id': task_id} for task_id in task_ids],
+            projection_expression='#id, #files',
+            expression_attribute_names={'#id': 'id', '#files': 'files'}
+        )
+        found = {task['id']: task for task in tasks}
+        unread_ids = {key['id'] for key in unread}
+
+        unprocessed = dynamodb_batch.batch_write(
+            table.name,
+            [{'DeleteRequest': {'Key': {'id': task_id}}} for task_id in found]
+        )
+        failed_ids = {request['DeleteRequest']['Key']['id'] for request in unprocessed} | unread_ids
+        deleted = [task_id for task_id in task_ids if task_id in found and task_id not in failed_ids]
+
+        task_cache.invalidate(deleted)
+        reminder_rules.cleanup_reminder_rules(deleted)
+        task_attachments.delete_attachments([found[task_id] for task_id in deleted])
+
+        result = {
+            'deleted': deleted,
+            'not_found': [task_id for task_id in task_ids if task_id not in found and task_id not in unread_ids],
+            'failed': [task_id for task_id in task_ids if task_id in failed_ids]
+        }
+        return {
+            'statusCode': 200,
+            'body': json.dumps(result)
+        }
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'body': json.dumps(f"Error deleting tasks: {str(e)}")
+        }
+
+
+def parse_task_ids(event):
+    """
+    Reads the IDs for a bulk delete from `?ids=a,b,c` or a JSON body `{"ids": [...]}`.
+
+    Raises:
+        ValueError: If the body is not a JSON object.
+    """
+    params = event.get('queryStringParameters') or {}
+    if params.get('ids'):
+        return [task_id.strip() for task_id in params['ids'].split(',') if task_id.strip()]
+    if event.get('body'):
+        body = json.loads(event['body'])
+        if not isinstance(body, dict):
+            raise ValueError("Body must be a JSON object")
+        ids = body.get('ids')
+        if isinstance(ids, list):
+            return [str(task_id) for task_id in ids if task_id]
+    return None
+
+
+@instrumentation.instrument_handler
+@idempotency.idempotent('delete_task_by_id')
 def lambda_handler(event, context):
+    response_headers = {
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Allow-Methods": "OPTIONS,GET,DELETE",
+        "Access-Control-Allow-Headers": "Content-Type,Authorization,Idempotency-Key",
+    }
+
     try:
-        task_id = event.get('queryStringParameters', {}).get('id')
-        
-        response = delete_task_by_id(task_id)
-        
+        try:
+            task_ids = parse_task_ids(event)
+        except ValueError as e:
+            return {
+                'statusCode': 400,
+                "headers": response_headers,
+                'body': json.dumps(f"Invalid request body: {str(e)}")
+            }
+
+        if task_ids is not None:
+            if not task_ids or len(task_ids) > MAX_BULK_DELETE_IDS:
+                return {
+                    'statusCode': 400,
+                    "headers": response_headers,
+                    'body': json.dumps(f"'ids' must contain between 1 and {MAX_BULK_DELETE_IDS} task ids")
+                }
+            response = delete_tasks(task_ids)
+        else:
+            task_id = (event.get('queryStringParameters') or {}).get('id')
+            if not task_id:
+                return {
+                    'statusCode': 400,
+                    "headers": response_headers,
+                    'body': json.dumps("Missing 'id' or 'ids'")
+                }
+            response = delete_task_by_id(task_id)
+
         print(f'Deletion response: {response}')
-        
-        response_headers = {
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "OPTIONS,GET,DELETE",
-            "Access-Control-Allow-Headers": "Content-Type,Authorization",
-        }
-        
+
         return {
             'statusCode': response['statusCode'],
             "headers": response_headers,
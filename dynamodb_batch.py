@@ -0,0 +1,117 @@
+"""
+Chunked DynamoDB batch operations with retries.
+
+`BatchWriteItem` takes at most 25 requests and `BatchGetItem` at most 100 keys per call,
+and either may hand back part of the work as `UnprocessedItems`/`UnprocessedKeys` when
+the table is throttled. These helpers split the work into chunks and resend whatever
+is left unprocessed with exponential backoff. Chunks of a read are sent concurrently.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import aws_clients
+
+dynamodb = aws_clients.lazy_resource('dynamodb')
+
+WRITE_BATCH_SIZE = 25
+GET_BATCH_SIZE = 100
+GET_WORKERS = 4
+MAX_ATTEMPTS = 6
+BASE_BACKOFF_SECONDS = 0.05
+
+
+def chunk(items, size):
+    """Splits a list into consecutive chunks of at most `size` items."""
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def backoff(attempt):
+    """Sleeps before retry number `attempt` (1-based)."""
+    time.sleep(BASE_BACKOFF_SECONDS * (2 ** (attempt - 1)))
+
+
+def batch_write(table_name, requests):
+    """
+    Runs `PutRequest`/`DeleteRequest` entries against one table in chunks of 25.
+
+    Args:
+        table_name (str): The table to write to.
+        requests (list): Write requests, e.g. `{'DeleteRequest': {'Key': {'id': 'T_1234'}}}`.
+
+    Returns:
+        list: The requests that were still unprocessed after `MAX_ATTEMPTS` tries.
+    """
+    failed = []
+    for requests_chunk in chunk(requests, WRITE_BATCH_SIZE):
+        pending = requests_chunk
+        for attempt in range(MAX_ATTEMPTS):
+            if attempt:
+                backoff(attempt)
+            response = dynamodb.batch_write_item(RequestItems={table_name: pending})
+            pending = response.get('UnprocessedItems', {}).get(table_name, [])
+            if not pending:
+                break
+        failed.extend(pending)
+    return failed
+
+
+def get_chunk(service, table_name, request):
+    """Reads one chunk of at most 100 keys, retrying `UnprocessedKeys` with backoff."""
+    items = []
+    for attempt in range(MAX_ATTEMPTS):
+        if attempt:
+            backoff(attempt)
+        response = service.batch_get_item(RequestItems={table_name: request})
+        items.extend(response.get('Responses', {}).get(table_name, []))
+        request = response.get('UnprocessedKeys', {}).get(table_name)
+        if not request:
+            return items, []
+    return items, request['Keys']
+
+
+def batch_get(table_name, keys, projection_expression=None, expression_attribute_names=None, client=None,
+              consistent_read=False):
+    """
+    Reads items by key from one table in chunks of 100, running the chunks concurrently.
+
+    Args:
+        table_name (str): The table to read from.
+        keys (list): The primary keys to read. Duplicates are not allowed by DynamoDB.
+        projection_expression (str): Optional attributes to read.
+        expression_attribute_names (dict): Placeholders used in `projection_expression`.
+        client: A low-level DynamoDB client to read with instead of the shared resource.
+            Keys and items are then in the wire format (`{'id': {'S': 'T_1234'}}`).
+        consistent_read (bool): Read with strong consistency (twice the read units).
+
+    Returns:
+        tuple: `(items, unprocessed_keys)`. Keys of items that do not exist appear in neither.
+
+    Notes:
+        - Up to `GET_WORKERS` chunks are in flight at once; items come back in no
+          particular order.
+    """
+    service = client or dynamodb
+    requests = []
+    for keys_chunk in chunk(keys, GET_BATCH_SIZE):
+        request = {'Keys': keys_chunk}
+        if projection_expression:
+            request['ProjectionExpression'] = projection_expression
+        if expression_attribute_names:
+            request['ExpressionAttributeNames'] = expression_attribute_names
+        if consistent_read:
+            request['ConsistentRead'] = True
+        requests.append(request)
+
+    if len(requests) > 1:
+        with ThreadPoolExecutor(max_workers=min(GET_WORKERS, len(requests))) as executor:
+            results = list(executor.map(lambda request: get_chunk(service, table_name, request), requests))
+    else:
+        results = [get_chunk(service, table_name, request) for request in requests]
+
+    items = []
+    unprocessed = []
+    for chunk_items, chunk_unprocessed in results:
+        items.extend(chunk_items)
+        unprocessed.extend(chunk_unprocessed)
+    return items, unprocessed
@@ -0,0 +1,129 @@
+"""
+JSON encoding of DynamoDB items.
+
+The boto3 resource API returns numbers as `Decimal`, sets as `set` and binary values as
+`Binary`, none of which `json.dumps` accepts. Pass `default=json_default` to encode them.
+
+The read handlers skip that layer altogether: they call the low-level client, which
+returns items in the DynamoDB wire format (`{'title': {'S': 'Inspect site'}}`), and
+`items_to_json`/`item_to_json` write the HTTP body straight from it in one pass,
+without building `Decimal`s and Python objects for `json.dumps` to walk again.
+
+Attributes compressed by `item_codec` are written out as the JSON they hold, by both
+paths, and are only decompressed then.
+"""
+
+import base64
+from decimal import Decimal
+from json.encoder import encode_basestring_ascii
+
+from boto3.dynamodb.types import Binary, TypeDeserializer
+
+import item_codec
+
+deserializer = TypeDeserializer()
+
+
+def json_default(value):
+    """`json.dumps` hook for the non-JSON types the boto3 resource API returns."""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (set, frozenset)):
+        # A set holds one type only, so its members compare with each other (numbers by value).
+        return sorted(value, key=lambda member: member.value if isinstance(member, Binary) else member)
+    if item_codec.is_compressed(value):
+        return item_codec.decode_value(value)
+    if isinstance(value, Binary):
+        return base64.b64encode(value.value).decode('ascii')
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def deserialize_item(item):
+    """
+    Turns a wire-format item into the Python values the boto3 resource API would return.
+
+    Compressed attributes stay `Binary`; see `item_codec.decode_value`.
+    """
+    return {name: deserializer.deserialize(value) for name, value in item.items()}
+
+
+def _encode_binary(value):
+    """Binary values are sent as base64 strings (the client hands them over as bytes)."""
+    return encode_basestring_ascii(base64.b64encode(value).decode('ascii'))
+
+
+def _write_value(attribute_value, out):
+    """Appends the JSON encoding of one wire-format attribute value to `out`."""
+    for type_code, value in attribute_value.items():
+        if type_code == 'S':
+            out.append(encode_basestring_ascii(value))
+        elif type_code == 'N':
+            # Numbers arrive as normalized decimal strings, which are valid JSON numbers.
+            out.append(value)
+        elif type_code == 'M':
+            _write_map(value, out)
+        elif type_code == 'L':
+            out.append('[')
+            for index, element in enumerate(value):
+                if index:
+                    out.append(',')
+                _write_value(element, out)
+            out.append(']')
+        elif type_code == 'BOOL':
+            out.append('true' if value else 'false')
+        elif type_code == 'NULL':
+            out.append('null')
+        elif type_code == 'SS':
+            out.append('[' + ','.join(encode_basestring_ascii(element) for element in sorted(value)) + ']')
+        elif type_code == 'NS':
+            out.append('[' + ','.join(sorted(value, key=Decimal)) + ']')
+        elif type_code == 'B':
+            if item_codec.is_compressed(value):
+                out.append(item_codec.json_text(value))
+            else:
+                out.append(_encode_binary(value))
+        elif type_code == 'BS':
+            out.append('[' + ','.join(_encode_binary(element) for element in sorted(value)) + ']')
+        else:
+            raise TypeError(f"Unsupported DynamoDB type {type_code}")
+        return
+
+
+def _write_map(attributes, out):
+    """Appends a wire-format map (or item) as a JSON object with sorted keys."""
+    out.append('{')
+    first = True
+    for name in sorted(attributes):
+        if first:
+            first = False
+        else:
+            out.append(',')
+        out.append(encode_basestring_ascii(name))
+        out.append(':')
+        _write_value(attributes[name], out)
+    out.append('}')
+
+
+def item_to_json(item):
+    """
+    Encodes one wire-format item as a JSON object.
+
+    Keys are sorted, so equal items always encode to the same string (stable ETags).
+    String and number sets become sorted arrays, binary values base64 strings and
+    compressed attributes the JSON they hold, so the result decodes to the same value
+    as `json.dumps(..., default=json_default)` on the deserialized item.
+    """
+    out = []
+    _write_map(item, out)
+    return ''.join(out)
+
+
+def items_to_json(items):
+    """Encodes a list of wire-format items as a JSON array."""
+    out = ['[']
+    for index, item in enumerate(items):
+        if index:
+            out.append(',')
+        _write_map(item, out)
+    out.append(']')
+    return ''.join(out)
@@ -1,50 +1,36 @@
-import json
-import boto3
+import user_directory
+
+
+def resolve_user_emails(user_ids):
+    """
+    Maps Cognito subs to email addresses.
+
+    Args:
+        user_ids (iterable): The subs to resolve. Duplicates are looked up once.
+
+    Returns:
+        dict: A sub -> email mapping in the order the subs were given. Subs that could not
+        be found, or have no email, are left out.
+
+    Notes:
+        - The subs are read from the members directory (`user_directory`) with
+          `BatchGetItem`, 100 keys per request, so there are no Cognito calls and the cost
+          does not depend on the size of the user pool.
+        - A member that is missing from the directory (its post-confirmation write
+          failed) is found again after the next `reconcile_user_directory` run.
+    """
+    subs = list(dict.fromkeys(sub for sub in user_ids if sub))
+    if not subs:
+        return {}
+
+    found = user_directory.get_users(subs)
+    return {sub: found[sub]['email'] for sub in subs if sub in found and found[sub].get('email')}
 
-cognito_client = boto3.client('cognito-idp')
-GROUP_NAME = "Team-Members"
-USER_POOL_ID = "eu-west-1_xEP7m4WPV"
 
 def get_user_emails(user_ids):
-    """Fetch email addresses for a list of user IDs from a specific Cognito group."""
-    emails = []
-    
+    """Fetch email addresses for a list of user IDs from the members directory."""
     try:
-        
-        response = cognito_client.list_users_in_group(
-            UserPoolId=USER_POOL_ID,
-            GroupName=GROUP_NAME
-        )
-
-        
-        for user in response['Users']:
-            
-            for attribute in user['Attributes']:
-                if attribute['Name'] == 'sub' and attribute['Value'] in user_ids:
-                    
-                    email = next((attr['Value'] for attr in user['Attributes'] if attr['Name'] == 'email'), None)
-                    if email:
-                        emails.append(email)
-                    break
-
-        
-        while 'NextToken' in response:
-            response = cognito_client.list_users_in_group(
-                UserPoolId=USER_POOL_ID,
-                GroupName=GROUP_NAME,
-                NextToken=response['NextToken']
-            )
-            
-            for user in response['Users']:
-                for attribute in user['Attributes']:
-                    if attribute['Name'] == 'sub' and attribute['Value'] in user_ids:
-                        email = next((attr['Value'] for attr in user['Attributes'] if attr['Name'] == 'email'), None)
-                        if email:
-                            emails.append(email)
-                        break
-
+        return list(resolve_user_emails(user_ids).values())
     except Exception as e:
         print(f"Error fetching user emails: {e}")
         return []
-    
-    return emails
\ No newline at end of file
@@ -1,74 +1,47 @@
 import json
-import boto3
 
-cognito_client = boto3.client('cognito-idp')
+import instrumentation
+import user_directory
+
 GROUP_NAME = "Team-Members"
-USER_POOL_ID = "eu-west-1_xEP7m4WPV"
 
 def get_users_from_group():
     """
-    Retrieves a list of users from a specified Cognito user group.
+    Retrieves the list of members from the members directory.
 
-    This function interacts with AWS Cognito using the boto3 client to fetch
-    all users belonging to a specific group in a user pool. The users are returned
-    as a list of dictionaries containing their username, email, and unique identifier (sub).
+    The members of `GROUP_NAME` are read from the `user_directory` table with one
+    `Query` on its `group-index`, so listing them makes no Cognito calls and does not
+    get slower, page by 60 users, as the group grows. The post-confirmation trigger
+    adds new members and `reconcile_user_directory` keeps the table in line with Cognito.
 
     Returns:
-        list: A list of dictionaries where each dictionary contains:
+        list: A list of dictionaries, ordered by email, where each dictionary contains:
             - 'Username' (str): The user's username.
             - 'Email' (str or None): The user's email address, if available.
             - 'Sub' (str or None): The user's unique identifier (sub), if available.
 
     Notes:
-        - The function handles pagination to retrieve all users in the group.
         - In case of an error (e.g., network issues or invalid parameters), the function
           prints an error message and returns an empty list.
     """
-    
     try:
-        users = []
-        pagination_token = None
-        
-        while True:
-            if pagination_token:
-                response = cognito_client.list_users_in_group(
-                    UserPoolId=USER_POOL_ID,
-                    GroupName=GROUP_NAME,
-                    NextToken=pagination_token
-                )
-            else:
-                response = cognito_client.list_users_in_group(
-                    UserPoolId=USER_POOL_ID,
-                    GroupName=GROUP_NAME
-                )
-            
-            for user in response['Users']:
-                user_info = {
-                    'Username': user['Username'],
-                    'Email': None,
-                    'Sub': None
-                }
-                
-                for attr in user['Attributes']:
-                    if attr['Name'] == 'email':
-                        user_info['Email'] = attr['Value']
-                    elif attr['Name'] == 'sub':
-                        user_info['Sub'] = attr['Value']
-                
-                users.append(user_info)
-            
-            pagination_token = response.get('NextToken')
-            if not pagination_token:
-                break
-        return users
-    
+        return [
+            {
+                'Username': record.get('username'),
+                'Email': record.get('email'),
+                'Sub': record.get('sub')
+            }
+            for record in user_directory.list_group(GROUP_NAME)
+        ]
+
     except Exception as e:
         print(f"Error: {str(e)}")
         return []
 
+@instrumentation.instrument_handler
 def lambda_handler(event, context):
     users = get_users_from_group()
-    print(users)
+    print(f"Fetched {len(users)} users")
     return {
         'statusCode': 200,
         'body': json.dumps(users)
@@ -1,18 +1,169 @@
-import boto3
+import base64
 import json
+from concurrent.futures import ThreadPoolExecutor
 
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table('Tasks')
+import aws_clients
+import dynamodb_json
+import http_caching
+import instrumentation
+import task_fields
+import task_indexes
 
-def get_all_tasks():
+TABLE_NAME = 'Tasks'
+
+# Reads go through the low-level client: items stay in the DynamoDB wire format and are
+# written to the response body by `dynamodb_json` without a deserialization pass.
+dynamodb_client = aws_clients.lazy_client('dynamodb')
+
+DEFAULT_PAGE_LIMIT = 50
+MAX_PAGE_LIMIT = 500
+DEFAULT_EXPORT_SEGMENTS = 4
+MAX_EXPORT_SEGMENTS = 16
+FILTER_PARAMS = ('assignee', 'status', 'due_from', 'due_to')
+
+
+def encode_cursor(last_evaluated_key):
+    """Turns a DynamoDB `LastEvaluatedKey` into an opaque, URL-safe cursor string."""
+    if not last_evaluated_key:
+        return None
+    raw = json.dumps(last_evaluated_key, separators=(',', ':'), sort_keys=True)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Turns a cursor produced by `encode_cursor` back into an `ExclusiveStartKey`.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(key, dict) or not key:
+        raise ValueError("Invalid cursor")
+    return key
+
+
+def scan_page(limit=None, exclusive_start_key=None, segment=None, total_segments=None, scan_filter=None, fields=None):
+    """
+    Runs a single `scan` call and returns `(items, last_evaluated_key)`.
+
+    `scan_filter` holds extra `FilterExpression`/`ExpressionAttribute*` arguments and
+    `fields` the attributes to read (see `task_fields`), None for whole items.
+    Items are returned in the DynamoDB wire format.
+    """
+    scan_kwargs = {'TableName': TABLE_NAME, **(scan_filter or {})}
+    scan_kwargs.update(task_fields.projection_kwargs(fields, scan_kwargs.get('ExpressionAttributeNames')))
+    if limit:
+        scan_kwargs['Limit'] = limit
+    if exclusive_start_key:
+        scan_kwargs['ExclusiveStartKey'] = exclusive_start_key
+    if total_segments:
+        scan_kwargs['Segment'] = segment
+        scan_kwargs['TotalSegments'] = total_segments
+
+    # Clients are thread safe, so one client is shared by all parallel scan workers.
+    response = dynamodb_client.scan(**scan_kwargs)
+    return response.get('Items', []), response.get('LastEvaluatedKey')
+
+
+def scan_all(segment=None, total_segments=None, scan_filter=None, fields=None):
+    """Follows `LastEvaluatedKey` until the whole table (or segment) has been read."""
+    items = []
+    start_key = None
+    while True:
+        page, start_key = scan_page(
+            exclusive_start_key=start_key,
+            segment=segment,
+            total_segments=total_segments,
+            scan_filter=scan_filter,
+            fields=fields
+        )
+        items.extend(page)
+        if not start_key:
+            return items
+
+
+def get_tasks_page(limit=DEFAULT_PAGE_LIMIT, cursor=None, fields=None):
+    """
+    Retrieves one page of tasks from the DynamoDB table.
+
+    Args:
+        limit (int): The maximum number of tasks to return.
+        cursor (str): An opaque cursor returned by a previous call, or None for the first page.
+        fields (tuple): The attributes to read, or None for whole items.
+
+    Returns:
+        dict: A page object containing:
+            - 'items' (list): The task items on this page.
+            - 'next_cursor' (str or None): The cursor for the next page, None on the last page.
+
+    Notes:
+        - `scan` stops at `limit` items or 1 MB, whichever comes first, and may return a
+          `LastEvaluatedKey` with fewer than `limit` items. The page is topped up with
+          further calls so clients always receive `limit` items unless the table is exhausted.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    start_key = decode_cursor(cursor)
+    items = []
+
+    while len(items) < limit:
+        page, start_key = scan_page(limit=limit - len(items), exclusive_start_key=start_key, fields=fields)
+        items.extend(page)
+        if not start_key:
+            break
+
+    return {
+        'items': items,
+        'next_cursor': encode_cursor(start_key)
+    }
+
+
+def export_all_tasks(total_segments=DEFAULT_EXPORT_SEGMENTS, fields=None):
+    """
+    Reads the whole table with a parallel scan.
+
+    Each of the `total_segments` workers scans its own `Segment` to completion in a
+    thread pool and the results are merged in segment order.
+
+    Args:
+        total_segments (int): The number of parallel scan segments.
+        fields (tuple): The attributes to read, or None for whole items.
+
+    Returns:
+        list: Every task item in the table.
+    """
+    with ThreadPoolExecutor(max_workers=total_segments) as executor:
+        futures = [
+            executor.submit(scan_all, segment, total_segments, fields=fields)
+            for segment in range(total_segments)
+        ]
+        items = []
+        for future in futures:
+            items.extend(future.result())
+    return items
+
+
+def get_all_tasks(fields=None):
     """
     Retrieves all tasks from the DynamoDB table.
 
-    This function performs a full table scan on the DynamoDB table to fetch all tasks.
+    This function scans the DynamoDB table page by page, following `LastEvaluatedKey`,
+    so no tasks are lost once the table grows past the 1 MB scan page size.
     It returns a list of all items in the table or an error response in case of failure.
 
+    Args:
+        fields (tuple): The attributes to read, or None for whole items.
+
     Returns:
-        list: A list of task items if the operation is successful.
+        list: A list of task items, in the DynamoDB wire format, if the operation is successful.
         dict: An error response object containing:
             - 'statusCode' (int): HTTP status code (500 for errors).
             - 'body' (str): A JSON string with an error message.
@@ -23,8 +174,7 @@ def get_all_tasks():
     """
 
     try:
-        response = table.scan()
-        return response['Items']
+        return scan_all(fields=fields)
     except Exception as e:
         return {
             'statusCode': 500,
@@ -32,25 +182,98 @@ def get_all_tasks():
         }
 
 
+def find_tasks(assignee=None, status=None, due_from=None, due_to=None, fields=None):
+    """
+    Lists the tasks matching the given filters, choosing the cheapest access path.
+
+    Args:
+        assignee (str): Only return tasks assigned to this email address.
+        status (str): Only return tasks with this status.
+        due_from (str): Only return tasks due on or after this 'YYYY-MM-DD' date.
+        due_to (str): Only return tasks due on or before this 'YYYY-MM-DD' date.
+        fields (tuple): The attributes to read, or None for whole items.
+
+    Returns:
+        list: The matching tasks, in the DynamoDB wire format.
+
+    Notes:
+        - With an `assignee`, a single `Query` on the `TaskAssignments` table is used and
+          task summaries ('id', 'title', 'status', 'start_date', 'due_date') are returned,
+          narrowed down to `fields`. Other attributes are not available on this path.
+        - With only a `status`, a single `Query` on the Tasks `status-due_date-index` is used.
+        - A due date range on its own has no index to use and falls back to a filtered scan.
+    """
+    if assignee:
+        return [
+            task_fields.project_item(summary, fields)
+            for summary in task_indexes.query_assignee_tasks(assignee, status, due_from, due_to)
+        ]
+    if status:
+        return task_indexes.query_tasks_by_status(status, due_from, due_to, fields=fields)
+    return scan_all(fields=fields, scan_filter={
+        'FilterExpression': "#dueDate BETWEEN :from AND :to",
+        'ExpressionAttributeNames': {'#dueDate': 'due_date'},
+        'ExpressionAttributeValues': {
+            ':from': {'S': due_from or task_indexes.MIN_DATE},
+            ':to': {'S': due_to or task_indexes.MAX_DATE}
+        }
+    })
+
+
+def parse_bounded_int(value, default, maximum):
+    """Parses a positive integer query parameter, clamped to `maximum`."""
+    if value in (None, ''):
+        return default
+    number = int(value)
+    if number < 1:
+        raise ValueError("must be a positive integer")
+    return min(number, maximum)
+
+
+@instrumentation.instrument_handler
 def lambda_handler(event, context):
+    response_headers = {
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Allow-Methods": "OPTIONS,GET,POST",
+        "Access-Control-Allow-Headers": "Content-Type,Authorization,If-None-Match",
+    }
+
     try:
-        tasks = get_all_tasks()
-        
+        params = event.get('queryStringParameters') or {}
+
+        try:
+            # Lists return the summary view unless other fields (or `fields=all`) are asked for.
+            fields = task_fields.parse_fields(params.get('fields'), 'summary')
+            if any(params.get(name) for name in FILTER_PARAMS):
+                tasks = find_tasks(fields=fields, **{name: params.get(name) for name in FILTER_PARAMS})
+            elif params.get('export') == 'full':
+                segments = parse_bounded_int(params.get('segments'), DEFAULT_EXPORT_SEGMENTS, MAX_EXPORT_SEGMENTS)
+                tasks = export_all_tasks(segments, fields)
+            elif 'limit' in params or 'cursor' in params:
+                limit = parse_bounded_int(params.get('limit'), DEFAULT_PAGE_LIMIT, MAX_PAGE_LIMIT)
+                tasks = get_tasks_page(limit, params.get('cursor'), fields)
+            else:
+                tasks = get_all_tasks(fields)
+        except ValueError as e:
+            return {
+                'statusCode': 400,
+                "headers": response_headers,
+                'body': json.dumps(f"Invalid query parameter: {str(e)}")
+            }
+
         if isinstance(tasks, dict) and 'statusCode' in tasks:
             return tasks
         print('Successfully fetched all tasks')
 
-        response_headers = {
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "OPTIONS,GET,POST",
-            "Access-Control-Allow-Headers": "Content-Type,Authorization",
-        }
+        if isinstance(tasks, dict):
+            body = (
+                '{"items":' + dynamodb_json.items_to_json(tasks['items'])
+                + ',"next_cursor":' + json.dumps(tasks['next_cursor']) + '}'
+            )
+        else:
+            body = dynamodb_json.items_to_json(tasks)
 
-        return {
-            'statusCode': 200,
-            "headers": response_headers,
-            'body': json.dumps(tasks)
-        }
+        return http_caching.json_body_response(event, body, response_headers)
     except Exception as e:
         return {
             'statusCode': 500,
@@ -0,0 +1,105 @@
+import json
+
+import aws_clients
+import dynamodb_json
+import instrumentation
+import task_attachments
+
+table = aws_clients.lazy_table('Tasks')
+
+
+def get_attachment_urls(task_id, key=None):
+    """
+    Presigns download URLs for a task's attachments.
+
+    Args:
+        task_id (str): The task.
+        key (str): One attachment's object key, or None for all of them.
+
+    Returns:
+        dict: A response object containing:
+            - 'statusCode' (int): 200 on success, 404 if the task or the attachment does
+              not exist, 500 on errors.
+            - 'body' (str): A JSON object with `expires_in` and `files`, the metadata of
+              each attachment plus its presigned `url`.
+
+    Notes:
+        - The task is read with a `GetItem` projecting only `files`, so only keys that
+          were attached to the task are ever presigned.
+        - The URLs are plain presigned `GET`s: clients can send a `Range` header to
+          download part of a file, or several ranges in parallel.
+    """
+    response_headers = {
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Allow-Methods": "OPTIONS,GET",
+        "Access-Control-Allow-Headers": "Content-Type,Authorization",
+    }
+
+    try:
+        task = table.get_item(
+            Key={'id': task_id},
+            ProjectionExpression='#id, #files',
+            ExpressionAttributeNames={'#id': 'id', '#files': 'files'}
+        ).get('Item')
+        if task is None:
+            return {
+                'statusCode': 404,
+                "headers": response_headers,
+                'body': json.dumps(f"Task with id {task_id} not found")
+            }
+
+        if key is None:
+            files = task_attachments.task_files(task)
+        else:
+            record = task_attachments.find_file(task, key)
+            if record is None:
+                return {
+                    'statusCode': 404,
+                    "headers": response_headers,
+                    'body': json.dumps(f"Attachment {key} not found on task {task_id}")
+                }
+            files = [record]
+
+        result = {
+            'expires_in': task_attachments.DOWNLOAD_URL_SECONDS,
+            'files': [{**record, 'url': task_attachments.presign_download(record)} for record in files]
+        }
+        return {
+            'statusCode': 200,
+            "headers": response_headers,
+            'body': json.dumps(result, default=dynamodb_json.json_default)
+        }
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            "headers": response_headers,
+            'body': json.dumps(f"Error presigning downloads: {str(e)}")
+        }
+
+
+@instrumentation.instrument_handler
+def lambda_handler(event, context):
+    response_headers = {
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Allow-Methods": "OPTIONS,GET",
+        "Access-Control-Allow-Headers": "Content-Type,Authorization",
+    }
+
+    try:
+        params = event.get('queryStringParameters') or {}
+        task_id = params.get('id')
+        if not task_id:
+            return {
+                'statusCode': 400,
+                "headers": response_headers,
+                'body': json.dumps("Missing 'id' query parameter")
+            }
+
+        return get_attachment_urls(task_id, params.get('key'))
+
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            "headers": response_headers,
+            'body': json.dumps(f"Error processing request: {str(e)}")
+        }
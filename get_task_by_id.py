@@ -1,17 +1,85 @@
-import boto3
 import json
 
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table('Tasks')
+import aws_clients
+import dynamodb_batch
+import dynamodb_json
+import http_caching
+import instrumentation
+import task_cache
+import task_fields
 
-def get_task_by_id(task_id):
+TABLE_NAME = 'Tasks'
+
+# Most IDs one `?ids=` request may ask for.
+MAX_BATCH_IDS = 500
+
+# The item is read in the DynamoDB wire format and written to the response body by
+# `dynamodb_json` without a deserialization pass.
+dynamodb_client = aws_clients.lazy_client('dynamodb')
+
+
+def read_task(task_id):
+    """
+    Reads a whole task item through this container's `task_cache`.
+
+    A cached item is served as is within the revalidation window. After it, only the
+    task's `version` and `created_at` are read (`ProjectionExpression`) and the cached
+    item is served if neither has changed; otherwise the task is read again in full.
+    `created_at` catches a task that was deleted and created again under the same ID,
+    which starts over at the cached `version`.
+
+    Args:
+        task_id (str): The unique identifier of the task.
+
+    Returns:
+        tuple: The wire-format item (None if the task does not exist) and how it was
+        served: 'hit', 'revalidated', 'stale' or 'miss'.
+
+    Notes:
+        - A version check is billed like a full `GetItem` (DynamoDB charges reads by item
+          size, not by the attributes returned); it saves transfer and parsing, not RCUs.
+        - Whole items are cached and `fields` is applied to them, since a projected read
+          costs as much as a whole one.
+    """
+    cache = task_cache.tasks
+    entry = cache.lookup(task_id)
+    outcome = 'miss'
+    if entry is not None:
+        if not cache.needs_check(entry):
+            return entry.item, 'hit'
+        response = dynamodb_client.get_item(
+            TableName=TABLE_NAME,
+            Key={'id': {'S': task_id}},
+            ProjectionExpression='#version, #createdAt',
+            ExpressionAttributeNames={'#version': 'version', '#createdAt': 'created_at'}
+        )
+        current = response.get('Item')
+        if current is None:
+            cache.invalidate(task_id, stale=True)
+            return None, 'stale'
+        if entry.matches(current):
+            cache.confirm(entry)
+            return entry.item, 'revalidated'
+        cache.invalidate(task_id, stale=True)
+        outcome = 'stale'
+
+    response = dynamodb_client.get_item(TableName=TABLE_NAME, Key={'id': {'S': task_id}})
+    item = response.get('Item')
+    if item is not None:
+        cache.put(task_id, item)
+    return item, outcome
+
+
+def get_task_by_id(task_id, fields=None):
     try:
-        # Query the table using the task_id
-        response = table.get_item(Key={'id': task_id})
-        
+        # Read the whole task through the cache and keep only `fields` if given
+        task, outcome = read_task(task_id)
+        instrumentation.put_metric('TaskCacheHit', int(outcome in ('hit', 'revalidated')))
+        instrumentation.put_metric('TaskCacheSize', len(task_cache.tasks.entries))
+
         # Check if the task exists
-        if 'Item' in response:
-            return response['Item']
+        if task is not None:
+            return task_fields.project_item(task, fields)
         else:
             return {
                 'statusCode': 404,
@@ -23,31 +91,129 @@ def get_task_by_id(task_id):
             'body': json.dumps(f"Error retrieving task: {str(e)}")
         }
 
+def read_tasks(task_ids):
+    """
+    Reads many whole task items, serving fresh ones from `task_cache`.
+
+    Tasks not in the cache, or due for a version check, are read with `BatchGetItem`
+    (chunks of 100 keys, sent concurrently, unprocessed keys retried with backoff) and
+    cached.
+
+    Returns:
+        tuple: `(items, unprocessed_ids)`, with `items` keyed by task ID. IDs of tasks
+        that do not exist appear in neither.
+    """
+    cache = task_cache.tasks
+    items = {}
+    to_read = []
+    for task_id in task_ids:
+        entry = cache.lookup(task_id, fresh_only=True)
+        if entry is not None:
+            items[task_id] = entry.item
+        else:
+            to_read.append(task_id)
+
+    read, unprocessed = dynamodb_batch.batch_get(
+        TABLE_NAME,
+        [{'id': {'S': task_id}} for task_id in to_read],
+        client=dynamodb_client
+    )
+    for item in read:
+        task_id = item['id']['S']
+        cache.put(task_id, item)
+        items[task_id] = item
+    return items, [key['id']['S'] for key in unprocessed]
+
+
+def get_tasks_by_ids(task_ids, fields=None):
+    """
+    Retrieves many tasks in one request.
+
+    Args:
+        task_ids (list): The IDs of the tasks, without duplicates.
+        fields (tuple): The attributes to return, or None for whole items.
+
+    Returns:
+        dict: A response object whose body holds the found `tasks` (in the order they
+        were asked for), the `missing` IDs and the IDs that could not be read because
+        the table stayed throttled (`failed`).
+    """
+    try:
+        items, unprocessed = read_tasks(task_ids)
+        failed = set(unprocessed)
+        tasks = [task_fields.project_item(items[task_id], fields) for task_id in task_ids if task_id in items]
+        missing = [task_id for task_id in task_ids if task_id not in items and task_id not in failed]
+        body = (
+            '{"failed":' + json.dumps([task_id for task_id in task_ids if task_id in failed])
+            + ',"missing":' + json.dumps(missing)
+            + ',"tasks":' + dynamodb_json.items_to_json(tasks) + '}'
+        )
+        return {
+            'statusCode': 200,
+            'body': body
+        }
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'body': json.dumps(f"Error retrieving tasks: {str(e)}")
+        }
+
+
+def parse_task_ids(params):
+    """Reads the IDs of a batch fetch from `?ids=a,b,c`, dropping duplicates."""
+    if not params.get('ids'):
+        return None
+    return list(dict.fromkeys(task_id.strip() for task_id in params['ids'].split(',') if task_id.strip()))
+
+
+@instrumentation.instrument_handler
 def lambda_handler(event, context):
+    response_headers = {
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Allow-Methods": "OPTIONS,GET,POST",
+        "Access-Control-Allow-Headers": "Content-Type,Authorization,If-None-Match",
+    }
+
     try:
         # Retrieve task_id from the event path parameters
-        task_id = event.get('queryStringParameters', {}).get('id')
-        
+        params = event.get('queryStringParameters') or {}
+        task_id = params.get('id')
+
+        # The single task view returns whole items unless `fields` is sent
+        try:
+            fields = task_fields.parse_fields(params.get('fields'), 'all')
+        except ValueError as e:
+            return {
+                'statusCode': 400,
+                "headers": response_headers,
+                'body': json.dumps(f"Invalid query parameter: {str(e)}")
+            }
+
+        # Get many tasks at once with `?ids=a,b,c`
+        task_ids = parse_task_ids(params)
+        if task_ids is not None:
+            if not task_ids or len(task_ids) > MAX_BATCH_IDS:
+                return {
+                    'statusCode': 400,
+                    "headers": response_headers,
+                    'body': json.dumps(f"'ids' must contain between 1 and {MAX_BATCH_IDS} task ids")
+                }
+            response = get_tasks_by_ids(task_ids, fields)
+            if response['statusCode'] != 200:
+                return {**response, "headers": response_headers}
+            print(f'Fetched {len(task_ids)} tasks by id, cache: {task_cache.tasks.stats()}')
+            return http_caching.json_body_response(event, response['body'], response_headers)
+
         # Get task by id
-        task = get_task_by_id(task_id)
+        task = get_task_by_id(task_id, fields)
         
         # Check if the response is an error message (in case task not found)
         if isinstance(task, dict) and 'statusCode' in task:
             return task
 
-        print(f'Successfully fetched task with id: {task_id}')
+        print(f'Successfully fetched task with id: {task_id}, cache: {task_cache.tasks.stats()}')
 
-        response_headers = {
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "OPTIONS,GET,POST",
-            "Access-Control-Allow-Headers": "Content-Type,Authorization",
-        }
-
-        return {
-            'statusCode': 200,
-            "headers": response_headers,
-            'body': json.dumps(task)
-        }
+        return http_caching.json_body_response(event, dynamodb_json.item_to_json(task), response_headers)
     except Exception as e:
         return {
             'statusCode': 500,
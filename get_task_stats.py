@@ -0,0 +1,63 @@
+import json
+from datetime import date, datetime, timezone
+
+import aws_clients
+import dynamodb_json
+import http_caching
+import instrumentation
+import task_stats
+
+dynamodb_client = aws_clients.lazy_client('dynamodb')
+
+
+def get_task_stats(today):
+    """
+    Reads the admin overview from the pre-aggregated `TaskStats` counters.
+
+    This is a single `GetItem`, whatever the number of tasks. The counters are kept
+    current by `update_task_stats` from the `Tasks` stream, so they trail writes by
+    the stream's delay (usually well under a second).
+
+    Args:
+        today (str): Today's date as `YYYY-MM-DD`, used for `overdue` and `due_today`.
+
+    Returns:
+        dict: The overview, see `task_stats.summarize`.
+    """
+    response = dynamodb_client.get_item(
+        TableName=task_stats.STATS_TABLE,
+        Key={'id': {'S': task_stats.OVERVIEW_ID}}
+    )
+    item = dynamodb_json.deserialize_item(response.get('Item', {}))
+    counters = {name: int(value) for name, value in item.items() if name != 'id'}
+    return task_stats.summarize(counters, today)
+
+
+@instrumentation.instrument_handler
+def lambda_handler(event, context):
+    response_headers = {
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Allow-Methods": "OPTIONS,GET",
+        "Access-Control-Allow-Headers": "Content-Type,Authorization,If-None-Match",
+    }
+
+    try:
+        # The dashboard sends its local date; UTC is used otherwise
+        params = event.get('queryStringParameters') or {}
+        today = params.get('today') or datetime.now(timezone.utc).date().isoformat()
+        try:
+            date.fromisoformat(today)
+        except ValueError:
+            return {
+                'statusCode': 400,
+                "headers": response_headers,
+                'body': json.dumps("Invalid query parameter: 'today' must be a YYYY-MM-DD date")
+            }
+
+        return http_caching.json_response(event, get_task_stats(today), response_headers)
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            "headers": response_headers,
+            'body': json.dumps(f"Error fetching task statistics: {str(e)}")
+        }
@@ -0,0 +1,118 @@
+"""
+Conditional GET and compression for JSON read responses.
+
+The dashboard polls the read endpoints constantly. `json_response` tags every body with
+a content-hash ETag so an unchanged resource costs a bodyless `304 Not Modified`, and
+gzips large bodies for clients that accept it.
+"""
+
+import base64
+import gzip
+import hashlib
+import json
+
+import dynamodb_json
+
+# Bodies smaller than this are not worth the CPU time of compressing them.
+GZIP_MIN_BYTES = 1024
+
+
+def get_header(event, name):
+    """Reads a request header, ignoring case (REST and HTTP APIs differ in header casing)."""
+    headers = event.get('headers') or {}
+    name = name.lower()
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def compute_etag(body):
+    """Returns a strong ETag for a serialized body."""
+    return '"' + hashlib.sha256(body.encode('utf-8')).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match, etag):
+    """Checks an `If-None-Match` header value against an ETag."""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    # Weak comparison, as RFC 9110 requires for If-None-Match.
+    return '*' in candidates or etag in [tag[2:] if tag.startswith('W/') else tag for tag in candidates]
+
+
+def accepts_gzip(event):
+    """Checks whether the client listed gzip in `Accept-Encoding` (and did not refuse it with q=0)."""
+    accept_encoding = get_header(event, 'Accept-Encoding') or ''
+    for coding in accept_encoding.split(','):
+        name, *params = [part.strip() for part in coding.split(';')]
+        if name.lower() not in ('gzip', '*'):
+            continue
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    return float(value) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+
+def json_response(event, payload, headers, status_code=200):
+    """
+    Builds an API Gateway proxy response for a JSON payload with ETag and gzip support.
+
+    Args:
+        event (dict): The API Gateway event, used for `If-None-Match` and `Accept-Encoding`.
+        payload: The JSON-serializable response data.
+        headers (dict): Base response headers (e.g. CORS headers).
+        status_code (int): The status code to use when the body is sent.
+
+    Returns:
+        dict: A proxy response, see `json_body_response`.
+    """
+    body = json.dumps(payload, sort_keys=True, default=dynamodb_json.json_default)
+    return json_body_response(event, body, headers, status_code)
+
+
+def json_body_response(event, body, headers, status_code=200):
+    """
+    Builds an API Gateway proxy response for an already serialized JSON body.
+
+    Returns:
+        dict: A proxy response. It is a `304` with no body when the client's cached copy
+        is current, and a base64-encoded gzip body when the client accepts gzip and the
+        body is at least `GZIP_MIN_BYTES` long.
+    """
+    etag = compute_etag(body)
+
+    response_headers = {
+        **headers,
+        "ETag": etag,
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+        "Access-Control-Expose-Headers": "ETag",
+    }
+
+    if etag_matches(get_header(event, 'If-None-Match'), etag):
+        return {
+            'statusCode': 304,
+            "headers": response_headers,
+            'body': ''
+        }
+
+    if len(body) >= GZIP_MIN_BYTES and accepts_gzip(event):
+        response_headers["Content-Encoding"] = "gzip"
+        return {
+            'statusCode': status_code,
+            "headers": response_headers,
+            'body': base64.b64encode(gzip.compress(body.encode('utf-8'), mtime=0)).decode('ascii'),
+            'isBase64Encoded': True
+        }
+
+    return {
+        'statusCode': status_code,
+        "headers": response_headers,
+        'body': body
+    }
@@ -0,0 +1,203 @@
+"""
+`Idempotency-Key` support for the handlers that change data.
+
+Field clients retry POSTs on flaky networks. A retry of `create_tasks` would create the
+task again under a new ID, and so notify its assignees again. With an
+`Idempotency-Key` header, the first request runs and its response is stored; a retry
+with the same key gets that response back after one `GetItem` and runs nothing.
+
+    IdempotencyKeys   partition key `id` (`<handler>#<caller sub>#<key>`), TTL attribute
+                      `expires_at`; attributes `status` (`in_progress`/`completed`),
+                      `request_hash`, `response` (JSON) and `locked_until`
+
+A request without the header runs as before. A key is scoped to the handler and, behind
+`jwt_authorizer`, to the caller, so two users cannot collide on or replay each other's
+keys. Reusing a key with a different request is a 422, and a retry that arrives while the
+first request is still running is a 409. Responses with a 5xx status are not stored, so
+the client's retry runs the request again.
+
+Usage:
+
+    @instrumentation.instrument_handler
+    @idempotency.idempotent('create_tasks')
+    def lambda_handler(event, context):
+        ...
+"""
+
+import functools
+import hashlib
+import json
+import time
+from botocore.exceptions import ClientError
+
+import aws_clients
+import dynamodb_json
+import jwt_verifier
+
+IDEMPOTENCY_TABLE = 'IdempotencyKeys'
+HEADER = 'idempotency-key'
+MAX_KEY_LENGTH = 255
+
+# How long a key can be replayed, and how long a request holds its key while it runs
+# when the remaining Lambda time is not known.
+TTL_SECONDS = 24 * 3600
+IN_PROGRESS_SECONDS = 60
+
+# Responses larger than this are not stored; DynamoDB items are capped at 400 KB.
+MAX_STORED_RESPONSE_BYTES = 350 * 1024
+
+keys_table = aws_clients.lazy_table(IDEMPOTENCY_TABLE)
+
+
+def idempotency_key(event):
+    """The `Idempotency-Key` header of a request (any case), or None."""
+    headers = event.get('headers') or {}
+    return next((value for name, value in headers.items() if name.lower() == HEADER and value), None)
+
+
+def request_hash(event):
+    """A hash of what the request asks for, to tell a retry from a reuse of its key."""
+    request = {
+        'body': event.get('body'),
+        'query': event.get('queryStringParameters'),
+        'path': event.get('pathParameters')
+    }
+    return hashlib.sha256(json.dumps(request, sort_keys=True).encode()).hexdigest()
+
+
+def record_id(name, event, key):
+    identity = jwt_verifier.caller(event)
+    return f"{name}#{identity['sub'] if identity else ''}#{key}"
+
+
+def error_response(status_code, message, headers):
+    return {
+        'statusCode': status_code,
+        "headers": headers,
+        'body': json.dumps(message)
+    }
+
+
+def replay(record, fingerprint, headers):
+    """The response for a request whose key already has a record."""
+    if record['request_hash'] != fingerprint:
+        return error_response(422, "This Idempotency-Key was already used for a different request", headers)
+    if record['status'] != 'completed':
+        return error_response(409, "A request with this Idempotency-Key is still in progress; retry later", headers)
+    response = json.loads(record['response'])
+    response['headers'] = {**(response.get('headers') or {}), 'Idempotent-Replayed': 'true'}
+    return response
+
+
+def lock(record_key, fingerprint, context, now):
+    """
+    Claims a key for a request that is about to run.
+
+    The claim is a conditional put that only succeeds if the key is new, or if an earlier
+    request holding it has run out of time without finishing.
+
+    Returns:
+        dict: None if the key was claimed, otherwise the record that holds it.
+    """
+    remaining_ms = context.get_remaining_time_in_millis() if context and hasattr(context, 'get_remaining_time_in_millis') else None
+    hold_seconds = remaining_ms / 1000 + 1 if remaining_ms else IN_PROGRESS_SECONDS
+    try:
+        keys_table.put_item(
+            Item={
+                'id': record_key,
+                'status': 'in_progress',
+                'request_hash': fingerprint,
+                'locked_until': int(now + hold_seconds),
+                'expires_at': int(now + TTL_SECONDS)
+            },
+            ConditionExpression="attribute_not_exists(#id) OR (#status = :inProgress AND #lockedUntil < :now)",
+            ExpressionAttributeNames={'#id': 'id', '#status': 'status', '#lockedUntil': 'locked_until'},
+            ExpressionAttributeValues={':inProgress': 'in_progress', ':now': int(now)},
+            ReturnValuesOnConditionCheckFailure='ALL_OLD'
+        )
+        return None
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        holder = e.response.get('Item')
+        return dynamodb_json.deserialize_item(holder) if holder else {'status': 'in_progress', 'request_hash': fingerprint}
+
+
+def store(record_key, fingerprint, response, now):
+    """Stores the response of a finished request, or frees the key if it is not kept."""
+    serialized = json.dumps(response)
+    status_code = response.get('statusCode') if isinstance(response, dict) else None
+    if not isinstance(status_code, int) or status_code >= 500 or len(serialized) > MAX_STORED_RESPONSE_BYTES:
+        release(record_key)
+        return
+    keys_table.put_item(Item={
+        'id': record_key,
+        'status': 'completed',
+        'request_hash': fingerprint,
+        'response': serialized,
+        'expires_at': int(now + TTL_SECONDS)
+    })
+
+
+def release(record_key):
+    keys_table.delete_item(Key={'id': record_key})
+
+
+def idempotent(name, response_headers=None):
+    """
+    Makes a handler honour the `Idempotency-Key` header.
+
+    Args:
+        name (str): The handler's name; keys are scoped to it.
+        response_headers (dict): Headers (CORS) for the 409/422 responses.
+
+    Notes:
+        - A new key costs a consistent `GetItem`, a conditional `PutItem` before the
+          handler runs and a `PutItem` after it. A retry costs the `GetItem` only.
+        - If storing the response fails, the key is left locked until its
+          `locked_until` passes; the response itself is still returned.
+    """
+    headers = response_headers or {
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Allow-Headers": "Content-Type,Authorization,Idempotency-Key",
+    }
+
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            key = idempotency_key(event or {})
+            if key is None:
+                return handler(event, context)
+            if len(key) > MAX_KEY_LENGTH:
+                return error_response(400, f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters", headers)
+
+            record_key = record_id(name, event, key)
+            fingerprint = request_hash(event)
+            now = time.time()
+
+            try:
+                record = keys_table.get_item(Key={'id': record_key}, ConsistentRead=True).get('Item')
+                if record is not None and not (record['status'] == 'in_progress' and record.get('locked_until', 0) < now):
+                    print(f"Idempotency-Key {key} is {record['status']}")
+                    return replay(record, fingerprint, headers)
+
+                holder = lock(record_key, fingerprint, context, now)
+                if holder is not None:
+                    return replay(holder, fingerprint, headers)
+            except Exception as e:
+                return error_response(500, f"Error checking Idempotency-Key: {str(e)}", headers)
+
+            try:
+                response = handler(event, context)
+            except Exception:
+                release(record_key)
+                raise
+            try:
+                store(record_key, fingerprint, response, time.time())
+            except Exception as e:
+                print(f"Error storing the response for Idempotency-Key {key}: {e}")
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,246 @@
+"""
+Per-invocation timing of handlers and of every AWS call they make, emitted as
+CloudWatch Embedded Metric Format (EMF).
+
+`aws_clients` registers the botocore hooks below on the shared session, so every client
+and resource the handlers use is timed without any change to the calling code. Each
+handler is wrapped with `instrument_handler`:
+
+    @instrumentation.instrument_handler
+    def lambda_handler(event, context):
+        ...
+
+At the end of an invocation that is emitted (see sampling below), one JSON line per
+record is printed to stdout and CloudWatch Logs turns it into metrics:
+
+    Dimensions [Function]             Duration, AwsCalls, AwsDuration, ColdStart
+    Dimensions [Function, Operation]  CallDuration (one value per call), Calls,
+                                      Retries, Errors, ConsumedCapacity
+
+`Operation` is e.g. `dynamodb.Query` or `sns.PublishBatch`. The invocation record also
+carries the individual calls as a `calls` property, for CloudWatch Logs Insights.
+Handlers can add their own metrics to the invocation record with `put_metric`.
+
+Sampling is controlled with environment variables:
+    METRICS_SAMPLE_RATE  Fraction of invocations to emit (default 1). Sampled invocations
+                         also ask DynamoDB for `ReturnConsumedCapacity=TOTAL`.
+    METRICS_SLOW_MS      Invocations at least this slow are always emitted (default 1000).
+    METRICS_NAMESPACE    CloudWatch namespace (default 'TaskManagement').
+Invocations that raise or return a 5xx are always emitted as well.
+"""
+
+import functools
+import json
+import os
+import random
+import threading
+import time
+
+NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'TaskManagement')
+SAMPLE_RATE = float(os.environ.get('METRICS_SAMPLE_RATE', '1'))
+SLOW_MS = float(os.environ.get('METRICS_SLOW_MS', '1000'))
+
+# EMF accepts at most 100 values per metric in one record.
+MAX_VALUES_PER_RECORD = 100
+MAX_CALL_DETAILS = 100
+
+_lock = threading.Lock()
+_current = None
+_cold_start = True
+
+
+class Invocation:
+    """The AWS calls recorded during one handler invocation."""
+
+    def __init__(self, function_name, request_id, sampled):
+        self.function_name = function_name
+        self.request_id = request_id
+        self.sampled = sampled
+        self.started = time.perf_counter()
+        self.calls = []
+        self.metrics = {}
+
+
+def _record_start(model, context, **kwargs):
+    """`before-call` hook: remembers when the call started."""
+    context['instrumentation'] = (f"{model.service_model.service_name}.{model.name}", time.perf_counter())
+
+
+def _record_call(context, parsed=None, exception=None, **kwargs):
+    """`after-call`/`after-call-error` hook: records one finished AWS call."""
+    invocation = _current
+    started = context.get('instrumentation')
+    if invocation is None or started is None:
+        return
+    operation, started_at = started
+    call = {
+        'operation': operation,
+        'duration_ms': round((time.perf_counter() - started_at) * 1000, 3),
+        'retries': 0
+    }
+    if parsed is not None:
+        call['retries'] = parsed.get('ResponseMetadata', {}).get('RetryAttempts', 0)
+        if 'Error' in parsed:
+            call['error'] = parsed['Error'].get('Code')
+        capacity = parsed.get('ConsumedCapacity')
+        if capacity:
+            entries = capacity if isinstance(capacity, list) else [capacity]
+            call['capacity'] = sum(entry.get('CapacityUnits', 0) for entry in entries)
+    if exception is not None:
+        call['error'] = type(exception).__name__
+    with _lock:
+        invocation.calls.append(call)
+
+
+def _request_consumed_capacity(params, model, **kwargs):
+    """`before-parameter-build.dynamodb` hook: asks for consumed capacity on sampled invocations."""
+    invocation = _current
+    if invocation is not None and invocation.sampled and 'ReturnConsumedCapacity' in model.input_shape.members:
+        params.setdefault('ReturnConsumedCapacity', 'TOTAL')
+
+
+def put_metric(name, value, unit='Count'):
+    """Adds a metric to the record of the current invocation. Ignored outside a handler."""
+    invocation = _current
+    if invocation is not None:
+        invocation.metrics[name] = (value, unit)
+
+
+def register_hooks(session):
+    """Registers the timing hooks on a boto3 session. Clients created afterwards are timed."""
+    events = session.events
+    events.register('before-call', _record_start, unique_id='instrumentation-start')
+    events.register('after-call', _record_call, unique_id='instrumentation-call')
+    events.register('after-call-error', _record_call, unique_id='instrumentation-call-error')
+    events.register('before-parameter-build.dynamodb', _request_consumed_capacity, unique_id='instrumentation-capacity')
+
+
+def operation_records(invocation, timestamp):
+    """Builds the per-operation EMF records of an invocation."""
+    by_operation = {}
+    for call in invocation.calls:
+        by_operation.setdefault(call['operation'], []).append(call)
+
+    records = []
+    for operation, calls in sorted(by_operation.items()):
+        for start in range(0, len(calls), MAX_VALUES_PER_RECORD):
+            chunk = calls[start:start + MAX_VALUES_PER_RECORD]
+            metrics = [
+                {'Name': 'CallDuration', 'Unit': 'Milliseconds'},
+                {'Name': 'Calls', 'Unit': 'Count'},
+                {'Name': 'Retries', 'Unit': 'Count'},
+                {'Name': 'Errors', 'Unit': 'Count'}
+            ]
+            record = {
+                'Function': invocation.function_name,
+                'Operation': operation,
+                'CallDuration': [call['duration_ms'] for call in chunk],
+                'Calls': len(chunk),
+                'Retries': sum(call['retries'] for call in chunk),
+                'Errors': sum(1 for call in chunk if 'error' in call)
+            }
+            capacity = [call['capacity'] for call in chunk if 'capacity' in call]
+            if capacity:
+                metrics.append({'Name': 'ConsumedCapacity', 'Unit': 'Count'})
+                record['ConsumedCapacity'] = sum(capacity)
+            record['_aws'] = {
+                'Timestamp': timestamp,
+                'CloudWatchMetrics': [{
+                    'Namespace': NAMESPACE,
+                    'Dimensions': [['Function', 'Operation']],
+                    'Metrics': metrics
+                }]
+            }
+            records.append(record)
+    return records
+
+
+def invocation_record(invocation, duration_ms, cold_start, timestamp, reason):
+    """Builds the EMF record for the invocation as a whole."""
+    record = {
+        '_aws': {
+            'Timestamp': timestamp,
+            'CloudWatchMetrics': [{
+                'Namespace': NAMESPACE,
+                'Dimensions': [['Function']],
+                'Metrics': [
+                    {'Name': 'Duration', 'Unit': 'Milliseconds'},
+                    {'Name': 'AwsCalls', 'Unit': 'Count'},
+                    {'Name': 'AwsDuration', 'Unit': 'Milliseconds'},
+                    {'Name': 'ColdStart', 'Unit': 'Count'}
+                ]
+            }]
+        },
+        'Function': invocation.function_name,
+        'Duration': round(duration_ms, 3),
+        'AwsCalls': len(invocation.calls),
+        # Summed over calls, so it can exceed Duration when calls run concurrently.
+        'AwsDuration': round(sum(call['duration_ms'] for call in invocation.calls), 3),
+        'ColdStart': int(cold_start),
+        'requestId': invocation.request_id,
+        'emitted': reason,
+        'calls': invocation.calls[:MAX_CALL_DETAILS]
+    }
+    metrics = record['_aws']['CloudWatchMetrics'][0]['Metrics']
+    for name, (value, unit) in invocation.metrics.items():
+        metrics.append({'Name': name, 'Unit': unit})
+        record[name] = value
+    return record
+
+
+def emit_reason(invocation, duration_ms, failed):
+    """Why an invocation is emitted, or None if it is not."""
+    if failed:
+        return 'error'
+    if duration_ms >= SLOW_MS:
+        return 'slow'
+    if invocation.sampled:
+        return 'sampled'
+    return None
+
+
+def instrument_handler(handler):
+    """
+    Wraps a Lambda handler so its duration and AWS calls are emitted as EMF.
+
+    Notes:
+        - Lambda runs one invocation at a time per container, so the invocation being
+          recorded is module state; calls made from the handler's worker threads are
+          recorded too.
+        - A failed emit never fails the invocation.
+    """
+    function_name = os.environ.get('AWS_LAMBDA_FUNCTION_NAME') or handler.__module__
+
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        global _current, _cold_start
+        invocation = Invocation(
+            function_name,
+            getattr(context, 'aws_request_id', None),
+            random.random() < SAMPLE_RATE
+        )
+        cold_start, _cold_start = _cold_start, False
+        _current = invocation
+        failed = False
+        try:
+            result = handler(event, context)
+            if isinstance(result, dict) and isinstance(result.get('statusCode'), int):
+                failed = result['statusCode'] >= 500
+            return result
+        except Exception:
+            failed = True
+            raise
+        finally:
+            _current = None
+            try:
+                duration_ms = (time.perf_counter() - invocation.started) * 1000
+                reason = emit_reason(invocation, duration_ms, failed)
+                if reason:
+                    timestamp = int(time.time() * 1000)
+                    records = [invocation_record(invocation, duration_ms, cold_start, timestamp, reason)]
+                    records.extend(operation_records(invocation, timestamp))
+                    print("\n".join(json.dumps(record, separators=(',', ':')) for record in records))
+            except Exception as e:
+                print(f"Error emitting metrics: {e}")
+
+    return wrapper
@@ -0,0 +1,154 @@
+"""
+Transparent compression of large task attributes.
+
+Long field reports make `description` (and tasks with many attachments, `files`) the bulk
+of a task item, and DynamoDB charges for the whole item on every `GetItem`, `Scan` and
+`ALL_NEW`/`ALL_OLD` return: one read unit per 4 KB and one write unit per 1 KB. Above
+`MIN_BYTES`, these attributes are stored as zlib-compressed JSON in a Binary value
+instead, which is usually 2-4 times smaller for prose.
+
+    {'description': {'S': '<6 KB of text>'}}  ->  {'description': {'B': b'\\x00zj1<zlib>'}}
+
+Values are only compressed when they get smaller, and are marked with `PREFIX` so they
+cannot be mistaken for other binary data. Decompression is lazy: nothing is inflated
+when an item is read, only when the attribute is written out. `dynamodb_json` does that
+for the read handlers (the stored JSON text is copied into the response body as is) and
+for `json_default`; code that needs the value itself calls `decode_value`. A read that
+does not project `description` never touches it.
+
+Existing items are rewritten by `compress_task_items.py`.
+
+Settings (environment variables):
+    ITEM_COMPRESSION_MIN_BYTES  Smallest JSON encoding that is compressed (default 1024).
+"""
+
+import json
+import math
+import os
+import zlib
+from decimal import Decimal
+
+from boto3.dynamodb.types import Binary
+
+COMPRESSED_ATTRIBUTES = ('description', 'files')
+MIN_BYTES = int(os.environ.get('ITEM_COMPRESSION_MIN_BYTES', '1024'))
+LEVEL = 6
+
+# Marks (and versions) values written by this module. JSON text never starts with a NUL.
+PREFIX = b'\x00zj1'
+
+
+def _number(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def to_json(value):
+    """The JSON text that is compressed: sorted keys and no spaces, as `dynamodb_json` writes."""
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), default=_number)
+
+
+def compress(value, min_bytes=None):
+    """
+    Compresses an attribute value.
+
+    Args:
+        value: A string, or a list/map of JSON-compatible values (numbers may be `Decimal`).
+        min_bytes (int): The threshold; defaults to `MIN_BYTES`.
+
+    Returns:
+        bytes: The marked, compressed JSON encoding of `value`, or None if it is below the
+        threshold or would not get smaller.
+    """
+    text = to_json(value).encode()
+    if len(text) < (MIN_BYTES if min_bytes is None else min_bytes):
+        return None
+    blob = PREFIX + zlib.compress(text, LEVEL)
+    return blob if len(blob) < len(text) else None
+
+
+def encode_value(value):
+    """The value to store for a compressible attribute: compressed bytes or `value` itself."""
+    if value is None or isinstance(value, (bytes, Binary)):
+        return value
+    blob = compress(value)
+    return value if blob is None else blob
+
+
+def encode_item(item):
+    """Returns a copy of a (boto3 resource API) item with its large attributes compressed."""
+    return {name: encode_value(value) if name in COMPRESSED_ATTRIBUTES else value for name, value in item.items()}
+
+
+def is_compressed(value):
+    """True for a value written by `compress` (bytes from the client, `Binary` from the resource API)."""
+    if isinstance(value, Binary):
+        value = value.value
+    return isinstance(value, (bytes, bytearray)) and value[:len(PREFIX)] == PREFIX
+
+
+def json_text(value):
+    """The JSON text of a compressed value."""
+    if isinstance(value, Binary):
+        value = value.value
+    return zlib.decompress(value[len(PREFIX):]).decode()
+
+
+def decode_value(value):
+    """
+    The original value of a compressed attribute, with numbers as `Decimal` like the
+    boto3 resource API returns them. Other values are returned unchanged.
+    """
+    if not is_compressed(value):
+        return value
+    return json.loads(json_text(value), parse_float=Decimal, parse_int=Decimal)
+
+
+# --- Capacity ------------------------------------------------------------------------
+
+def wire_size(item):
+    """
+    The size DynamoDB bills for a wire-format item: attribute names plus values, with
+    numbers at about one byte per two digits and 3 bytes (plus 1 per element) of overhead
+    for lists and maps.
+    """
+    return sum(len(name.encode()) + _value_size(value) for name, value in item.items())
+
+
+def _value_size(attribute_value):
+    (type_code, value), = attribute_value.items()
+    if type_code == 'S':
+        return len(value.encode())
+    if type_code == 'N':
+        return _number_size(value)
+    if type_code == 'B':
+        return len(value)
+    if type_code in ('BOOL', 'NULL'):
+        return 1
+    if type_code == 'SS':
+        return sum(len(element.encode()) for element in value)
+    if type_code == 'NS':
+        return sum(_number_size(element) for element in value)
+    if type_code == 'BS':
+        return sum(len(element) for element in value)
+    if type_code == 'L':
+        return 3 + sum(1 + _value_size(element) for element in value)
+    if type_code == 'M':
+        return 3 + wire_size(value) + len(value)
+    raise TypeError(f"Unsupported DynamoDB type {type_code}")
+
+
+def _number_size(text):
+    digits = len(text.lstrip('-').replace('.', '').strip('0')) or 1
+    return math.ceil(digits / 2) + 1
+
+
+def read_units(size):
+    """Read units of a strongly consistent `GetItem` of an item of `size` bytes (half for eventual)."""
+    return max(1, math.ceil(size / 4096))
+
+
+def write_units(size):
+    """Write units of a `PutItem`/`UpdateItem` of an item of `size` bytes."""
+    return max(1, math.ceil(size / 1024))
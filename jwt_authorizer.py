@@ -0,0 +1,89 @@
+import instrumentation
+import jwt_verifier
+
+
+def bearer_token(event):
+    """
+    The token of a TOKEN authorizer event (`authorizationToken`) or of a REQUEST
+    authorizer event (the `Authorization` header), without a `Bearer ` prefix.
+    """
+    token = event.get('authorizationToken')
+    if token is None:
+        headers = event.get('headers') or {}
+        token = next((value for name, value in headers.items() if name.lower() == 'authorization'), None)
+    if not token:
+        return None
+    if token[:7].lower() == 'bearer ':
+        token = token[7:]
+    return token.strip() or None
+
+
+def api_resource(method_arn):
+    """
+    Widens `arn:aws:execute-api:<region>:<account>:<api>/<stage>/<method>/<path>` to every
+    method and path of the stage, so the policy API Gateway caches for a token is valid
+    for all the routes the user calls next, not only the first one.
+    """
+    arn, _, path = method_arn.partition('/')
+    stage = path.split('/', 1)[0]
+    return f"{arn}/{stage}/*" if stage else method_arn
+
+
+def build_policy(claims, method_arn):
+    """
+    An IAM policy that lets the token's user invoke the API, with the verified identity in
+    its context. Context values must be strings, numbers or booleans, so `groups` is a
+    comma-separated string.
+    """
+    return {
+        'principalId': claims['sub'],
+        'policyDocument': {
+            'Version': '2012-10-17',
+            'Statement': [{
+                'Action': 'execute-api:Invoke',
+                'Effect': 'Allow',
+                'Resource': api_resource(method_arn)
+            }]
+        },
+        'context': {
+            'sub': claims['sub'],
+            'email': claims.get('email', ''),
+            'username': claims.get('cognito:username') or claims.get('username', ''),
+            'groups': ','.join(claims.get('cognito:groups', [])),
+            'token_use': claims.get('token_use', '')
+        }
+    }
+
+
+@instrumentation.instrument_handler
+def lambda_handler(event, context):
+    """
+    This handler is an API Gateway Lambda authorizer (TOKEN or REQUEST type) for the
+    task management API. It verifies the Cognito JWT sent in the `Authorization` header
+    and returns a policy that allows the user to call the API.
+
+    The signature is checked against the user pool's signing keys, which are fetched
+    once per container, and verified tokens are cached until they expire (see
+    `jwt_verifier`), so a warm container verifies a token it has seen with one hash and
+    a dictionary lookup. The policy covers the whole stage, so API Gateway can cache it
+    for the token (authorizer result TTL up to 1 hour, keyed by the `Authorization`
+    header) and skip this function on the next requests.
+
+    Handlers read the verified identity with `jwt_verifier.caller(event)`.
+
+    Raises:
+        Exception: `Unauthorized`, which API Gateway turns into a 401 response, if the
+        token is missing or does not verify.
+    """
+    token = bearer_token(event)
+    if token is None:
+        print("Rejected request without a token")
+        raise Exception('Unauthorized')
+
+    try:
+        claims = jwt_verifier.verify_token(token)
+    except jwt_verifier.InvalidToken as e:
+        print(f"Rejected token: {e}")
+        raise Exception('Unauthorized')
+
+    return build_policy(claims, event['methodArn'])
@@ -0,0 +1,251 @@
+"""
+Verification of Cognito JSON Web Tokens, with the keys and results kept per container.
+
+`decode-jwt.js` only decodes tokens in the browser. `jwt_authorizer` uses this module
+to check them on the server before any handler runs:
+
+    - the signature (RS256) against the user pool's JSON Web Key Set (JWKS)
+    - `iss` (the user pool), `exp`, `token_use` and, if configured, the app client
+
+RS256 is checked with Python's integers and `hashlib` (RSASSA-PKCS1-v1_5 with SHA-256),
+so the functions need no cryptography package or layer.
+
+The JWKS is fetched once per container and again only when a token names a key it does
+not have (Cognito rotated its keys), at most once every `JWKS_REFRESH_SECONDS`. Verified
+tokens are kept in a bounded LRU cache, keyed by the SHA-256 of the token, until they
+expire, so a warm container verifies each token once.
+
+Settings (environment variables):
+    COGNITO_USER_POOL_ID      The user pool (default `eu-west-1_xEP7m4WPV`).
+    COGNITO_APP_CLIENT_IDS    Comma-separated app client IDs to accept (default: any).
+    COGNITO_TOKEN_USES        Token types to accept (default `id`; access tokens carry no
+                              `email`, so handlers that need it look it up by `sub`).
+    JWKS_FILE                 Read the keys from this file instead of the user pool, e.g.
+                              for offline tests.
+    TOKEN_CACHE_MAX_ITEMS     Verified tokens kept per container (default 1024).
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+import urllib.request
+from collections import Counter, OrderedDict
+
+USER_POOL_ID = os.environ.get('COGNITO_USER_POOL_ID', 'eu-west-1_xEP7m4WPV')
+REGION = USER_POOL_ID.split('_', 1)[0]
+ISSUER = f"https://cognito-idp.{REGION}.amazonaws.com/{USER_POOL_ID}"
+JWKS_URL = f"{ISSUER}/.well-known/jwks.json"
+JWKS_FILE = os.environ.get('JWKS_FILE')
+
+APP_CLIENT_IDS = {client for client in os.environ.get('COGNITO_APP_CLIENT_IDS', '').split(',') if client}
+TOKEN_USES = {use for use in os.environ.get('COGNITO_TOKEN_USES', 'id').split(',') if use}
+
+TOKEN_CACHE_MAX_ITEMS = int(os.environ.get('TOKEN_CACHE_MAX_ITEMS', '1024'))
+JWKS_REFRESH_SECONDS = 300
+JWKS_TIMEOUT_SECONDS = 2
+
+# DER prefix of a SHA-256 `DigestInfo` (RFC 8017, section 9.2).
+SHA256_DIGEST_INFO = bytes.fromhex('3031300d060960864801650304020105000420')
+
+
+class InvalidToken(Exception):
+    """The token is malformed, badly signed, expired or not meant for this API."""
+
+
+def b64url_decode(value):
+    value = value.encode() if isinstance(value, str) else value
+    return base64.urlsafe_b64decode(value + b'=' * (-len(value) % 4))
+
+
+def rsa_public_key(jwk):
+    """The `(n, e)` of an RSA JSON Web Key."""
+    return (int.from_bytes(b64url_decode(jwk['n']), 'big'), int.from_bytes(b64url_decode(jwk['e']), 'big'))
+
+
+def verify_rs256(signing_input, signature, public_key):
+    """True if `signature` is a valid RSASSA-PKCS1-v1_5 SHA-256 signature of `signing_input`."""
+    n, e = public_key
+    size = (n.bit_length() + 7) // 8
+    if len(signature) != size:
+        return False
+    encoded = pow(int.from_bytes(signature, 'big'), e, n).to_bytes(size, 'big')
+    digest_info = SHA256_DIGEST_INFO + hashlib.sha256(signing_input).digest()
+    expected = b'\x00\x01' + b'\xff' * (size - len(digest_info) - 3) + b'\x00' + digest_info
+    return hmac.compare_digest(encoded, expected)
+
+
+class Jwks:
+    """
+    The user pool's signing keys, loaded on first use.
+
+    Args:
+        url (str): Where to fetch the JWKS from.
+        path (str): A local JWKS file; used instead of `url` if set.
+        clock (callable): Returns the current time in seconds.
+    """
+
+    def __init__(self, url=JWKS_URL, path=JWKS_FILE, clock=time.monotonic):
+        self.url = url
+        self.path = path
+        self.clock = clock
+        self.keys = None
+        self.loaded_at = None
+        self.lock = threading.Lock()
+
+    def fetch(self):
+        if self.path:
+            with open(self.path) as f:
+                document = json.load(f)
+        else:
+            with urllib.request.urlopen(self.url, timeout=JWKS_TIMEOUT_SECONDS) as response:
+                document = json.load(response)
+        keys = {jwk['kid']: rsa_public_key(jwk) for jwk in document.get('keys', []) if jwk.get('kty') == 'RSA'}
+        print(f"Loaded {len(keys)} signing keys from {self.path or self.url}")
+        return keys
+
+    def key(self, kid):
+        """
+        Returns the public key `kid`, or None if the user pool has no such key.
+
+        An unknown `kid` reloads the keys, at most once every `JWKS_REFRESH_SECONDS`, so
+        tokens signed with a new key are accepted after a rotation while made-up key IDs
+        cannot make every request fetch the JWKS.
+        """
+        if not isinstance(kid, str):
+            return None
+        with self.lock:
+            if self.keys is None:
+                self.keys = self.fetch()
+                self.loaded_at = self.clock()
+            elif kid not in self.keys and self.clock() - self.loaded_at >= JWKS_REFRESH_SECONDS:
+                self.loaded_at = self.clock()
+                try:
+                    self.keys = self.fetch()
+                except Exception as e:
+                    print(f"Error reloading the signing keys, keeping the old ones: {e}")
+            return self.keys.get(kid)
+
+
+class VerifiedTokens:
+    """A bounded LRU cache of verified claims, keyed by token hash, kept until `exp`."""
+
+    def __init__(self, max_items=TOKEN_CACHE_MAX_ITEMS):
+        self.max_items = max_items
+        self.entries = OrderedDict()
+        self.counters = Counter()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def token_hash(token):
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token, now):
+        key = self.token_hash(token)
+        with self.lock:
+            claims = self.entries.get(key)
+            if claims is not None and claims['exp'] <= now:
+                del self.entries[key]
+                claims = None
+            if claims is None:
+                self.counters['misses'] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.counters['hits'] += 1
+            return claims
+
+    def put(self, token, claims):
+        if self.max_items <= 0:
+            return
+        key = self.token_hash(token)
+        with self.lock:
+            self.entries[key] = claims
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_items:
+                self.entries.popitem(last=False)
+                self.counters['evicted'] += 1
+
+    def stats(self):
+        with self.lock:
+            return {'size': len(self.entries), **self.counters}
+
+
+jwks = Jwks()
+verified_tokens = VerifiedTokens()
+
+
+def check_claims(claims, now):
+    """Raises `InvalidToken` unless the claims are current and meant for this API."""
+    if claims.get('iss') != ISSUER:
+        raise InvalidToken("wrong issuer")
+    if not isinstance(claims.get('exp'), (int, float)) or claims['exp'] <= now:
+        raise InvalidToken("token has expired")
+    if claims.get('token_use') not in TOKEN_USES:
+        raise InvalidToken(f"token_use must be one of {sorted(TOKEN_USES)}")
+    client_id = claims.get('aud') if claims.get('token_use') == 'id' else claims.get('client_id')
+    if APP_CLIENT_IDS and client_id not in APP_CLIENT_IDS:
+        raise InvalidToken("token was issued to another app client")
+
+
+def verify_token(token, now=None):
+    """
+    Verifies a Cognito JWT and returns its claims.
+
+    Args:
+        token (str): The token, without a `Bearer ` prefix.
+        now (float): The current Unix time; defaults to `time.time()`.
+
+    Returns:
+        dict: The token's claims.
+
+    Raises:
+        InvalidToken: If the token does not verify.
+    """
+    now = time.time() if now is None else now
+    claims = verified_tokens.get(token, now)
+    if claims is not None:
+        return claims
+
+    try:
+        header_part, payload_part, signature_part = token.split('.')
+        header = json.loads(b64url_decode(header_part))
+        claims = json.loads(b64url_decode(payload_part))
+        signature = b64url_decode(signature_part)
+    except ValueError as e:
+        raise InvalidToken(f"malformed token: {e}")
+    if not isinstance(header, dict) or not isinstance(claims, dict):
+        raise InvalidToken("malformed token")
+
+    if header.get('alg') != 'RS256':
+        raise InvalidToken("only RS256 tokens are accepted")
+    public_key = jwks.key(header.get('kid'))
+    if public_key is None:
+        raise InvalidToken("token is signed with an unknown key")
+    if not verify_rs256(f"{header_part}.{payload_part}".encode(), signature, public_key):
+        raise InvalidToken("bad signature")
+
+    check_claims(claims, now)
+    verified_tokens.put(token, claims)
+    return claims
+
+
+def caller(event):
+    """
+    The identity `jwt_authorizer` attached to an API Gateway request, or None.
+
+    Returns:
+        dict: `sub`, `email`, `username` and `groups` (a list), as verified by the
+        authorizer, or None if the request did not go through it.
+    """
+    context = (event.get('requestContext') or {}).get('authorizer') or {}
+    if not context.get('sub'):
+        return None
+    return {
+        'sub': context['sub'],
+        'email': context.get('email') or None,
+        'username': context.get('username') or None,
+        'groups': [group for group in (context.get('groups') or '').split(',') if group]
+    }
@@ -0,0 +1,73 @@
+"""
+At-least-once bookkeeping for notifications, in the `TaskNotifications` table.
+
+A notification that may be sent more than once (a replayed stream record, a retried
+reminder sweep) gets a claim, keyed by a string that names it, e.g.
+`<task id>#<email>`. Claims are read with one consistent `BatchGetItem` and written
+with `BatchWriteItem`, 25 at a time:
+
+    pending   written before the notification is published
+    sent      written once SNS has accepted it
+    failed    written when SNS rejected it as a sender fault, which no retry can fix
+
+A retry skips `sent` and `failed` notifications and publishes `pending` ones again, so
+a crash between publishing and recording can send a notification twice but never
+loses one. Claims expire through the TTL attribute `expires_at`.
+"""
+
+import time
+
+import aws_clients
+import dynamodb_batch
+
+notifications_table = aws_clients.lazy_table('TaskNotifications')
+
+# Claims outlive the stream's 24 hour retention and a week of reminder re-runs.
+CLAIM_TTL_SECONDS = 7 * 24 * 3600
+
+PENDING = 'pending'
+SENT = 'sent'
+FAILED = 'failed'
+
+
+def unsent(claim_ids):
+    """
+    The claims in `claim_ids` whose notifications still have to be sent.
+
+    Returns:
+        list: The IDs without a claim or with a `pending` one, in order. Claims without
+        a `status` (written by earlier versions) count as `sent`.
+
+    Raises:
+        Exception: If some claims could not be read.
+    """
+    claim_ids = list(dict.fromkeys(claim_ids))
+    if not claim_ids:
+        return []
+    claims, unread = dynamodb_batch.batch_get(
+        notifications_table.name,
+        [{'id': claim_id} for claim_id in claim_ids],
+        projection_expression='#id, #status',
+        expression_attribute_names={'#id': 'id', '#status': 'status'},
+        consistent_read=True
+    )
+    if unread:
+        raise Exception(f"Could not read {len(unread)} notification claims")
+    done = {claim['id'] for claim in claims if claim.get('status', SENT) != PENDING}
+    return [claim_id for claim_id in claim_ids if claim_id not in done]
+
+
+def write(claim_ids, status):
+    """
+    Puts the claims of `claim_ids` with `status` in batches.
+
+    Returns:
+        list: The IDs whose claims could not be written.
+    """
+    expires_at = int(time.time()) + CLAIM_TTL_SECONDS
+    unprocessed = dynamodb_batch.batch_write(
+        notifications_table.name,
+        [{'PutRequest': {'Item': {'id': claim_id, 'status': status, 'expires_at': expires_at}}} for claim_id in claim_ids]
+    )
+    failed_ids = {request['PutRequest']['Item']['id'] for request in unprocessed}
+    return [claim_id for claim_id in claim_ids if claim_id in failed_ids]
@@ -0,0 +1,146 @@
+"""
+Batched, concurrent SNS fan-out.
+
+Messages are targeted at one member each through the `email` and `group` message
+attributes that the subscription filter policies match on (see post-confirmation-trigger).
+Instead of one `publish` per member, `publish_notifications` packs them into
+`PublishBatch` calls of up to 10 entries and sends the batches from a bounded thread pool.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import aws_clients
+
+sns = aws_clients.lazy_client('sns')
+
+PUBLISH_BATCH_SIZE = 10
+MAX_WORKERS = 8
+MAX_ATTEMPTS = 4
+BASE_BACKOFF_SECONDS = 0.1
+
+MAX_SUBJECT_LENGTH = 100
+
+
+def build_notification(email, group, subject, message):
+    """
+    Builds a notification targeted at one member through the filter policy attributes.
+
+    SNS rejects subjects with line breaks or over 100 characters, so line breaks in the
+    subject (e.g. from a task title) become spaces and a long one is shortened.
+    """
+    subject = " ".join(subject.split())
+    if len(subject) > MAX_SUBJECT_LENGTH:
+        subject = subject[:MAX_SUBJECT_LENGTH - 3] + '...'
+    return {
+        'Subject': subject,
+        'Message': message,
+        'MessageAttributes': {
+            'email': {
+                'DataType': 'String',
+                'StringValue': email
+            },
+            'group': {
+                'DataType': 'String',
+                'StringValue': group
+            }
+        }
+    }
+
+
+def chunk(items, size):
+    """Splits a list into consecutive chunks of at most `size` items."""
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def publish_batch(topic_arn, notifications):
+    """
+    Sends up to 10 notifications with one `PublishBatch` call, retrying failed entries.
+
+    Returns:
+        list: `(index, error, retryable)` for the entries that could not be delivered,
+        `index` being the entry's position in `notifications`. Entries SNS rejected as
+        a sender fault are not retryable.
+    """
+    pending = dict(enumerate(notifications))
+    errors = {}
+    rejected = set()
+
+    for attempt in range(MAX_ATTEMPTS):
+        if attempt:
+            time.sleep(BASE_BACKOFF_SECONDS * (2 ** (attempt - 1)))
+
+        entries = [{'Id': str(i), **notification} for i, notification in pending.items()]
+        try:
+            response = sns.publish_batch(TopicArn=topic_arn, PublishBatchRequestEntries=entries)
+        except Exception as e:
+            # The whole call failed (e.g. throttling that outlasted botocore's own retries).
+            errors = {i: str(e) for i in pending}
+            continue
+
+        retryable = {}
+        for failure in response.get('Failed', []):
+            i = int(failure['Id'])
+            errors[i] = f"{failure.get('Code')}: {failure.get('Message')}"
+            # Sender faults (bad parameters, auth) will fail again, so only retry the rest.
+            if not failure.get('SenderFault'):
+                retryable[i] = pending[i]
+            else:
+                rejected.add(i)
+                del pending[i]
+        for success in response.get('Successful', []):
+            errors.pop(int(success['Id']), None)
+
+        pending = retryable
+        if not pending:
+            break
+
+    return [(i, error, i not in rejected) for i, error in sorted(errors.items())]
+
+
+def publish_notifications(topic_arn, notifications):
+    """
+    Publishes notifications to an SNS topic in concurrent `PublishBatch` calls.
+
+    Args:
+        topic_arn (str): The topic to publish to.
+        notifications (list): Notifications built with `build_notification`.
+
+    Returns:
+        dict: A delivery report containing:
+            - 'delivered' (int): The number of notifications SNS accepted.
+            - 'failed' (int): The number of notifications that could not be delivered.
+            - 'failures' (list): `{'index', 'email', 'error', 'retryable'}` for every
+              failed notification, `index` being its position in `notifications`.
+              `retryable` is False for sender faults, which fail again however often
+              they are sent.
+
+    Notes:
+        - Failed entries are retried with exponential backoff, up to `MAX_ATTEMPTS` tries.
+          Entries SNS rejects as a sender fault are not retried.
+    """
+    batches = chunk(notifications, PUBLISH_BATCH_SIZE)
+    failures = []
+
+    if batches:
+        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(batches))) as executor:
+            for offset, batch_failures in zip(
+                    range(0, len(notifications), PUBLISH_BATCH_SIZE),
+                    executor.map(lambda batch: publish_batch(topic_arn, batch), batches)):
+                failures.extend((offset + i, error, retryable) for i, error, retryable in batch_failures)
+
+    report = {
+        'delivered': len(notifications) - len(failures),
+        'failed': len(failures),
+        'failures': [
+            {
+                'index': index,
+                'email': notifications[index]['MessageAttributes']['email']['StringValue'],
+                'error': error,
+                'retryable': retryable
+            }
+            for index, error, retryable in failures
+        ]
+    }
+    print(f"Notifications delivered: {report['delivered']}, failed: {report['failed']}")
+    return report
@@ -1,62 +1,168 @@
 import json
-import boto3
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
 
-sns_client = boto3.client('sns')
-cognito_client = boto3.client('cognito-idp')
+import aws_clients
+import instrumentation
+import user_directory
+
+sns_client = aws_clients.lazy_client('sns')
+cognito_client = aws_clients.lazy_client('cognito-idp')
+lambda_client = aws_clients.lazy_client('lambda')
 
 SNS_TOPIC_ARN = "arn:aws:sns:eu-west-1:241533136420:notify-on-create-task"
 GROUP_NAME = "Team-Members"
 USER_POOL_ID = "eu-west-1_xEP7m4WPV"
 
+# Cognito waits at most this long for the trigger, whatever the function's timeout is.
+COGNITO_TIMEOUT_MS = 5000
+# Kept back from the budget for the init of a cold start (Cognito counts it, the
+# function's remaining time does not), the hand-off of unfinished steps and the reply.
+RESERVED_MS = 1500
+
+# Key of the payload the trigger invokes itself with to finish steps asynchronously.
+RETRY_EVENT_KEY = 'onboardingRetry'
+
+# Module level, so the handler never waits for a call it has given up on. Lambda freezes
+# such a call with the container; it finishes on the next invocation or is abandoned,
+# both harmless because the steps are idempotent.
+executor = ThreadPoolExecutor(max_workers=4)
+
+
+def subscribe_to_topic(user):
+    """
+    Subscribes a member's email to the notification topic.
+
+    The filter policy makes SNS deliver only the messages addressed to this member.
+    Subscribing the same email with the same filter policy again returns the existing
+    subscription, so the step is safe to retry.
+    """
+    email = user['email']
+    filter_policy = {
+        'email': [email],
+        'group': [GROUP_NAME]
+    }
+    sns_response = sns_client.subscribe(
+        TopicArn=SNS_TOPIC_ARN,
+        Protocol='email',
+        Endpoint=email,
+        Attributes={
+            'FilterPolicy': json.dumps(filter_policy)
+        }
+    )
+    print(f"SNS Subscription successful: {sns_response.get('SubscriptionArn')}")
+
+
+def add_to_group(user):
+    """Adds a member to the members group. Adding a member twice is not an error."""
+    cognito_client.admin_add_user_to_group(
+        UserPoolId=USER_POOL_ID,
+        Username=user['email'],
+        GroupName=GROUP_NAME
+    )
+    print(f"User added to group {GROUP_NAME}")
+
+
+def add_to_directory(user):
+    """Writes the member's record to the members directory. The write is a put, so safe to retry."""
+    user_directory.put_user(
+        user_directory.directory_record(user['sub'], user['email'], user['username'], GROUP_NAME)
+    )
+    print("User added to the members directory")
+
+
+ONBOARDING_STEPS = {
+    'subscribe': subscribe_to_topic,
+    'add_to_group': add_to_group,
+    'add_to_directory': add_to_directory
+}
+
+
+def run_steps(user, steps, timeout_seconds):
+    """
+    Runs onboarding steps concurrently and waits for them at most `timeout_seconds`.
+
+    Returns:
+        list: The steps that failed or did not finish in time.
+    """
+    futures = {executor.submit(ONBOARDING_STEPS[step], user): step for step in steps}
+    done, not_done = wait(futures, timeout=max(timeout_seconds, 0))
+
+    unfinished = [futures[future] for future in not_done]
+    for future in done:
+        if future.exception() is not None:
+            print(f"Onboarding step {futures[future]} failed: {future.exception()}")
+            unfinished.append(futures[future])
+    if not_done:
+        print(f"Onboarding steps did not finish in {timeout_seconds:.2f}s: {[futures[future] for future in not_done]}")
+    return unfinished
+
+
+def hand_off(user, steps, context):
+    """
+    Invokes this function asynchronously to finish `steps` after Cognito has its reply.
+
+    Lambda retries a failed asynchronous invocation twice with backoff; after that the
+    event goes to the function's on-failure destination or dead-letter queue.
+    """
+    function_name = getattr(context, 'invoked_function_arn', None) or os.environ['AWS_LAMBDA_FUNCTION_NAME']
+    lambda_client.invoke(
+        FunctionName=function_name,
+        InvocationType='Event',
+        Payload=json.dumps({RETRY_EVENT_KEY: {'user': user, 'steps': steps}})
+    )
+    print(f"Handed off onboarding steps {steps} for {user['email']}")
+
+
+def retry_steps(payload):
+    """
+    Finishes the steps a trigger handed off, one after the other and without a deadline.
+
+    Raises:
+        Exception: If a step still fails, so that Lambda retries the invocation.
+    """
+    # Hand-offs queued before the directory step existed carry only the email.
+    user = payload.get('user') or {'email': payload['email']}
+    for step in payload['steps']:
+        ONBOARDING_STEPS[step](user)
+    return {'email': user['email'], 'completed': payload['steps']}
+
+
+@instrumentation.instrument_handler
 def lambda_handler(event, context):
     """
     This handler is a post confirmation trigger attached to cognito
-    After the user has been confirmed, this trigger retrieves the user information 
-    from the event object, then subscribes the user to an sns topic, then adds the user
-    to a group
+    After the user has been confirmed, this trigger retrieves the user information
+    from the event object, then subscribes the user to an sns topic, adds the user
+    to a group and records the user in the members directory, all at once
+
+    The three calls get whatever is left of Cognito's 5 second limit (less `RESERVED_MS`).
+    Steps that fail or run out of time are handed off to an asynchronous invocation of
+    this function (an event with an `onboardingRetry` key), so confirmation is never
+    held up or failed by them. All steps are idempotent, so a retried trigger or a
+    retried hand-off does not create duplicates. A directory record that is still
+    missing after the retries is written by `reconcile_user_directory`.
 
     This trigger is for members. Admins are added manually on the aws console.
     Since this is a triggered function, it returns the event back to the trigger.
     """
+    if RETRY_EVENT_KEY in event:
+        return retry_steps(event[RETRY_EVENT_KEY])
 
-    print(f"event: {event}")
-
-    username = event['userName']
-    email = event['request']['userAttributes']['email']
-    user_id = event['request']['userAttributes']['sub']
-
-    filter_policy = {
-        'email': [email],
-        'group': [GROUP_NAME]
+    user = {
+        'email': event['request']['userAttributes']['email'],
+        'sub': event['request']['userAttributes']['sub'],
+        'username': event['userName']
     }
 
+    remaining_ms = context.get_remaining_time_in_millis() if context else COGNITO_TIMEOUT_MS
+    budget_ms = min(remaining_ms, COGNITO_TIMEOUT_MS) - RESERVED_MS
+
     try:
-        # subscribe the user to sns topic
-        # attach the filter policy as an attribute of the subscription
-        # topic arn is the target topic notifications will be sent to
-        # protocol is how notifications will be sent to the topic
-        # endpoint is the target where the topic broadcast should hit
-        sns_response = sns_client.subscribe(
-            TopicArn=SNS_TOPIC_ARN,
-            Protocol='email',
-            Endpoint=email,
-            Attributes={
-                'FilterPolicy': json.dumps(filter_policy)
-            }
-        )
-
-        print(f"SNS Subscription successful: {sns_response}")
-
-        # add the new user to a group
-        # should I use the username or the sub or the email ??
-        cognito_response = cognito_client.admin_add_user_to_group(
-            UserPoolId=USER_POOL_ID,
-            Username=email,
-            GroupName=GROUP_NAME
-        )
-
-        print(f"User added to group {GROUP_NAME}: {cognito_response}")
+        unfinished = run_steps(user, list(ONBOARDING_STEPS), budget_ms / 1000)
+        if unfinished:
+            hand_off(user, unfinished, context)
     except Exception as e:
         print(f"An error occured while subscribing the user and adding them to a group: {e}")
 
-    return event
\ No newline at end of file
+    return event
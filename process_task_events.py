@@ -0,0 +1,214 @@
+"""
+Side effects of task writes, driven by the `Tasks` table's DynamoDB stream.
+
+`create_tasks`, `update_status`, `update_task_details` and `delete_task_by_id` only write
+the task items; the stream is the outbox. This function receives the stream records in
+batches and:
+
+    - brings the `TaskAssignments` rows of every inserted, modified or removed task in
+      line with its latest image in the batch
+    - notifies the assignees of every inserted task, one message per assignee covering
+      all of their new tasks in the batch, with batched `PublishBatch` calls
+
+The stream delivers the records of a task in order and Lambda retries a shard from the
+first failed record, so the rows always end up matching the last write: a replayed or
+late record cannot bring back the rows of a deleted task or an outdated title. A record
+that does not change a task's rows (a new description) writes nothing.
+
+Stream records are delivered at least once and a failed batch is delivered again, so
+each notification has a claim `<task id>#<email>` (see `notification_claims`): `pending`
+before it is published, `sent` once SNS has accepted it and `failed` if SNS rejected it
+as a sender fault. A replay only publishes the `pending` ones again, so a crash or
+timeout between publishing and recording can send a notification twice but never
+loses one. Only the records of notifications that failed for a transient reason
+are reported back as `batchItemFailures`, so Lambda retries them; a permanently bad
+notification is logged and does not hold up the shard.
+
+Event source mapping: stream view type `NEW_AND_OLD_IMAGES`, `FunctionResponseTypes`
+set to `ReportBatchItemFailures`, no event filter and a short batching window so a bulk
+create arrives as one batch.
+"""
+
+import dynamodb_json
+import instrumentation
+import notification_claims
+import notification_dispatcher
+import task_indexes
+
+GROUP_NAME = "************"
+
+SNS_TOPIC_ARN = 'arn:aws:sns:************:************:notify-on-create-task'
+
+
+def record_images(record):
+    """The task before and after the write of a stream record; None where there is no image."""
+    images = record.get('dynamodb', {})
+    old_task = dynamodb_json.deserialize_item(images['OldImage']) if 'OldImage' in images else None
+    new_task = dynamodb_json.deserialize_item(images['NewImage']) if 'NewImage' in images else None
+    return old_task, new_task
+
+
+def inserted_tasks(records):
+    """Returns `(record, task)` for every stream record of a newly created task."""
+    created = []
+    for record in records:
+        _, task = record_images(record)
+        if record.get('eventName') == 'INSERT' and task:
+            created.append((record, task))
+    return created
+
+
+def assignment_changes(records):
+    """
+    Collects the `TaskAssignments` changes of a batch, one per task whose rows change.
+
+    Returns:
+        list: `(old_tasks, task)` pairs for `task_indexes.sync_assignments`: the old
+        images of the task's records and its last new image (None if it was deleted).
+    """
+    changes = {}
+    for record in records:
+        old_task, new_task = record_images(record)
+        task = new_task or old_task
+        if task is None:
+            continue
+        old_tasks, _, changed = changes.get(task['id'], ([], None, False))
+        if old_task is not None:
+            old_tasks.append(old_task)
+        rows_before = task_indexes.assignment_rows(old_task) if old_task else []
+        rows_after = task_indexes.assignment_rows(new_task) if new_task else []
+        changes[task['id']] = (old_tasks, new_task, changed or rows_before != rows_after)
+    return [(old_tasks, task) for old_tasks, task, changed in changes.values() if changed]
+
+
+def claim_id(key):
+    task_id, email = key
+    return f"{task_id}#{email}"
+
+
+def unsent_notifications(tasks):
+    """
+    The notifications of the assignees of `tasks` that have not been sent yet.
+
+    Returns:
+        list: The `(task_id, email)` keys without a claim or with a `pending` one.
+    """
+    keys = list(dict.fromkeys((task['id'], email) for task in tasks for email in task_indexes.assignee_emails(task)))
+    unsent = set(notification_claims.unsent([claim_id(key) for key in keys]))
+    return [key for key in keys if claim_id(key) in unsent]
+
+
+def write_claims(keys, status):
+    """
+    Puts the claims of `keys` with `status`.
+
+    Returns:
+        list: The keys whose claims could not be written.
+    """
+    failed_ids = set(notification_claims.write([claim_id(key) for key in keys], status))
+    return [key for key in keys if claim_id(key) in failed_ids]
+
+
+def build_notifications(tasks, claimed):
+    """
+    Builds one notification per assignee listing all of their claimed new tasks.
+
+    Args:
+        tasks (list): The new tasks.
+        claimed (list): The `(task_id, email)` keys to notify.
+    """
+    tasks_by_id = {task['id']: task for task in tasks}
+    tasks_by_email = {}
+    for task_id, email in claimed:
+        tasks_by_email.setdefault(email, []).append(tasks_by_id[task_id])
+
+    notifications = []
+    for email, assigned_tasks in tasks_by_email.items():
+        if len(assigned_tasks) == 1:
+            task = assigned_tasks[0]
+            message = (
+                f"You have been assigned a new task:\n\n"
+                f"Title: {task['title']}\n"
+                f"Start Date: {task['start_date']}\n"
+                f"Due Date: {task['due_date']}\n\n"
+                f"Please check the system for more details."
+            )
+            subject = f"New Task Assigned: {task['title']}"
+        else:
+            lines = "\n".join(
+                f"- {task['title']} (Start Date: {task['start_date']}, Due Date: {task['due_date']})"
+                for task in assigned_tasks
+            )
+            message = (
+                f"You have been assigned {len(assigned_tasks)} new tasks:\n\n"
+                f"{lines}\n\n"
+                f"Please check the system for more details."
+            )
+            subject = f"{len(assigned_tasks)} New Tasks Assigned"
+        notifications.append(notification_dispatcher.build_notification(email, GROUP_NAME, subject, message))
+    return notifications
+
+
+def process_new_tasks(created):
+    """
+    Sends the notifications of a batch of new tasks.
+
+    Args:
+        created (list): `(record, task)` pairs from `inserted_tasks`.
+
+    Returns:
+        list: The stream records that have to be retried.
+    """
+    tasks = [task for _, task in created]
+    unsent = unsent_notifications(tasks)
+    errors = write_claims(unsent, notification_claims.PENDING)
+    claimed = [key for key in unsent if key not in errors]
+    report = notification_dispatcher.publish_notifications(SNS_TOPIC_ARN, build_notifications(tasks, claimed))
+
+    # Undelivered notifications keep their `pending` claims and are sent by the retry,
+    # unless SNS rejected them for good.
+    failures = {failure['email']: failure for failure in report['failures']}
+    rejected = [key for key in claimed if key[1] in failures and not failures[key[1]]['retryable']]
+    undelivered = [key for key in claimed if key[1] in failures and failures[key[1]]['retryable']]
+    delivered = [key for key in claimed if key[1] not in failures]
+    for task_id, email in rejected:
+        print(f"Dropping the notification of task {task_id} to {email}: {failures[email]['error']}")
+    unrecorded = write_claims(delivered, notification_claims.SENT) + write_claims(rejected, notification_claims.FAILED)
+    if unrecorded:
+        print(f"Could not record {len(unrecorded)} finished notifications; a replay would send them again")
+
+    retry_ids = {task_id for task_id, _ in undelivered + errors}
+    if retry_ids:
+        print(f"Notifications of tasks {sorted(retry_ids)} will be retried")
+    return [record for record, task in created if task['id'] in retry_ids]
+
+
+@instrumentation.instrument_handler
+def lambda_handler(event, context):
+    """
+    Handles a batch of `Tasks` stream records.
+
+    Returns:
+        dict: The partial batch response, `{'batchItemFailures': [{'itemIdentifier': ...}]}`
+        with the sequence numbers of the records to retry.
+    """
+    records = event.get('Records', [])
+    try:
+        task_indexes.sync_assignments(assignment_changes(records))
+    except Exception as e:
+        # Retrying every record keeps the rows in stream order.
+        print(f"Error writing assignment rows: {e}")
+        return {'batchItemFailures': [{'itemIdentifier': record['dynamodb']['SequenceNumber']} for record in records]}
+
+    created = inserted_tasks(records)
+    retry = []
+    if created:
+        try:
+            retry = process_new_tasks(created)
+        except Exception as e:
+            print(f"Error processing new tasks: {e}")
+            retry = [record for record, _ in created]
+
+    return {
+        'batchItemFailures': [{'itemIdentifier': record['dynamodb']['SequenceNumber']} for record in retry]
+    }
@@ -0,0 +1,83 @@
+"""
+Recomputes the `task_stats` counters from the `Tasks` table with a parallel scan.
+
+Run it once after creating the `TaskStats` table, and again whenever the counters may
+have drifted (e.g. after the stream consumer was down for longer than the stream's
+retention):
+
+    python rebuild_task_stats.py [--segments 8] [--dry-run]
+
+It can also be deployed as a Lambda function and invoked by hand with
+`{"segments": 8, "dry_run": false}`.
+
+Stream records applied while the scan runs may be counted twice or not at all, so run
+it when few tasks are being changed.
+"""
+
+import argparse
+import json
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import aws_clients
+import dynamodb_json
+import get_all_tasks
+import instrumentation
+import task_stats
+
+dynamodb_client = aws_clients.lazy_client('dynamodb')
+
+# All the counters depend on.
+STATS_FIELDS = ('id', 'status', 'due_date', 'assigned_to', 'completed_by')
+DEFAULT_SEGMENTS = 8
+
+
+def count_segment(segment, total_segments):
+    """Sums the contributions of the tasks in one scan segment."""
+    counts = Counter()
+    for item in get_all_tasks.scan_all(segment, total_segments, fields=STATS_FIELDS):
+        counts.update(task_stats.contribution(dynamodb_json.deserialize_item(item)))
+    return counts
+
+
+def rebuild_task_stats(total_segments=DEFAULT_SEGMENTS, dry_run=False):
+    """
+    Recomputes the overview counters and replaces the stored ones.
+
+    Args:
+        total_segments (int): The number of parallel scan segments.
+        dry_run (bool): Compute the counters without writing them.
+
+    Returns:
+        dict: The recomputed counters.
+    """
+    counts = Counter()
+    with ThreadPoolExecutor(max_workers=total_segments) as executor:
+        for segment_counts in executor.map(lambda segment: count_segment(segment, total_segments), range(total_segments)):
+            counts.update(segment_counts)
+
+    if not dry_run:
+        # A put replaces the whole item, so counters that dropped to zero disappear.
+        dynamodb_client.put_item(
+            TableName=task_stats.STATS_TABLE,
+            Item={
+                'id': {'S': task_stats.OVERVIEW_ID},
+                **{name: {'N': str(amount)} for name, amount in counts.items()}
+            }
+        )
+    print(f"Rebuilt {len(counts)} counters from {counts.get('tasks', 0)} tasks{' (dry run)' if dry_run else ''}")
+    return dict(counts)
+
+
+@instrumentation.instrument_handler
+def lambda_handler(event, context):
+    event = event or {}
+    return rebuild_task_stats(int(event.get('segments', DEFAULT_SEGMENTS)), bool(event.get('dry_run', False)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--segments', type=int, default=DEFAULT_SEGMENTS, help="parallel scan segments")
+    parser.add_argument('--dry-run', action='store_true', help="print the counters without writing them")
+    args = parser.parse_args()
+    print(json.dumps(rebuild_task_stats(args.segments, args.dry_run), indent=2, sort_keys=True))
@@ -0,0 +1,110 @@
+"""
+Brings the members directory (`user_directory`) in line with the Cognito members group.
+
+The post-confirmation trigger writes a record for every new member, but a write can be
+lost (a hand-off that ran out of retries), and users removed from the group or the pool,
+or whose email changed, are not seen by any trigger. This job walks the group once and:
+
+    - puts the records that are missing or out of date
+    - deletes the records of users who are no longer in the group
+
+Run it on a schedule (e.g. an EventBridge rule `rate(1 hour)`) and once after creating
+the `UserDirectory` table, to load the existing members:
+
+    python reconcile_user_directory.py [--dry-run]
+
+The directory is read before the group is walked, so a member who signs up while the job
+runs is never deleted; at worst the record is put again on the next run.
+
+Members without an email are skipped: their records would have no `group-index` key, so
+this job could not see them to keep them current or delete them, and the directory only
+serves emails.
+"""
+
+import argparse
+import json
+
+import aws_clients
+import dynamodb_batch
+import instrumentation
+import user_directory
+
+cognito_client = aws_clients.lazy_client('cognito-idp')
+GROUP_NAME = "Team-Members"
+USER_POOL_ID = "eu-west-1_xEP7m4WPV"
+
+
+def group_records():
+    """
+    Pages through the Cognito group.
+
+    Returns:
+        tuple: The members' directory records by sub, and the number of members skipped
+        for having no email.
+    """
+    records = {}
+    skipped = 0
+    request = {'UserPoolId': USER_POOL_ID, 'GroupName': GROUP_NAME}
+    while True:
+        response = cognito_client.list_users_in_group(**request)
+        for user in response['Users']:
+            attributes = {attr['Name']: attr['Value'] for attr in user.get('Attributes', [])}
+            if not attributes.get('email'):
+                skipped += 1
+            elif attributes.get('sub'):
+                records[attributes['sub']] = user_directory.directory_record(
+                    attributes['sub'], attributes.get('email'), user['Username'], GROUP_NAME
+                )
+        if 'NextToken' not in response:
+            return records, skipped
+        request['NextToken'] = response['NextToken']
+
+
+def reconcile_user_directory(dry_run=False):
+    """
+    Puts missing or changed directory records and deletes those of former members.
+
+    Args:
+        dry_run (bool): Work out the changes without writing them.
+
+    Returns:
+        dict: The counts of records `added`, `updated`, `removed` and `unchanged`, the
+        number of writes that `failed` and of members `skipped` for having no email.
+    """
+    stored = {record['sub']: record for record in user_directory.list_group(GROUP_NAME)}
+    members, skipped = group_records()
+
+    added = [record for sub, record in members.items() if sub not in stored]
+    updated = [record for sub, record in members.items() if sub in stored and stored[sub] != record]
+    removed = [sub for sub in stored if sub not in members]
+
+    failed = []
+    if not dry_run:
+        failed = dynamodb_batch.batch_write(
+            user_directory.DIRECTORY_TABLE,
+            [{'PutRequest': {'Item': record}} for record in added + updated]
+            + [{'DeleteRequest': {'Key': {'sub': sub}}} for sub in removed]
+        )
+
+    report = {
+        'added': len(added),
+        'updated': len(updated),
+        'removed': len(removed),
+        'unchanged': len(members) - len(added) - len(updated),
+        'failed': len(failed),
+        'skipped': skipped
+    }
+    print(f"Reconciled the members directory{' (dry run)' if dry_run else ''}: {report}")
+    return report
+
+
+@instrumentation.instrument_handler
+def lambda_handler(event, context):
+    return reconcile_user_directory(bool((event or {}).get('dry_run', False)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--dry-run', action='store_true', help="print the changes without writing them")
+    args = parser.parse_args()
+    print(json.dumps(reconcile_user_directory(args.dry_run), indent=2, sort_keys=True))
@@ -0,0 +1,63 @@
+"""
+Clean-up of the legacy per-task reminder rules.
+
+Deadline reminders are sent by the daily sweeper (`send_task_reminders`), which reads the
+tasks due tomorrow, so a task never needs a rule of its own. Tasks created before the
+sweeper still have a `TaskReminder_<id>` EventBridge rule that fires at the old due date;
+it is deleted when the task is deleted or its due date changes.
+"""
+
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
+
+import aws_clients
+
+event_bridge = aws_clients.lazy_client('events')
+
+REMINDER_RULE_PREFIX = 'TaskReminder_'
+REMINDER_CLEANUP_WORKERS = 5
+
+
+def list_reminder_rule_names():
+    """Lists the names of the per-task reminder rules that still exist."""
+    names = set()
+    request = {'NamePrefix': REMINDER_RULE_PREFIX}
+    while True:
+        response = event_bridge.list_rules(**request)
+        names.update(rule['Name'] for rule in response.get('Rules', []))
+        if not response.get('NextToken'):
+            return names
+        request['NextToken'] = response['NextToken']
+
+
+def delete_reminder_rule(task_id):
+    """Removes the target of a task's reminder rule, then the rule itself."""
+    rule_name = f"{REMINDER_RULE_PREFIX}{task_id}"
+    try:
+        event_bridge.remove_targets(Rule=rule_name, Ids=[f"ReminderTarget_{task_id}"])
+        event_bridge.delete_rule(Name=rule_name)
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ResourceNotFoundException':
+            raise
+
+
+def cleanup_reminder_rules(task_ids):
+    """
+    Deletes the `TaskReminder_*` EventBridge rules of the given tasks.
+
+    Only tasks created before the sweeper have a rule. The existing rules are listed
+    once and only those are deleted, concurrently. Failures are logged and do not fail
+    the calling request.
+    """
+    if not task_ids:
+        return
+    try:
+        existing = list_reminder_rule_names()
+        stale = [task_id for task_id in task_ids if f"{REMINDER_RULE_PREFIX}{task_id}" in existing]
+        if not stale:
+            return
+        with ThreadPoolExecutor(max_workers=min(REMINDER_CLEANUP_WORKERS, len(stale))) as executor:
+            list(executor.map(delete_reminder_rule, stale))
+        print(f"Deleted reminder rules for tasks: {stale}")
+    except Exception as e:
+        print(f"Error deleting reminder rules: {e}")
@@ -1,58 +1,190 @@
-import boto3
 import json
+from datetime import datetime, timedelta, timezone
 
-sns = boto3.client('sns')
-event_bridge = boto3.client('events')
+import aws_clients
+import dynamodb_json
+import instrumentation
+import notification_claims
+import notification_dispatcher
+import task_indexes
+
+event_bridge = aws_clients.lazy_client('events')
 GROUP_NAME = "Team-Members"
 SNS_TOPIC_ARN = 'arn:aws:sns:eu-west-1:241533136420:notify-on-create-task'
 
+# Reminders go out this many days before the due date.
+REMINDER_LEAD_DAYS = 1
+
+# All the sweeper reads of each due task.
+REMINDER_FIELDS = ('id', 'title', 'status', 'due_date', 'assigned_to')
+
+
+def build_reminder(title, due_date):
+    """Builds the subject and message of a deadline reminder."""
+    message = (
+        f"Reminder: You have an upcoming task deadline.\n\n"
+        f"Title: {title}\n"
+        f"Due Date: {due_date}\n\n"
+        f"Please complete your task before the deadline."
+    )
+    subject = f"Task Reminder: {title}"
+    return subject, message
+
+
+def reminder_claim_id(due_date, task_id, email):
+    """The `notification_claims` ID of one reminder: one per task, assignee and due date."""
+    return f"reminder#{due_date}#{task_id}#{email}"
+
+
+def send_reminders(reminders):
+    """
+    Publishes reminders that have not been sent yet and records which were.
+
+    Args:
+        reminders (list): `(claim_id, notification)` pairs.
+
+    Returns:
+        dict: A delivery report containing:
+            - 'delivered' (int): The reminders SNS accepted.
+            - 'failed' (int): The reminders that failed for a transient reason; they
+              keep `pending` claims and are sent by a retry.
+            - 'rejected' (int): The reminders SNS rejected as a sender fault. They are
+              marked `failed` and never sent again.
+            - 'skipped' (int): The reminders an earlier run already sent or rejected.
+    """
+    reminders = list(dict(reminders).items())
+    unsent = set(notification_claims.unsent([claim_id for claim_id, _ in reminders]))
+    due = [(claim_id, notification) for claim_id, notification in reminders if claim_id in unsent]
+    unclaimed = set(notification_claims.write([claim_id for claim_id, _ in due], notification_claims.PENDING))
+    claimed = [(claim_id, notification) for claim_id, notification in due if claim_id not in unclaimed]
+
+    report = notification_dispatcher.publish_notifications(SNS_TOPIC_ARN, [notification for _, notification in claimed])
+    failures = {failure['index']: failure for failure in report['failures']}
+    sent = [claim_id for index, (claim_id, _) in enumerate(claimed) if index not in failures]
+    rejected = [claim_id for index, (claim_id, _) in enumerate(claimed) if index in failures and not failures[index]['retryable']]
+    for index, failure in failures.items():
+        if not failure['retryable']:
+            print(f"Dropping reminder {claimed[index][0]}: {failure['error']}")
+
+    unrecorded = (notification_claims.write(sent, notification_claims.SENT)
+                  + notification_claims.write(rejected, notification_claims.FAILED))
+    if unrecorded:
+        print(f"Could not record {len(unrecorded)} finished reminders; a retry would send them again")
+
+    return {
+        'delivered': len(sent),
+        'failed': len(failures) - len(rejected) + len(unclaimed),
+        'rejected': len(rejected),
+        'skipped': len(reminders) - len(due)
+    }
+
+
+def send_due_date_reminders(due_date):
+    """
+    Sends a reminder to every assignee of every open task due on `due_date`.
+
+    Args:
+        due_date (str): The due date to remind about, as 'YYYY-MM-DD'.
+
+    Returns:
+        dict: The delivery report of `send_reminders`, plus 'tasks' (int), the number
+        of tasks reminders were sent for.
+
+    Notes:
+        - Tasks are found with one `Query` on the Tasks `due_date-index` GSI, reading
+          only `REMINDER_FIELDS`.
+        - Completed tasks are skipped.
+        - All reminders are published together, so the cost is a handful of
+          `PublishBatch` calls however many tasks are due.
+        - Every reminder has a claim (see `notification_claims`), so a re-run for the
+          same date only sends the reminders that were not delivered.
+    """
+    tasks = [
+        task for task in map(dynamodb_json.deserialize_item, task_indexes.query_tasks_due_on(due_date, REMINDER_FIELDS))
+        if task.get('status') != 'completed'
+    ]
+
+    reminders = []
+    for task in tasks:
+        subject, message = build_reminder(task['title'], task['due_date'])
+        reminders.extend(
+            (reminder_claim_id(due_date, task['id'], email),
+             notification_dispatcher.build_notification(email, GROUP_NAME, subject, message))
+            for email in task_indexes.assignee_emails(task)
+        )
+
+    report = send_reminders(reminders)
+    report['tasks'] = len(tasks)
+    return report
+
+
+def send_legacy_rule_reminder(task):
+    """
+    Handles an event from a per-task `TaskReminder_{task_id}` rule created before the
+    daily sweeper existed: sends its reminder, then deletes the rule.
+    """
+    subject, message = build_reminder(task['title'], task['due_date'])
+    report = send_reminders([
+        (reminder_claim_id(task['due_date'], task['task_id'], email),
+         notification_dispatcher.build_notification(email, GROUP_NAME, subject, message))
+        for email in task['assigned_emails']
+    ])
+    # Keep the rule until the reminders are out, so the retried event sends the rest.
+    if report['failed']:
+        raise Exception(f"{report['failed']} reminders for task {task['task_id']} could not be delivered")
+
+    rule_name = f"TaskReminder_{task['task_id']}"
+    target_id = f"ReminderTarget_{task['task_id']}"
+    print(f"Deleting EventBridge Rule: {rule_name}")
+
+    event_bridge.remove_targets(
+        Rule=rule_name,
+        Ids=[target_id]
+    )
+
+    event_bridge.delete_rule(
+        Name=rule_name
+    )
+
+
+@instrumentation.instrument_handler
 def lambda_handler(event, context):
-    """Send a reminder email for an upcoming task."""
+    """
+    Send reminder emails for tasks that are due tomorrow.
+
+    This handler is invoked once a day by a single scheduled EventBridge rule
+    (e.g. `cron(0 8 * * ? *)`). An event with a 'due_date' key reminds about that
+    date instead, which is useful to re-run a missed day.
+
+    Returns:
+        dict: The delivery report of `send_due_date_reminders`.
+
+    Raises:
+        Exception: If the sweep fails or a reminder failed for a transient reason, so
+        the invocation counts as failed and EventBridge's asynchronous invocation
+        retries it. The retry only sends the reminders that are not recorded as sent;
+        reminders SNS rejected as a sender fault are logged and not retried.
+        `RemindersSent`, `RemindersFailed` and `RemindersRejected` are emitted as metrics.
+    """
     try:
-        print('I am in the try block ooo')
-        print(event)
-        print(context)
-        task = event
-        
-        message = (
-            f"Reminder: You have an upcoming task deadline.\n\n"
-            f"Title: {task['title']}\n"
-            f"Due Date: {task['due_date']}\n\n"
-            f"Please complete your task before the deadline."
-        )
-        subject = f"Task Reminder: {task['title']}"
-        print(task['assigned_emails'])
-
-        for email in task['assigned_emails']:
-            sns.publish(
-                TopicArn=SNS_TOPIC_ARN,
-                Subject=subject,
-                Message=message,
-                MessageAttributes={
-                    'email': {
-                        'DataType': 'String',
-                        'StringValue': email
-                    },
-                    'group': {
-                        'DataType': 'String',
-                        'StringValue': GROUP_NAME
-                    }
-                }
-            )
-        
-        rule_name = f"TaskReminder_{task['task_id']}"
-        target_id = f"ReminderTarget_{task['task_id']}"
-        print(f"Deleting EventBridge Rule: {rule_name}")
-
-        event_bridge.remove_targets(
-            Rule=rule_name,
-            Ids=[target_id]
-        )
+        if 'task_id' in event:
+            send_legacy_rule_reminder(event)
+            return
 
-        event_bridge.delete_rule(
-            Name=rule_name
-        )
+        due_date = event.get('due_date')
+        if not due_date:
+            tomorrow = datetime.now(timezone.utc).date() + timedelta(days=REMINDER_LEAD_DAYS)
+            due_date = tomorrow.isoformat()
 
+        report = send_due_date_reminders(due_date)
+        print(f"Reminders for tasks due {due_date}: {json.dumps(report)}")
     except Exception as e:
-        print('I am in the catch block oo')
         print(f"An unhandled error occured: {e}")
+        raise
+
+    instrumentation.put_metric('RemindersSent', report['delivered'])
+    instrumentation.put_metric('RemindersFailed', report['failed'])
+    instrumentation.put_metric('RemindersRejected', report['rejected'])
+    if report['failed']:
+        raise Exception(f"{report['failed']} reminders for tasks due {due_date} could not be delivered")
+    return report
@@ -0,0 +1,150 @@
+"""
+Task attachments, uploaded and downloaded straight to and from S3.
+
+File bytes never pass through API Gateway or Lambda (whose payloads are capped at 6 MB
+and whose time is billed per byte moved). The handlers only hand out presigned URLs:
+
+    create_attachment_upload    starts a multipart upload and presigns a URL per part;
+                                the client `PUT`s the parts, in parallel, to S3
+    complete_attachment_upload  completes the upload and appends the file's metadata
+                                (`key`, `name`, `size`, `content_type`, `checksum`,
+                                `uploaded_at`) to the task's `files` list
+    get_attachment_url          presigns a `GET` for one attachment; the URL accepts
+                                `Range` headers, so large files can be fetched in pieces
+
+Objects are stored under `tasks/<task id>/<upload id>/<file name>`. The bucket needs a
+lifecycle rule that aborts incomplete multipart uploads (e.g. after 1 day) and a CORS
+rule that allows `PUT`/`GET` from the app and exposes the `ETag` header.
+
+Settings (environment variables):
+    ATTACHMENTS_BUCKET          The bucket (default `task-attachments`).
+    ATTACHMENT_MAX_BYTES        Largest accepted file (default 5 GiB).
+    ATTACHMENT_PART_BYTES       Part size (default 8 MiB; S3's minimum is 5 MiB).
+"""
+
+import math
+import os
+import re
+import uuid
+
+import aws_clients
+import item_codec
+
+BUCKET = os.environ.get('ATTACHMENTS_BUCKET', 'task-attachments')
+MAX_BYTES = int(os.environ.get('ATTACHMENT_MAX_BYTES', str(5 * 1024 ** 3)))
+PART_BYTES = int(os.environ.get('ATTACHMENT_PART_BYTES', str(8 * 1024 ** 2)))
+
+# S3 limits for multipart uploads.
+MIN_PART_BYTES = 5 * 1024 ** 2
+MAX_PARTS = 10000
+
+UPLOAD_URL_SECONDS = 3600
+DOWNLOAD_URL_SECONDS = 900
+
+# `DeleteObjects` takes at most this many keys per request.
+DELETE_BATCH_SIZE = 1000
+
+MAX_NAME_LENGTH = 200
+
+s3_client = aws_clients.lazy_client('s3')
+
+
+def safe_name(name):
+    """Reduces a client-supplied file name to a safe object key segment."""
+    name = os.path.basename(str(name or '').replace('\\', '/'))
+    name = re.sub(r'[^A-Za-z0-9._-]+', '_', name).strip('._')
+    return name[-MAX_NAME_LENGTH:] or 'file'
+
+
+def task_prefix(task_id):
+    return f"tasks/{task_id}/"
+
+
+def attachment_key(task_id, name):
+    """A new, unique object key for a file attached to a task."""
+    return f"{task_prefix(task_id)}{uuid.uuid4().hex}/{safe_name(name)}"
+
+
+def part_size(size):
+    """
+    The part size for a file of `size` bytes: `PART_BYTES`, or larger (in whole MiB) if
+    the file would otherwise need more than `MAX_PARTS` parts.
+    """
+    mib = 1024 ** 2
+    needed = math.ceil(size / MAX_PARTS / mib) * mib
+    return max(PART_BYTES, MIN_PART_BYTES, needed)
+
+
+def presign_parts(key, upload_id, size):
+    """
+    Presigns an `UploadPart` URL for every part of a file.
+
+    Presigning is local (no AWS call), so this costs CPU time only.
+
+    Returns:
+        tuple: `(part_size, parts)`, where `parts` lists `{'part_number', 'url'}`.
+    """
+    size_per_part = part_size(size)
+    count = max(1, math.ceil(size / size_per_part))
+    parts = [
+        {
+            'part_number': number,
+            'url': s3_client.generate_presigned_url(
+                'upload_part',
+                Params={'Bucket': BUCKET, 'Key': key, 'UploadId': upload_id, 'PartNumber': number},
+                ExpiresIn=UPLOAD_URL_SECONDS
+            )
+        }
+        for number in range(1, count + 1)
+    ]
+    return size_per_part, parts
+
+
+def presign_download(record):
+    """Presigns a `GET` of an attachment that downloads under its original name."""
+    return s3_client.generate_presigned_url(
+        'get_object',
+        Params={
+            'Bucket': BUCKET,
+            'Key': record['key'],
+            'ResponseContentDisposition': f'attachment; filename="{record["name"]}"'
+        },
+        ExpiresIn=DOWNLOAD_URL_SECONDS
+    )
+
+
+def task_files(task):
+    """The attachment metadata records of a task, decompressing `files` if it is stored compressed."""
+    return [record for record in item_codec.decode_value(task.get('files')) or [] if isinstance(record, dict) and record.get('key')]
+
+
+def find_file(task, key):
+    """Returns the metadata of the attachment `key` of a task, or None."""
+    return next((record for record in task_files(task) if record['key'] == key), None)
+
+
+def delete_attachments(tasks):
+    """
+    Deletes the objects of the attachments of deleted tasks with `DeleteObjects`.
+
+    Errors are logged rather than raised: the tasks are already gone.
+
+    Returns:
+        list: The keys that could not be deleted.
+    """
+    keys = [record['key'] for task in tasks for record in task_files(task)]
+    failed = []
+    for index in range(0, len(keys), DELETE_BATCH_SIZE):
+        batch = keys[index:index + DELETE_BATCH_SIZE]
+        try:
+            response = s3_client.delete_objects(
+                Bucket=BUCKET,
+                Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True}
+            )
+            failed.extend(error['Key'] for error in response.get('Errors', []))
+        except Exception as e:
+            print(f"Error deleting attachment objects: {e}")
+            failed.extend(batch)
+    if failed:
+        print(f"Could not delete {len(failed)} attachment objects: {failed[:10]}")
+    return failed
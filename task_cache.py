@@ -0,0 +1,143 @@
+"""
+Read-through cache of task items that lives across warm invocations of a container.
+
+`get_task_by_id` keeps the wire-format items it reads in a bounded LRU cache. An entry
+is served as is for `TASK_CACHE_REVALIDATE_SECONDS` after it was read or last checked.
+After that, a `GetItem` that projects only `version` and `created_at` decides whether
+it can still be served. Every write to a task bumps `version` (`update_status`,
+`update_task_details`) or removes the item (`delete_task_by_id`), and a task created
+again under a deleted task's ID starts at version 1 with a new `created_at`, so a
+changed task is never served for longer than the revalidation window. Entries older than `TASK_CACHE_TTL_SECONDS` are
+dropped and read again in full.
+
+Writers run in their own containers, so their `invalidate` calls only reach a cache in
+the same process; across containers it is the version check that catches the change.
+
+Settings (environment variables):
+    TASK_CACHE_MAX_ITEMS           Entries kept per container (default 256, 0 disables).
+    TASK_CACHE_TTL_SECONDS         Age at which an entry is dropped (default 300).
+    TASK_CACHE_REVALIDATE_SECONDS  Age at which an entry is version-checked (default 2).
+"""
+
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+
+MAX_ITEMS = int(os.environ.get('TASK_CACHE_MAX_ITEMS', '256'))
+TTL_SECONDS = float(os.environ.get('TASK_CACHE_TTL_SECONDS', '300'))
+REVALIDATE_SECONDS = float(os.environ.get('TASK_CACHE_REVALIDATE_SECONDS', '2'))
+
+# The counters `stats()` reports.
+COUNTERS = ('hits', 'revalidated', 'stale', 'misses', 'expired', 'evicted', 'invalidated')
+
+
+class CacheEntry:
+    """A cached item and when it was read and last checked."""
+
+    def __init__(self, item, now):
+        self.item = item
+        self.version = item.get('version')
+        self.created_at = item.get('created_at')
+        self.stored_at = now
+        self.checked_at = now
+
+    def matches(self, current):
+        """Whether a version check's (wire-format) item is the cached state of the task."""
+        return current.get('version') == self.version and current.get('created_at') == self.created_at
+
+
+class TaskCache:
+    """
+    A bounded LRU cache of task items with a time to live.
+
+    Args:
+        max_items (int): Entries to keep; the least recently used ones are evicted.
+        ttl_seconds (float): Age at which an entry is dropped.
+        revalidate_seconds (float): Age since the last check at which an entry has to be
+            version-checked before it is served.
+    """
+
+    def __init__(self, max_items=MAX_ITEMS, ttl_seconds=TTL_SECONDS, revalidate_seconds=REVALIDATE_SECONDS,
+                 clock=time.monotonic):
+        self.max_items = max_items
+        self.ttl_seconds = ttl_seconds
+        self.revalidate_seconds = revalidate_seconds
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.counters = Counter()
+        self.lock = threading.Lock()
+
+    def lookup(self, task_id, fresh_only=False):
+        """
+        Returns the entry of a task, or None on a miss.
+
+        Expired entries are dropped and reported as misses. The caller has to call
+        `needs_check` before serving the entry, unless `fresh_only` is set: then only
+        entries that can be served without a check are returned (and counted as hits).
+        """
+        with self.lock:
+            now = self.clock()
+            entry = self.entries.get(task_id)
+            if entry is not None and now - entry.stored_at >= self.ttl_seconds:
+                del self.entries[task_id]
+                self.counters['expired'] += 1
+                entry = None
+            if entry is not None and fresh_only and now - entry.checked_at >= self.revalidate_seconds:
+                entry = None
+            if entry is None:
+                self.counters['misses'] += 1
+                return None
+            self.entries.move_to_end(task_id)
+            if fresh_only:
+                self.counters['hits'] += 1
+            return entry
+
+    def needs_check(self, entry):
+        """Whether the entry has to be version-checked; counts a hit if it does not."""
+        with self.lock:
+            if self.clock() - entry.checked_at < self.revalidate_seconds:
+                self.counters['hits'] += 1
+                return False
+            return True
+
+    def confirm(self, entry):
+        """Records that a version check found the entry current."""
+        with self.lock:
+            entry.checked_at = self.clock()
+            self.counters['revalidated'] += 1
+
+    def put(self, task_id, item):
+        """Caches a task item read in full, evicting the least recently used entries."""
+        if self.max_items <= 0:
+            return
+        with self.lock:
+            self.entries[task_id] = CacheEntry(item, self.clock())
+            self.entries.move_to_end(task_id)
+            while len(self.entries) > self.max_items:
+                self.entries.popitem(last=False)
+                self.counters['evicted'] += 1
+
+    def invalidate(self, task_id, stale=False):
+        """Drops the entry of a task, counting it as stale if a version check caught it."""
+        with self.lock:
+            if self.entries.pop(task_id, None) is not None:
+                self.counters['stale' if stale else 'invalidated'] += 1
+
+    def stats(self):
+        """The counters since the container started, plus the current size and hit ratio."""
+        with self.lock:
+            stats = {name: self.counters[name] for name in COUNTERS}
+            stats['size'] = len(self.entries)
+        lookups = stats['hits'] + stats['revalidated'] + stats['stale'] + stats['misses']
+        stats['hit_ratio'] = round((stats['hits'] + stats['revalidated']) / lookups, 4) if lookups else None
+        return stats
+
+
+tasks = TaskCache()
+
+
+def invalidate(task_ids):
+    """Drops the given tasks from this container's cache after a write."""
+    for task_id in task_ids:
+        tasks.invalidate(task_id)
@@ -0,0 +1,78 @@
+"""
+Field selection for task reads (the `fields` query parameter).
+
+`fields` is either a comma-separated list of task attributes, e.g.
+`fields=id,title,due_date`, or the name of a view:
+
+    summary  id, title, status, due_date (what the dashboard list shows)
+    all      whole items
+
+The selection becomes a DynamoDB `ProjectionExpression`, so attributes nobody asked for
+(`description`, `files`, the `assigned_to` maps, ...) are neither sent by DynamoDB nor
+parsed and re-encoded by the Lambda. `id` is always included.
+"""
+
+TASK_FIELDS = (
+    'id', 'title', 'description', 'files', 'status', 'start_date', 'due_date',
+    'assigned_to', 'completed_by', 'assignee_count', 'next_completion', 'version'
+)
+SUMMARY_FIELDS = ('id', 'title', 'status', 'due_date')
+
+VIEWS = {
+    'summary': SUMMARY_FIELDS,
+    'all': None
+}
+
+
+def parse_fields(value, default='all'):
+    """
+    Parses a `fields` query parameter.
+
+    Args:
+        value (str): The parameter value, or None if it was not sent.
+        default (str): The view (or field list) used when `value` is empty.
+
+    Returns:
+        tuple: The attributes to read, `id` first, or None for whole items.
+
+    Raises:
+        ValueError: If a field is not a task attribute.
+    """
+    if not value:
+        value = default
+    if value in VIEWS:
+        return VIEWS[value]
+
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in TASK_FIELDS]
+    if unknown:
+        raise ValueError(f"unknown fields: {', '.join(unknown)}")
+    return tuple(dict.fromkeys(['id'] + fields))
+
+
+def projection_kwargs(fields, expression_attribute_names=None):
+    """
+    Builds the `ProjectionExpression`/`ExpressionAttributeNames` arguments for `fields`.
+
+    Names already used by the request (e.g. by a filter) are passed in
+    `expression_attribute_names` and kept. Returns no arguments for whole items.
+    """
+    if fields is None:
+        return {}
+    names = dict(expression_attribute_names or {})
+    placeholders = []
+    for index, field in enumerate(fields):
+        placeholder = f"#field{index}"
+        names[placeholder] = field
+        placeholders.append(placeholder)
+    return {
+        'ProjectionExpression': ", ".join(placeholders),
+        'ExpressionAttributeNames': names
+    }
+
+
+def project_item(item, fields):
+    """Applies a field selection to an item that was read without a projection."""
+    if fields is None:
+        return item
+    return {name: value for name, value in item.items() if name in fields}
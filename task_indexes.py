@@ -0,0 +1,201 @@
+"""
+Secondary access paths for the Tasks table.
+
+`assigned_to` is a list of `{email, ...}` maps, which no DynamoDB index can reach.
+Every task is therefore also written as one row per assignee to the `TaskAssignments`
+table, keyed by the assignee's email:
+
+    TaskAssignments
+        email (PK), task_id (SK), title, status, start_date, due_date, status_due_date
+        LSI due_date-index         sort key: due_date
+        LSI status_due_date-index  sort key: status_due_date ("<status>#<due_date>")
+
+    Tasks
+        GSI status-due_date-index  partition key: status, sort key: due_date
+        GSI due_date-index         partition key: due_date (one bucket per day)
+
+so "my tasks", "my tasks by status", "my tasks due between X and Y", "all tasks by
+status" and "all tasks due on a day" are all a single `Query`. The rows are kept in
+sync by `process_task_events`, from the `Tasks` table's stream, with `sync_assignments`;
+the handlers that write tasks do not touch them.
+"""
+
+import aws_clients
+import task_fields
+
+TASKS_TABLE_NAME = 'Tasks'
+ASSIGNMENTS_TABLE_NAME = 'TaskAssignments'
+
+assignments_table = aws_clients.lazy_table(ASSIGNMENTS_TABLE_NAME)
+# Queries return wire-format items so read handlers can serialize them directly.
+dynamodb_client = aws_clients.lazy_client('dynamodb')
+
+ASSIGNEE_DUE_DATE_INDEX = 'due_date-index'
+ASSIGNEE_STATUS_DUE_DATE_INDEX = 'status_due_date-index'
+TASKS_STATUS_DUE_DATE_INDEX = 'status-due_date-index'
+TASKS_DUE_DATE_INDEX = 'due_date-index'
+
+# Bounds used when only one end of a due date range is given. Dates are stored as
+# 'YYYY-MM-DD' strings, so these sort before and after every real date.
+MIN_DATE = '0000-00-00'
+MAX_DATE = '9999-99-99'
+
+ASSIGNMENT_FIELDS = ('title', 'status', 'start_date', 'due_date')
+
+
+def assignee_emails(task):
+    """Returns the distinct assignee emails of a task, in assignment order."""
+    emails = []
+    for user in task.get('assigned_to') or []:
+        email = user.get('email') if isinstance(user, dict) else None
+        if email and email not in emails:
+            emails.append(email)
+    return emails
+
+
+def assignment_rows(task):
+    """Builds the `TaskAssignments` rows for a task, one per assignee."""
+    rows = []
+    for email in assignee_emails(task):
+        row = {'email': email, 'task_id': task['id']}
+        for field in ASSIGNMENT_FIELDS:
+            if task.get(field) is not None:
+                row[field] = task[field]
+        row['status_due_date'] = f"{task.get('status') or ''}#{task.get('due_date') or ''}"
+        rows.append(row)
+    return rows
+
+
+def sync_assignments(changes):
+    """
+    Brings the `TaskAssignments` rows of many tasks in line with their current state,
+    in shared batches.
+
+    Args:
+        changes (list): `(old_tasks, task)` pairs: the earlier states of a task whose
+            rows may exist (its stream old images), and the task as it is now stored,
+            or None if it was deleted.
+
+    Notes:
+        - Rows for current assignees are (re)written so denormalized fields stay fresh.
+        - Rows for assignees of an earlier state that are no longer on the task are deleted.
+    """
+    with assignments_table.batch_writer(overwrite_by_pkeys=['email', 'task_id']) as batch:
+        for old_tasks, task in changes:
+            rows = assignment_rows(task) if task else []
+            current = {row['email'] for row in rows}
+            task_id = (task or old_tasks[-1])['id']
+            for row in rows:
+                batch.put_item(Item=row)
+            removed = {email for old_task in old_tasks for email in assignee_emails(old_task)} - current
+            for email in sorted(removed):
+                batch.delete_item(Key={'email': email, 'task_id': task_id})
+
+
+def query_all(**query_kwargs):
+    """
+    Runs a `Query` with the low-level client, following `LastEvaluatedKey`.
+
+    Returns:
+        list: Every matching item, in the DynamoDB wire format.
+    """
+    items = []
+    while True:
+        response = dynamodb_client.query(**query_kwargs)
+        items.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return items
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def query_assignee_tasks(email, status=None, due_from=None, due_to=None):
+    """
+    Lists the tasks assigned to one member, picking the index that fits the filters.
+
+    Args:
+        email (str): The assignee's email address.
+        status (str): Only return tasks with this status.
+        due_from (str): Only return tasks due on or after this 'YYYY-MM-DD' date.
+        due_to (str): Only return tasks due on or before this 'YYYY-MM-DD' date.
+
+    Returns:
+        list: Wire-format task summaries with 'id', 'title', 'status', 'start_date'
+        and 'due_date'.
+    """
+    condition = "#email = :email"
+    names = {'#email': 'email'}
+    values = {':email': {'S': email}}
+    query_kwargs = {}
+
+    if status:
+        query_kwargs['IndexName'] = ASSIGNEE_STATUS_DUE_DATE_INDEX
+        names['#statusDueDate'] = 'status_due_date'
+        if due_from or due_to:
+            condition += " AND #statusDueDate BETWEEN :from AND :to"
+            values[':from'] = {'S': f"{status}#{due_from or MIN_DATE}"}
+            values[':to'] = {'S': f"{status}#{due_to or MAX_DATE}"}
+        else:
+            condition += " AND begins_with(#statusDueDate, :prefix)"
+            values[':prefix'] = {'S': f"{status}#"}
+    elif due_from or due_to:
+        query_kwargs['IndexName'] = ASSIGNEE_DUE_DATE_INDEX
+        names['#dueDate'] = 'due_date'
+        condition += " AND #dueDate BETWEEN :from AND :to"
+        values[':from'] = {'S': due_from or MIN_DATE}
+        values[':to'] = {'S': due_to or MAX_DATE}
+
+    rows = query_all(
+        TableName=ASSIGNMENTS_TABLE_NAME,
+        KeyConditionExpression=condition,
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=values,
+        **query_kwargs
+    )
+    return [row_to_task_summary(row) for row in rows]
+
+
+def query_tasks_by_status(status, due_from=None, due_to=None, fields=None):
+    """
+    Lists every task with the given status, optionally within a due date range, in wire format.
+
+    `fields` narrows the items down to those attributes (see `task_fields`).
+    """
+    condition = "#status = :status"
+    names = {'#status': 'status'}
+    values = {':status': {'S': status}}
+    if due_from or due_to:
+        condition += " AND #dueDate BETWEEN :from AND :to"
+        names['#dueDate'] = 'due_date'
+        values[':from'] = {'S': due_from or MIN_DATE}
+        values[':to'] = {'S': due_to or MAX_DATE}
+    query_kwargs = {'ExpressionAttributeNames': names}
+    query_kwargs.update(task_fields.projection_kwargs(fields, names))
+    return query_all(
+        TableName=TASKS_TABLE_NAME,
+        IndexName=TASKS_STATUS_DUE_DATE_INDEX,
+        KeyConditionExpression=condition,
+        ExpressionAttributeValues=values,
+        **query_kwargs
+    )
+
+
+def query_tasks_due_on(due_date, fields=None):
+    """Lists every task due on the given 'YYYY-MM-DD' date, in wire format, narrowed down to `fields`."""
+    query_kwargs = {'ExpressionAttributeNames': {'#dueDate': 'due_date'}}
+    query_kwargs.update(task_fields.projection_kwargs(fields, query_kwargs['ExpressionAttributeNames']))
+    return query_all(
+        TableName=TASKS_TABLE_NAME,
+        IndexName=TASKS_DUE_DATE_INDEX,
+        KeyConditionExpression="#dueDate = :dueDate",
+        ExpressionAttributeValues={':dueDate': {'S': due_date}},
+        **query_kwargs
+    )
+
+
+def row_to_task_summary(row):
+    """Shapes a wire-format `TaskAssignments` row like a (partial) task item."""
+    summary = {'id': row['task_id']}
+    for field in ASSIGNMENT_FIELDS:
+        if field in row:
+            summary[field] = row[field]
+    return summary
@@ -0,0 +1,139 @@
+"""
+Pre-aggregated task statistics for the admin overview.
+
+All counters live as numeric attributes of one item (`id = 'overview'`) in the
+`TaskStats` table, so the overview is a single `GetItem` however many tasks there are:
+
+    tasks                 number of tasks
+    status#<status>       tasks per status
+    open_due#<date>       tasks that are not completed, per due date (gives "overdue")
+    assigned#<email>      tasks assigned to a member
+    completed#<email>     of those, tasks the member has completed
+
+`update_task_stats` keeps them current from the `Tasks` stream: every record's
+contribution before and after the write is turned into a delta and the deltas of a batch
+are applied with `ADD`. `rebuild_task_stats` recomputes them from scratch.
+"""
+
+import hashlib
+from collections import Counter
+
+import aws_clients
+import task_indexes
+
+STATS_TABLE = 'TaskStats'
+OVERVIEW_ID = 'overview'
+
+# `ADD` terms per update; keeps each `UpdateExpression` well under DynamoDB's 4 KB limit.
+MAX_TERMS_PER_UPDATE = 200
+
+dynamodb_client = aws_clients.lazy_client('dynamodb')
+
+
+def contribution(task):
+    """
+    The counters a task adds to the overview.
+
+    Args:
+        task (dict): A task (Python values), or None.
+
+    Returns:
+        Counter: Counter name to amount.
+    """
+    counts = Counter()
+    if not task:
+        return counts
+    status = task.get('status') or 'unknown'
+    counts['tasks'] += 1
+    counts[f"status#{status}"] += 1
+    if status != 'completed' and task.get('due_date'):
+        counts[f"open_due#{task['due_date']}"] += 1
+    completed_by = set(task.get('completed_by') or [])
+    for email in task_indexes.assignee_emails(task):
+        counts[f"assigned#{email}"] += 1
+        if status == 'completed' or email in completed_by:
+            counts[f"completed#{email}"] += 1
+    return counts
+
+
+def task_delta(old_task, new_task):
+    """The change in the counters when `old_task` becomes `new_task` (either may be None)."""
+    delta = contribution(new_task)
+    delta.subtract(contribution(old_task))
+    return Counter({name: amount for name, amount in delta.items() if amount})
+
+
+def request_token(seed):
+    """A `ClientRequestToken` prefix derived from `seed`, so a retry reuses the same tokens."""
+    return hashlib.sha256(seed.encode()).hexdigest()[:32]
+
+
+def apply_delta(delta, token):
+    """
+    Adds a delta to the overview counters.
+
+    Each chunk of `MAX_TERMS_PER_UPDATE` counters is one `TransactWriteItems` with a
+    single `ADD` update. The `ClientRequestToken` is `token` plus the chunk number, so
+    resending the same delta within DynamoDB's 10 minute idempotency window does not count
+    it twice.
+
+    Args:
+        delta (Counter): Counter name to amount; zero amounts are skipped.
+        token (str): Up to 32 characters identifying the delta (see `request_token`).
+    """
+    terms = sorted((name, amount) for name, amount in delta.items() if amount)
+    for index in range(0, len(terms), MAX_TERMS_PER_UPDATE):
+        chunk = terms[index:index + MAX_TERMS_PER_UPDATE]
+        dynamodb_client.transact_write_items(
+            TransactItems=[{
+                'Update': {
+                    'TableName': STATS_TABLE,
+                    'Key': {'id': {'S': OVERVIEW_ID}},
+                    'UpdateExpression': "ADD " + ", ".join(f"#c{i} :c{i}" for i in range(len(chunk))),
+                    'ExpressionAttributeNames': {f"#c{i}": name for i, (name, _) in enumerate(chunk)},
+                    'ExpressionAttributeValues': {f":c{i}": {'N': str(amount)} for i, (_, amount) in enumerate(chunk)}
+                }
+            }],
+            ClientRequestToken=f"{token}-{index // MAX_TERMS_PER_UPDATE}"
+        )
+
+
+def summarize(counters, today):
+    """
+    Turns the raw counters into the overview returned by `get_task_stats`.
+
+    Args:
+        counters (dict): Counter name to amount (ints).
+        today (str): Today's date as `YYYY-MM-DD`; open tasks due before it are overdue.
+
+    Returns:
+        dict: `total`, `by_status`, `overdue`, `due_today` and `members`, one entry per
+        member with `email`, `assigned`, `completed` and `completion_rate`.
+    """
+    by_status = {}
+    overdue = due_today = 0
+    members = {}
+    for name, amount in counters.items():
+        kind, _, value = name.partition('#')
+        if not amount or not value:
+            continue
+        if kind == 'status':
+            by_status[value] = amount
+        elif kind == 'open_due':
+            if value < today:
+                overdue += amount
+            elif value == today:
+                due_today += amount
+        elif kind in ('assigned', 'completed'):
+            members.setdefault(value, {'email': value, 'assigned': 0, 'completed': 0})[kind] = amount
+
+    for member in members.values():
+        member['completion_rate'] = round(member['completed'] / member['assigned'], 4) if member['assigned'] else None
+
+    return {
+        'total': counters.get('tasks', 0),
+        'by_status': dict(sorted(by_status.items())),
+        'overdue': overdue,
+        'due_today': due_today,
+        'members': [members[email] for email in sorted(members)]
+    }
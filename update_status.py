@@ -1,108 +1,251 @@
-import boto3
 import json
+from botocore.exceptions import ClientError
 
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table('Tasks')
+import aws_clients
+import dynamodb_json
+import idempotency
+import instrumentation
+import jwt_verifier
+import task_cache
+import user_directory
 
-def update_status(task_id, new_status, user):
+table = aws_clients.lazy_table('Tasks')
+
+# A completion races with other writes at most this many times before giving up with 409.
+MAX_UPDATE_ATTEMPTS = 3
+
+
+class VersionConflict(Exception):
+    """Raised when the task is no longer at the version the caller last saw."""
+
+    def __init__(self, current_version):
+        super().__init__(f"Task has been modified, current version is {current_version}")
+        self.current_version = current_version
+
+
+class TaskNotFound(Exception):
+    """Raised when the task to update does not exist."""
+
+
+def conditional_update(task_id, update_expression, condition_expression, names, values):
+    """
+    Runs one conditional `UpdateItem`.
+
+    Returns:
+        tuple: `(True, new_item)` if the update was applied, or `(False, old_item)` if the
+        condition failed. `old_item` is None when the task does not exist.
+    """
+    try:
+        response = table.update_item(
+            Key={'id': task_id},
+            UpdateExpression=update_expression,
+            ConditionExpression=condition_expression,
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+            ReturnValues="ALL_NEW",
+            ReturnValuesOnConditionCheckFailure="ALL_OLD"
+        )
+        return True, response['Attributes']
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        item = e.response.get('Item')
+        if item is None:
+            return False, None
+        return False, dynamodb_json.deserialize_item(item)
+
+
+def check_version(task, expected_version):
+    """Raises `TaskNotFound` or `VersionConflict` if the task cannot take the update."""
+    if task is None:
+        raise TaskNotFound()
+    if expected_version is not None and task.get('version', 0) != expected_version:
+        raise VersionConflict(task.get('version', 0))
+
+
+def version_condition(expected_version, values):
+    """Adds the optimistic concurrency check for `expected_version`, if one was sent."""
+    if expected_version is None:
+        return ""
+    values[':expectedVersion'] = expected_version
+    return " AND #version = :expectedVersion"
+
+
+def set_status(task_id, new_status, expected_version):
+    """Sets the status of a task and bumps its version in one conditional `UpdateItem`."""
+    names = {'#id': 'id', '#status': 'status', '#version': 'version'}
+    values = {':status': new_status, ':one': 1}
+    condition = "attribute_exists(#id)" + version_condition(expected_version, values)
+
+    applied, task = conditional_update(
+        task_id,
+        "SET #status = :status ADD #version :one",
+        condition,
+        names,
+        values
+    )
+    if not applied:
+        check_version(task, expected_version)
+        raise VersionConflict(task.get('version', 0))
+    return task
+
+
+def upgrade_completion_attributes(task_id, task):
+    """
+    Converts a task written before completions were tracked with counters.
+
+    Such tasks keep `completed_by` as a list and have no `assignee_count` or
+    `next_completion`. This happens at most once per task.
+    """
+    completed = set(task.get('completed_by') or [])
+    names = {
+        '#assigneeCount': 'assignee_count',
+        '#nextCompletion': 'next_completion',
+        '#version': 'version',
+        '#completedBy': 'completed_by'
+    }
+    values = {
+        ':assigneeCount': len(task.get('assigned_to') or []),
+        ':nextCompletion': len(completed) + 1,
+        ':zero': 0
+    }
+    update = (
+        "SET #assigneeCount = :assigneeCount, #nextCompletion = :nextCompletion, "
+        "#version = if_not_exists(#version, :zero)"
+    )
+    if completed:
+        values[':completedBy'] = completed
+        update += ", #completedBy = :completedBy"
+    else:
+        update += " REMOVE #completedBy"
+
+    # A concurrent upgrade of the same task makes this fail, which is fine.
+    conditional_update(task_id, update, "attribute_not_exists(#nextCompletion)", names, values)
+
+
+def complete_task(task_id, user, expected_version):
+    """
+    Records that `user` has completed the task, in one conditional `UpdateItem`.
+
+    The user is added to the `completed_by` string set and `next_completion` (the
+    1-based number of the next completion) is incremented. The completion that brings
+    `next_completion` past `assignee_count` also sets the status to 'completed'. Which of
+    the two updates applies is decided by the condition, so concurrent completions can
+    never both see themselves as "not the last one" and leave the task open.
+
+    Returns:
+        dict: The updated task.
+
+    Raises:
+        TaskNotFound: If the task does not exist.
+        VersionConflict: If `expected_version` is stale, or the task kept changing
+            underneath the update.
+    """
+    names = {
+        '#id': 'id',
+        '#status': 'status',
+        '#version': 'version',
+        '#completedBy': 'completed_by',
+        '#assigneeCount': 'assignee_count',
+        '#nextCompletion': 'next_completion'
+    }
+    # Most completions are not the last one, so that is the first guess. A wrong
+    # guess costs a second attempt, informed by the item returned on failure.
+    last = False
+
+    for _ in range(MAX_UPDATE_ATTEMPTS):
+        values = {':user': {user}, ':userValue': user, ':one': 1}
+        update = "ADD #completedBy :user, #version :one, #nextCompletion :one"
+        condition = "attribute_exists(#id) AND NOT contains(#completedBy, :userValue)"
+        if last:
+            values[':completed'] = 'completed'
+            update += " SET #status = :completed"
+            condition += " AND #nextCompletion >= #assigneeCount"
+        else:
+            condition += " AND #nextCompletion < #assigneeCount"
+        condition += version_condition(expected_version, values)
+
+        applied, task = conditional_update(task_id, update, condition, names, values)
+        if applied:
+            return task
+
+        check_version(task, expected_version)
+        completed_by = task.get('completed_by')
+        if isinstance(completed_by, set) and user in completed_by:
+            # Already recorded, e.g. a retried request.
+            return task
+        if 'next_completion' not in task or isinstance(completed_by, list):
+            upgrade_completion_attributes(task_id, task)
+            continue
+        last = task['next_completion'] >= task.get('assignee_count', 0)
+
+    raise VersionConflict(task.get('version', 0))
+
+
+def update_status(task_id, new_status, user, expected_version=None):
     """
     Updates the status of a task in a DynamoDB table.
 
-    This function updates the `status` attribute of a task and, if applicable, 
-    appends the user's name to the `completed_by` attribute when the task is marked 
-    as completed. It ensures that all updates are atomic and handles any errors 
-    gracefully.
+    This function updates the `status` attribute of a task or, when the task is marked
+    as completed, adds the user to the `completed_by` string set. The status only turns
+    to "completed" once every assignee has completed the task. Each change is a single
+    conditional `UpdateItem`, with no read beforehand, and bumps the task's `version`.
 
     Args:
         task_id (str): The unique identifier of the task to update.
         new_status (str): The new status to set for the task (e.g., "completed", "in progress").
         user (str): The user making the update, to be recorded when marking the task as completed.
+        expected_version (int): The task version the caller last saw. When given, the update
+            is rejected with 409 if the task has changed since.
 
     Returns:
         dict: A response object containing:
-            - 'statusCode' (int): The HTTP status code (e.g., 200 for success, 404 for not found, 500 for errors).
+            - 'statusCode' (int): The HTTP status code (e.g., 200 for success, 404 for not found,
+              409 for a version conflict, 500 for errors).
             - 'headers' (dict): CORS headers for API Gateway.
             - 'body' (str): A JSON string with the updated task attributes or an error message.
 
     Notes:
         - If the task is not found, the function returns a 404 status code.
-        - If the new status is "completed" and the user is not already listed in `completed_by`, 
-          the user's name is appended to the `completed_by` attribute.
-        - The function handles DynamoDB operations, including updates and error handling.
+        - Completing a task twice as the same user is a no-op that returns the task.
+        - The task's rows in the 'TaskAssignments' table are refreshed from the `Tasks`
+          stream by `process_task_events`.
+        - The task is dropped from this container's `task_cache`; other containers see the
+          bumped `version` when they revalidate.
         - Ensures proper CORS headers for API Gateway integration.
 
     Raises:
         Exception: Catches all exceptions and returns a 500 status code with an error message.
     """
 
-    print(user)
     response_headers = {
         "Access-Control-Allow-Origin": "*",
         "Access-Control-Allow-Methods": "OPTIONS,GET,POST",
-        "Access-Control-Allow-Headers": "Content-Type,Authorization",
+        "Access-Control-Allow-Headers": "Content-Type,Authorization,Idempotency-Key",
     }
     try:
-        task = table.get_item(Key={'id': task_id}).get('Item')
-
-        if not task:
-            return {
-                'statusCode': 404,
-                "headers": response_headers,
-                'body': json.dumps("Task not found")
-            }
-        
         if new_status == 'completed':
-            assigned_users = task.get('assigned_to', [])
-            completed_users = task.get('completed_by', [])
-        
-            if len(completed_users) < len(assigned_users):
-                res = table.update_item(
-                    Key={'id': task_id},
-                    UpdateExpression="SET #completedByAttr = list_append(#completedByAttr, :completedByValue)",
-                    ExpressionAttributeNames={
-                        '#completedByAttr': 'completed_by'
-                    },
-                    ExpressionAttributeValues={
-                        ':completedByValue': [user]
-                    },
-                    ReturnValues="ALL_NEW"
-                )
+            task = complete_task(task_id, user, expected_version)
+        else:
+            task = set_status(task_id, new_status, expected_version)
+        task_cache.invalidate([task_id])
 
-                return {
-                    'statusCode': 200,
-                    "headers": response_headers,
-                    'body': json.dumps(res['Attributes'])
-                }
-
-        res = table.update_item(
-            Key={'id': task_id},
-            UpdateExpression="SET #statusAttr = :statusValue",
-            ExpressionAttributeNames={
-                '#statusAttr': 'status'
-            },
-            ExpressionAttributeValues={
-                ':statusValue': new_status 
-            },
-            ReturnValues="ALL_NEW"
-        )
-
-        if new_status == "completed":
-            res = table.update_item(
-                Key={'id': task_id},
-                UpdateExpression="SET #completedByAttr = list_append(#completedByAttr, :completedByValue)",
-                ExpressionAttributeNames={
-                    '#completedByAttr': 'completed_by'
-                },
-                ExpressionAttributeValues={
-                    ':completedByValue': [user]
-                },
-                ReturnValues="ALL_NEW"
-            )
-            
         return {
             'statusCode': 200,
             "headers": response_headers,
-            'body': json.dumps(res['Attributes'])
+            'body': json.dumps(task, default=dynamodb_json.json_default)
+        }
+    except TaskNotFound:
+        return {
+            'statusCode': 404,
+            "headers": response_headers,
+            'body': json.dumps("Task not found")
+        }
+    except VersionConflict as e:
+        return {
+            'statusCode': 409,
+            "headers": response_headers,
+            'body': json.dumps(str(e))
         }
     except Exception as e:
         return {
@@ -111,11 +254,13 @@ def update_status(task_id, new_status, user):
             'body': json.dumps(f"Error updating status: {str(e)}")
         }
 
+@instrumentation.instrument_handler
+@idempotency.idempotent('update_status')
 def lambda_handler(event, context):
     response_headers = {
         "Access-Control-Allow-Origin": "*",
         "Access-Control-Allow-Methods": "OPTIONS,GET,POST",
-        "Access-Control-Allow-Headers": "Content-Type,Authorization",
+        "Access-Control-Allow-Headers": "Content-Type,Authorization,Idempotency-Key",
     }
 
     try:
@@ -123,6 +268,7 @@ def lambda_handler(event, context):
         task_id = body.get('id')
         user = body.get('user')
         new_status = body.get('status')
+        expected_version = body.get('version')
 
         if not task_id or not new_status:
             return {
@@ -131,7 +277,43 @@ def lambda_handler(event, context):
                 'body': json.dumps("Missing 'id' or 'status'")
             }
 
-        return update_status(task_id, new_status, user)
+        # Behind `jwt_authorizer`, the user is the signed-in user, not whoever the body names.
+        identity = jwt_verifier.caller(event)
+        if identity is not None:
+            email = identity['email']
+            if not email:
+                # Access tokens carry no `email`; the members directory maps the `sub`.
+                record = user_directory.get_users([identity['sub']]).get(identity['sub'])
+                email = record.get('email') if record else None
+            if not email:
+                return {
+                    'statusCode': 403,
+                    "headers": response_headers,
+                    'body': json.dumps("The signed-in user has no email address")
+                }
+            if user and user != email:
+                return {
+                    'statusCode': 403,
+                    "headers": response_headers,
+                    'body': json.dumps("'user' must be the signed-in user")
+                }
+            user = email
+
+        if new_status == 'completed' and not user:
+            return {
+                'statusCode': 400,
+                "headers": response_headers,
+                'body': json.dumps("Missing 'user'")
+            }
+
+        if expected_version is not None and (isinstance(expected_version, bool) or not isinstance(expected_version, int)):
+            return {
+                'statusCode': 400,
+                "headers": response_headers,
+                'body': json.dumps("'version' must be an integer")
+            }
+
+        return update_status(task_id, new_status, user, expected_version)
     except Exception as e:
         return {
             'statusCode': 500,
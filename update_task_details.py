@@ -1,44 +1,172 @@
-import boto3
 import json
+from botocore.exceptions import ClientError
 
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table('Tasks')
+import aws_clients
+import dynamodb_json
+import instrumentation
+import item_codec
+import reminder_rules
+import task_cache
 
-# Function to update task details
-def update_task_details(task_id, updated_task):
+table = aws_clients.lazy_table('Tasks')
+
+# Fields a client may change. Only the ones present in the body are written.
+PATCHABLE_FIELDS = ('title', 'description', 'start_date', 'due_date', 'status', 'assigned_to')
+
+# Fields that may be cleared with `null`; the others are required on every task.
+REMOVABLE_FIELDS = ('description',)
+
+
+def build_patch(patch):
+    """
+    Builds the `UpdateItem` expressions for a patch.
+
+    Fields with a value are SET and fields set to None are REMOVEd. The condition
+    only passes if the task exists and at least one field would change, so a patch
+    that changes nothing is not written.
+
+    Args:
+        patch (dict): The fields to change, by name.
+
+    Returns:
+        dict: The `UpdateExpression`, `ConditionExpression`, `ExpressionAttributeNames`
+        and `ExpressionAttributeValues` arguments.
+    """
+    expression_attribute_names = {'#id': 'id', '#version': 'version'}
+    expression_attribute_values = {':one': 1}
+    set_actions = []
+    remove_actions = []
+    changes = []
+
+    for key, value in patch.items():
+        placeholder = f"#{key}Attr"
+        expression_attribute_names[placeholder] = key
+        if value is None:
+            remove_actions.append(placeholder)
+            changes.append(f"attribute_exists({placeholder})")
+        else:
+            set_actions.append(f"{placeholder} = :{key}Value")
+            # Compression is deterministic, so an unchanged long description still compares equal.
+            expression_attribute_values[f":{key}Value"] = item_codec.encode_value(value) if key in item_codec.COMPRESSED_ATTRIBUTES else value
+            changes.append(f"attribute_not_exists({placeholder}) OR {placeholder} <> :{key}Value")
+
+    # Derived from `assigned_to`, so it is kept in step but does not count as a change.
+    if patch.get('assigned_to') is not None:
+        set_actions.append("#assigneeCountAttr = :assigneeCountValue")
+        expression_attribute_names['#assigneeCountAttr'] = 'assignee_count'
+        expression_attribute_values[':assigneeCountValue'] = len(patch['assigned_to'])
+
+    update_expression = ""
+    if set_actions:
+        update_expression += "SET " + ", ".join(set_actions) + " "
+    if remove_actions:
+        update_expression += "REMOVE " + ", ".join(remove_actions) + " "
+    update_expression += "ADD #version :one"
+
+    return {
+        'UpdateExpression': update_expression,
+        'ConditionExpression': "attribute_exists(#id) AND (" + " OR ".join(f"({change})" for change in changes) + ")",
+        'ExpressionAttributeNames': expression_attribute_names,
+        'ExpressionAttributeValues': expression_attribute_values
+    }
+
+
+def apply_patch(old_task, patch):
+    """Returns the task as stored after `patch` was applied to `old_task`."""
+    task = {**old_task}
+    for key, value in patch.items():
+        if value is None:
+            task.pop(key, None)
+        else:
+            task[key] = value
+    if patch.get('assigned_to') is not None:
+        task['assignee_count'] = len(patch['assigned_to'])
+    task['version'] = old_task.get('version', 0) + 1
+    return task
+
+
+def update_task_details(task_id, patch):
+    """
+    Applies a partial update to a task.
+
+    Args:
+        task_id (str): The unique identifier of the task.
+        patch (dict): The fields to change. A value of None removes the field.
+
+    Returns:
+        dict: A response object containing:
+            - 'statusCode' (int): 200 on success (also when nothing changed), 404 if the
+              task does not exist, 500 on errors.
+            - 'body' (str): A JSON object with the task's `id` and `version` and the
+              attributes the update wrote. Removed fields are not listed; when nothing
+              changed, only `id` and the current `version` are returned.
+
+    Notes:
+        - The write is conditional on at least one field changing, so a no-op edit costs
+          no write. DynamoDB still charges the write capacity of a failed condition check.
+        - `version` is bumped on every write, like a status change does, which is what
+          makes cached copies of the task in `get_task_by_id` containers revalidate.
+        - The update returns `UPDATED_NEW`, unless it sets `due_date`: that update returns
+          `ALL_OLD`, to tell whether the date really changed, and the written attributes
+          are worked out from it.
+        - The task's `TaskAssignments` rows are rewritten from the `Tasks` stream by
+          `process_task_events`.
+        - A long `description` is stored compressed (see `item_codec`); the response
+          holds it as sent.
+        - When `due_date` changes, the task's legacy `TaskReminder_*` rule is deleted; the
+          daily sweeper picks up the new date on its own.
+    """
     response_headers = {
         "Access-Control-Allow-Origin": "*",
         "Access-Control-Allow-Methods": "OPTIONS,GET,POST",
         "Access-Control-Allow-Headers": "Content-Type,Authorization",
     }
 
-    update_expression = "SET "
-    expression_attribute_names = {}
-    expression_attribute_values = {}
+    needs_old_task = 'due_date' in patch
 
-    for key, value in updated_task.items():
-        if key != 'id':
-            placeholder = f"#{key}Attr"
-            update_expression += f"{placeholder} = :{key}Value, "
-            expression_attribute_names[placeholder] = key
-            expression_attribute_values[f":{key}Value"] = value
+    try:
+        try:
+            response = table.update_item(
+                Key={'id': task_id},
+                ReturnValues="ALL_OLD" if needs_old_task else "UPDATED_NEW",
+                ReturnValuesOnConditionCheckFailure='ALL_OLD',
+                **build_patch(patch)
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            current = e.response.get('Item')
+            if current is None:
+                return {
+                    'statusCode': 404,
+                    "headers": response_headers,
+                    'body': json.dumps(f"Task with id {task_id} not found")
+                }
+            current = dynamodb_json.deserialize_item(current)
+            result = {'id': task_id, 'version': current.get('version')}
+            return {
+                'statusCode': 200,
+                "headers": response_headers,
+                'body': json.dumps(result, default=dynamodb_json.json_default)
+            }
 
-    # Remove the last comma from the update expression
-    update_expression = update_expression.rstrip(", ")
+        task_cache.invalidate([task_id])
 
-    try:
-        response = table.update_item(
-            Key={'id': task_id},
-            UpdateExpression=update_expression,
-            ExpressionAttributeNames=expression_attribute_names,
-            ExpressionAttributeValues=expression_attribute_values,
-            ReturnValues="ALL_NEW"
-        )
+        if needs_old_task:
+            old_task = response['Attributes']
+            task = apply_patch(old_task, patch)
+            written = list(patch) + (['assignee_count'] if 'assigned_to' in patch else []) + ['version']
+            updated = {key: task[key] for key in written if key in task}
+            if old_task.get('due_date') != task.get('due_date'):
+                reminder_rules.cleanup_reminder_rules([task_id])
+        else:
+            updated = response.get('Attributes', {})
 
+        result = {'id': task_id, **updated}
         return {
             'statusCode': 200,
             "headers": response_headers,
-            'body': json.dumps(response['Attributes'])
+            'body': json.dumps(result, default=dynamodb_json.json_default)
         }
     except Exception as e:
         return {
@@ -47,6 +175,30 @@ def update_task_details(task_id, updated_task):
             'body': json.dumps(f"Error updating task: {str(e)}")
         }
 
+
+def parse_patch(body):
+    """
+    Reads the fields to change from a request body.
+
+    Returns:
+        dict: The patch, with None for fields to remove.
+
+    Raises:
+        ValueError: If a required field is cleared, `assigned_to` is not a list, or no
+        field is sent at all.
+    """
+    patch = {key: body[key] for key in PATCHABLE_FIELDS if key in body}
+    if not patch:
+        raise ValueError(f"Nothing to update; send at least one of: {', '.join(PATCHABLE_FIELDS)}")
+    cleared = [key for key, value in patch.items() if value is None and key not in REMOVABLE_FIELDS]
+    if cleared:
+        raise ValueError(f"These fields cannot be cleared: {', '.join(cleared)}")
+    if 'assigned_to' in patch and not isinstance(patch['assigned_to'], list):
+        raise ValueError("'assigned_to' must be a list")
+    return patch
+
+
+@instrumentation.instrument_handler
 def lambda_handler(event, context):
     response_headers = {
         "Access-Control-Allow-Origin": "*",
@@ -55,16 +207,8 @@ def lambda_handler(event, context):
     }
 
     try:
-        body = json.loads(event.get('body', '{}'))
+        body = json.loads(event.get('body') or '{}')
         task_id = body.get('id')
-        updated_task = {
-            'title': body.get('title'),
-            'description': body.get('description', ''),
-            'start_date': body.get('start_date'),
-            'due_date': body.get('due_date'),
-            'status': body.get('status'),
-            'assigned_to': body.get('assigned_to', [])
-        }
 
         if not task_id:
             return {
@@ -73,7 +217,16 @@ def lambda_handler(event, context):
                 'body': json.dumps("Missing 'id' in the request body")
             }
 
-        return update_task_details(task_id, updated_task)
+        try:
+            patch = parse_patch(body)
+        except ValueError as e:
+            return {
+                'statusCode': 400,
+                "headers": response_headers,
+                'body': json.dumps(str(e))
+            }
+
+        return update_task_details(task_id, patch)
 
     except Exception as e:
         return {
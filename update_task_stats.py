@@ -0,0 +1,50 @@
+"""
+Keeps the `task_stats` counters current from the `Tasks` table's DynamoDB stream.
+
+Every record is turned into the change it makes to the counters (its contribution after
+the write minus its contribution before), the changes of the batch are summed and the
+sum is applied with `ADD` (see `task_stats.apply_delta`). A batch of 100 edits therefore
+costs one transactional write, and edits that touch no counter (a new title) cost none.
+
+Event source mapping: stream view type `NEW_AND_OLD_IMAGES`, no `ReportBatchItemFailures`
+and no batch bisecting. A failed batch is then retried as the same batch, so it reuses
+the same `ClientRequestToken`s and is not counted twice. Counters can still drift if a
+batch is retried more than 10 minutes later; `rebuild_task_stats` corrects that.
+"""
+
+from collections import Counter
+
+import dynamodb_json
+import instrumentation
+import task_stats
+
+
+def record_delta(record):
+    """The counter change of one stream record."""
+    images = record.get('dynamodb', {})
+    old_task = dynamodb_json.deserialize_item(images['OldImage']) if 'OldImage' in images else None
+    new_task = dynamodb_json.deserialize_item(images['NewImage']) if 'NewImage' in images else None
+    return task_stats.task_delta(old_task, new_task)
+
+
+@instrumentation.instrument_handler
+def lambda_handler(event, context):
+    """
+    Applies a batch of `Tasks` stream records to the overview counters.
+
+    Raises:
+        Exception: If the counters could not be updated, so that Lambda retries the batch.
+    """
+    records = event.get('Records', [])
+    delta = Counter()
+    for record in records:
+        delta.update(record_delta(record))
+    delta = Counter({name: amount for name, amount in delta.items() if amount})
+
+    if not delta:
+        return {'records': len(records), 'counters': 0}
+
+    token = task_stats.request_token("|".join(record['eventID'] for record in records))
+    task_stats.apply_delta(delta, token)
+    print(f"Applied {len(records)} stream records to {len(delta)} counters")
+    return {'records': len(records), 'counters': len(delta)}
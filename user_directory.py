@@ -0,0 +1,76 @@
+"""
+The members directory: one compact record per Cognito user, kept in DynamoDB.
+
+Cognito's `ListUsersInGroup` returns 60 users per call and has low request-rate quotas,
+so the user picker and the sub-to-email lookups read this table instead:
+
+    UserDirectory   partition key `sub`; attributes `email`, `username` and `group`
+    group-index     GSI, partition key `group`, sort key `email`
+
+Records are written by the post-confirmation trigger when a member signs up and kept in
+line with Cognito by `reconcile_user_directory`.
+"""
+
+from boto3.dynamodb.conditions import Key
+
+import aws_clients
+import dynamodb_batch
+
+DIRECTORY_TABLE = 'UserDirectory'
+GROUP_INDEX = 'group-index'
+
+directory_table = aws_clients.lazy_table(DIRECTORY_TABLE)
+
+
+def directory_record(sub, email, username, group):
+    """
+    Builds the directory record of a member.
+
+    Missing attributes are left out rather than stored as NULL: `email` is the sort key
+    of `group-index`, and DynamoDB rejects a NULL value for an index key.
+    """
+    record = {
+        'sub': sub,
+        'email': email,
+        'username': username,
+        'group': group
+    }
+    return {name: value for name, value in record.items() if value is not None}
+
+
+def put_user(record):
+    """Writes a member's record. Writing the same record again is harmless."""
+    directory_table.put_item(Item=record)
+
+
+def list_group(group):
+    """
+    Lists the members of a group, ordered by email, with one `Query` on `group-index`.
+
+    The query is only followed to a second page past 1 MB of records (thousands of
+    members).
+    """
+    users = []
+    request = {'IndexName': GROUP_INDEX, 'KeyConditionExpression': Key('group').eq(group)}
+    while True:
+        response = directory_table.query(**request)
+        users.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return users
+        request['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def get_users(subs):
+    """
+    Reads the records of many members by sub with `BatchGetItem`.
+
+    Returns:
+        dict: sub -> record for the subs that are in the directory.
+    """
+    subs = list(dict.fromkeys(sub for sub in subs if sub))
+    if not subs:
+        return {}
+    records, unread = dynamodb_batch.batch_get(DIRECTORY_TABLE, [{'sub': sub} for sub in subs])
+    if unread:
+        print(f"Could not read {len(unread)} directory records")
+    return {record['sub']: record for record in records}